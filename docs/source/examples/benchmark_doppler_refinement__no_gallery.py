@@ -0,0 +1,66 @@
+'''
+Coarse-to-fine doppler search accuracy and speed
+=================================================
+
+Simulates Barker-13 echoes with random (off-grid) doppler shifts and compares
+the exhaustive doppler grid search with the coarse-to-fine search, reporting
+execution time and doppler error against the simulated truth.
+
+Usage: python benchmark_doppler_refinement__no_gallery.py [method]
+'''
+import sys
+import time
+
+import numpy as np
+
+import metecho
+import metecho.generalized_matched_filter as mgmf
+
+method = sys.argv[1] if len(sys.argv) > 1 else 'batch'
+
+channels, samples, pulses = 1, 85, 256
+samp = 6e-6
+doppler_freq_min, doppler_freq_max, doppler_freq_step = -35e3, 5e3, 100.0
+
+rng = np.random.default_rng(1234)
+code = metecho.signal_model.phase_coding.barker_code_13(1, 2)[0]
+transmitted_waveform = metecho.signal_model.phase_coding.barker_code_13(pulses, oversampling=2)
+
+shape = (channels, samples, pulses)
+data = (rng.normal(size=shape) + 1j*rng.normal(size=shape))*0.05
+doppler = rng.uniform(doppler_freq_min + 1e3, doppler_freq_max - 1e3, size=pulses)
+start = rng.integers(0, samples - code.size, size=pulses)
+for pulse in range(pulses):
+    echo = code*np.exp(1j*2*np.pi*doppler[pulse]*samp*np.arange(1, code.size + 1))
+    data[:, start[pulse]:(start[pulse] + code.size), pulse] += echo[None, :]
+
+raw = metecho.data.RawDataInterface(None, load_on_init=False)
+raw.data = data
+raw.axis.update({'channel': 0, 'sample': 1, 'pulse': 2})
+raw.meta['T_samp'] = samp
+
+args = (raw, doppler_freq_min, doppler_freq_max, doppler_freq_step, transmitted_waveform)
+
+runs = [('exhaustive', lambda: mgmf.xcorr.xcorr_echo_search(*args, progress_bar=False, method=method))]
+for coarse_factor in [5, 10, 20]:
+    for interpolate in [False, True]:
+        runs.append((
+            f'coarse x{coarse_factor}' + (' + parabola' if interpolate else ''),
+            lambda cf=coarse_factor, ip=interpolate: mgmf.xcorr.coarse_to_fine_echo_search(
+                *args,
+                coarse_factor=cf,
+                interpolate=ip,
+                progress_bar=False,
+                method=method,
+            ),
+        ))
+
+print(f'{pulses} pulses, doppler grid step {doppler_freq_step} Hz, method "{method}"')
+print(f'{"search":<24} {"time [s]":>9} {"RMS error [Hz]":>15} {"range errors":>13}')
+for name, run in runs:
+    t0 = time.perf_counter()
+    output = run()
+    dt = time.perf_counter() - t0
+    rms = np.sqrt(np.mean((output['best_doppler'] - doppler)**2))
+    range_errors = np.sum(output['best_start'] != start)
+    print(f'{name:<24} {dt:>9.3f} {rms:>15.1f} {range_errors:>13d}')
@@ -0,0 +1,61 @@
+'''
+Matched filter C kernel comparison
+==================================
+
+Runs the interleaved complex ("direct") and the split real/imaginary ("planar")
+C-library matched filter kernels on the same simulated MU-sized data and reports
+the time per pulse sample and per complex multiply-accumulate, i.e. per sample,
+code sample and doppler shift.
+
+Usage: python benchmark_xcorr_kernels__no_gallery.py [pulses] [repeats]
+'''
+import sys
+import time
+
+import numpy as np
+
+import metecho
+import metecho.generalized_matched_filter as mgmf
+
+pulses = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+channels, samples = 25, 85
+doppler_freq_min, doppler_freq_max, doppler_freq_step = -30e3, 5e3, 100.0
+
+rng = np.random.default_rng(1234)
+raw = metecho.data.RawDataInterface(None, load_on_init=False)
+raw.data = rng.normal(size=(channels, samples, pulses)) + 1j*rng.normal(size=(channels, samples, pulses))
+raw.axis.update({'channel': 0, 'sample': 1, 'pulse': 2})
+raw.meta['T_samp'] = 6e-6
+
+transmitted_waveform = metecho.signal_model.phase_coding.barker_code_13(pulses, oversampling=2)
+doppler_size = int((doppler_freq_max - doppler_freq_min)/doppler_freq_step) + 1
+code_size = transmitted_waveform.shape[1]
+
+print(f'{pulses} pulses of {samples} samples, {doppler_size} doppler shifts, {code_size} sample code')
+print(f'{"kernel":<8} {"time [s]":>9} {"ns/sample":>10} {"ns/MAC":>8}')
+results = {}
+for method in ['direct', 'planar']:
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        results[method] = mgmf.xcorr.xcorr_echo_search(
+            raw,
+            doppler_freq_min,
+            doppler_freq_max,
+            doppler_freq_step,
+            transmitted_waveform,
+            progress_bar=False,
+            method=method,
+        )
+        times.append(time.perf_counter() - t0)
+    dt = min(times)
+    ns_sample = dt/(pulses*samples)*1e9
+    ns_mac = ns_sample/(doppler_size*code_size)
+    print(f'{method:<8} {dt:>9.3f} {ns_sample:>10.1f} {ns_mac:>8.3f}')
+
+print('Max relative peak deviation: {:.2e}'.format(
+    np.max(np.abs(results['planar']['best_peak'] - results['direct']['best_peak'])
+           / np.abs(results['direct']['best_peak']))
+))
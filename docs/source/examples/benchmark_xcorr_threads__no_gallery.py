@@ -0,0 +1,56 @@
+'''
+Matched filter multi-core scaling
+==================================
+
+Runs the generalized matched filter on simulated MU-sized data with an
+increasing number of worker threads and reports the speedup relative to a
+single worker.
+
+Usage: python benchmark_xcorr_threads__no_gallery.py [method] [max workers]
+'''
+import os
+import sys
+import time
+
+import numpy as np
+
+import metecho
+import metecho.generalized_matched_filter as mgmf
+
+method = sys.argv[1] if len(sys.argv) > 1 else 'direct'
+max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+channels, samples, pulses = 25, 85, 512
+rng = np.random.default_rng(1234)
+raw = metecho.data.RawDataInterface(None, load_on_init=False)
+raw.data = rng.normal(size=(channels, samples, pulses)) + 1j*rng.normal(size=(channels, samples, pulses))
+raw.axis.update({'channel': 0, 'sample': 1, 'pulse': 2})
+raw.meta['T_samp'] = 6e-6
+
+transmitted_waveform = metecho.signal_model.phase_coding.barker_code_13(pulses, oversampling=2)
+
+workers = [1]
+while workers[-1]*2 <= max_workers:
+    workers.append(workers[-1]*2)
+if workers[-1] != max_workers:
+    workers.append(max_workers)
+
+print(f'Method "{method}" on {pulses} pulses of {samples} samples')
+print(f'{"workers":>8} {"time [s]":>10} {"speedup":>8}')
+reference = None
+for worker_num in workers:
+    t0 = time.perf_counter()
+    mgmf.xcorr.xcorr_echo_search(
+        raw,
+        -30e3,
+        5e3,
+        100.0,
+        transmitted_waveform,
+        progress_bar=False,
+        threads=None if worker_num == 1 else worker_num,
+        method=method,
+    )
+    dt = time.perf_counter() - t0
+    if reference is None:
+        reference = dt
+    print(f'{worker_num:>8} {dt:>10.3f} {reference/dt:>8.2f}')
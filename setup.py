@@ -22,6 +22,7 @@ libxcorr = Extension(
         'src/clibmet/libxcorr/libxcorr.c',
     ],
     include_dirs=['src/clibmet/libxcorr/'],
+    extra_compile_args=['-O3'],
 )
 
 
@@ -32,7 +32,7 @@ void xcorr_echo_search(
     // Declaring constants
     int doppler_freq_size = (int)((doppler_freq_max - doppler_freq_min) / (doppler_freq_step) + 1);
     
-    precision doppler_freq[doppler_freq_size];
+    precision *doppler_freq = malloc(sizeof(precision)*(doppler_freq_size + 1));
 
     arange(doppler_freq_min, doppler_freq_max, doppler_freq_step, doppler_freq);
 
@@ -52,6 +52,8 @@ void xcorr_echo_search(
         maxpowind_size,
         samp
     );
+
+    free(doppler_freq);
 }
 
 void perform_xcorr(
@@ -71,59 +73,143 @@ void perform_xcorr(
         precision samp
     ){
 
-    // Initiate variables
-    int decoded_size = signal_samples_size + code_size;
-    precision complex norm_coefs[decoded_size];
-    precision complex abs_signal_samples[code_size];
-    precision complex output_power[decoded_size];
-    precision doppler_freq_samp;
-    precision complex signal_model[code_size];
-    precision complex decoded[decoded_size];
-    precision complex signal_model_abs_arr[code_size];
-    precision complex abs_signal_samples_sum;
-
-    // Setting arrays to zeroes
-    memset(pows, (precision complex)0, (size_t)(pows_size[0]*pows_size[1]));
-    memset(pows_normalized, (precision complex)0, (size_t)(pows_size[0]*pows_size[1]));
-    memset(powmax, (precision complex)0, (size_t)powmax_size);
-    memset(maxpowind, (int)0, (size_t)maxpowind_size);
-    memset(norm_coefs, (precision complex)0, (size_t)decoded_size);
-
+    precision complex *signal_models = malloc(sizeof(precision complex)*doppler_freq_size*code_size);
+    precision *signal_model_energy = malloc(sizeof(precision)*doppler_freq_size);
 
-     // Calculate the absolute value complex_sum of the signal_samples from 0 to code_size 
-    for (int i = code_size; i < signal_samples_size+code_size; i++)
+    if (signal_models == NULL || signal_model_energy == NULL)
     {
-        elementwise_cabs_square(signal_samples, i-code_size, i, abs_signal_samples);
-        abs_signal_samples_sum = complex_sum(abs_signal_samples, code_size);
-        norm_coefs[i] = abs_signal_samples_sum;
+        free(signal_models);
+        free(signal_model_energy);
+        return;
     }
-    elementwise_cabs_square(signal_samples, 0, code_size, abs_signal_samples);
-    abs_signal_samples_sum = complex_sum(abs_signal_samples, code_size);
-    set_norm_coefs(&abs_signal_samples_sum, 0, code_size, norm_coefs);
-    
-    elementwise_cabs_square(signal_samples, signal_samples_size-code_size, signal_samples_size, abs_signal_samples);
-    abs_signal_samples_sum = complex_sum(abs_signal_samples, code_size);
-    set_norm_coefs(&abs_signal_samples_sum, signal_samples_size, signal_samples_size+code_size, norm_coefs);
-    
+
+    code_bank(doppler_freq, doppler_freq_size, code, code_size, samp, signal_models, signal_model_energy);
+
+    xcorr_code_bank_search(
+        signal_samples,
+        signal_samples_size,
+        signal_models,
+        signal_model_energy,
+        doppler_freq_size,
+        code_size,
+        pows,
+        pows_normalized,
+        pows_size,
+        powmax,
+        powmax_size,
+        maxpowind,
+        maxpowind_size
+    );
+
+    free(signal_models);
+    free(signal_model_energy);
+}
+
+// Modulates the code with each doppler shift and stores the resulting
+// signal models row by row in signal_models together with their energy
+void code_bank(
+        precision *doppler_freq,
+        int doppler_freq_size,
+        precision *code,
+        int code_size,
+        precision samp,
+        precision complex *signal_models,
+        precision *signal_model_energy
+    ){
+    precision doppler_freq_samp;
+    precision complex *signal_model;
+
     for (int i = 0; i < doppler_freq_size; i++)
     {
+        signal_model = &signal_models[i*code_size];
+        signal_model_energy[i] = 0;
         for (int j = 0; j < code_size; j++)
         {
             doppler_freq_samp = (j+1)*2*M_PI*doppler_freq[i]*samp;
             signal_model[j] = (sin(doppler_freq_samp) * I  + cos(doppler_freq_samp)) * code[j];
+            signal_model_energy[i] += creal(signal_model[j]*conj(signal_model[j]));
         }
+    }
+}
+
+// Allocates the work arrays needed to search pulses of signal_samples_size
+// samples with a bank of doppler_freq_size signal models of code_size samples.
+// The same workspace can be reused for any number of pulses of that shape.
+xcorr_workspace *xcorr_workspace_create(int signal_samples_size, int code_size, int doppler_freq_size){
+    int decoded_size = signal_samples_size + code_size;
+    xcorr_workspace *workspace = malloc(sizeof(xcorr_workspace));
+    if (workspace == NULL)
+    {
+        return NULL;
+    }
+
+    workspace->signal_samples_size = signal_samples_size;
+    workspace->code_size = code_size;
+    workspace->doppler_freq_size = doppler_freq_size;
+    workspace->norm_coefs = malloc(sizeof(precision)*decoded_size);
+    workspace->pows = malloc(sizeof(precision complex)*doppler_freq_size*decoded_size);
+    workspace->pows_normalized = malloc(sizeof(precision complex)*doppler_freq_size*decoded_size);
+    workspace->powmax = malloc(sizeof(precision complex)*doppler_freq_size);
+    workspace->maxpowind = malloc(sizeof(int)*doppler_freq_size);
+
+    if (workspace->norm_coefs == NULL || workspace->pows == NULL || workspace->pows_normalized == NULL
+        || workspace->powmax == NULL || workspace->maxpowind == NULL)
+    {
+        xcorr_workspace_free(workspace);
+        return NULL;
+    }
+    return workspace;
+}
+
+void xcorr_workspace_free(xcorr_workspace *workspace){
+    if (workspace == NULL)
+    {
+        return;
+    }
+    free(workspace->norm_coefs);
+    free(workspace->pows);
+    free(workspace->pows_normalized);
+    free(workspace->powmax);
+    free(workspace->maxpowind);
+    free(workspace);
+}
+
+// Crosscorrelates one pulse with all signal models of a code bank, the
+// crosscorrelation is written straight into the rows of pows and pows_normalized
+// so only the normalization coefficients are taken from the workspace.
+void xcorr_workspace_search(
+        xcorr_workspace *workspace,
+        precision complex *signal_samples,
+        precision complex *signal_models,
+        precision *signal_model_energy,
+        precision complex *pows,
+        precision complex *pows_normalized,
+        precision complex *powmax,
+        int *maxpowind
+    ){
 
-        elementwise_cabs_square(signal_model, 0, code_size, signal_model_abs_arr);
-        precision complex signal_model_abs_sum = complex_sum(signal_model_abs_arr, code_size);
+    int signal_samples_size = workspace->signal_samples_size;
+    int code_size = workspace->code_size;
+    int doppler_freq_size = workspace->doppler_freq_size;
+    int decoded_size = signal_samples_size + code_size;
+    precision *norm_coefs = workspace->norm_coefs;
+
+    memset(powmax, 0, sizeof(precision complex)*doppler_freq_size);
+    memset(maxpowind, 0, sizeof(int)*doppler_freq_size);
+
+    normalization_coefficients(signal_samples, signal_samples_size, code_size, norm_coefs);
+
+    for (int i = 0; i < doppler_freq_size; i++)
+    {
+        precision complex *signal_model = &signal_models[i*code_size];
+        precision complex signal_model_abs_sum = signal_model_energy[i];
+        precision complex *decoded = &pows[i*decoded_size];
+        precision complex *output_power = &pows_normalized[i*decoded_size];
 
         crosscorrelate(signal_samples, signal_samples_size, signal_model, code_size, -signal_samples_size, code_size, decoded);
 
         for (int j = 0; j < decoded_size; j++)
         {
-            if (cabs(norm_coefs[j]) < FLT_EPSILON)
-            {
-                norm_coefs[j] = 1;
-            }
             output_power[j] = decoded[j]/(sqrt(norm_coefs[j])*sqrt(signal_model_abs_sum));
             output_power[j] = cpow(cabs(output_power[j]), 2);
                         
@@ -133,16 +219,545 @@ void perform_xcorr(
             }
         }
         maxpowind[i] = maxpowind[i] - code_size;
+    }
+}
+
+void xcorr_code_bank_search(
+        precision complex *signal_samples,
+        int signal_samples_size,
+        precision complex *signal_models,
+        precision *signal_model_energy,
+        int doppler_freq_size,
+        int code_size,
+        precision complex *pows,
+        precision complex *pows_normalized,
+        int *pows_size,
+        precision complex *powmax,
+        int powmax_size,
+        int *maxpowind,
+        int maxpowind_size
+    ){
+
+    xcorr_workspace *workspace = xcorr_workspace_create(signal_samples_size, code_size, doppler_freq_size);
+    assert(workspace != NULL);
+
+    // Setting arrays to zeroes
+    memset(pows, 0, sizeof(precision complex)*pows_size[0]*pows_size[1]);
+    memset(pows_normalized, 0, sizeof(precision complex)*pows_size[0]*pows_size[1]);
+    memset(powmax, 0, sizeof(precision complex)*powmax_size);
+    memset(maxpowind, 0, sizeof(int)*maxpowind_size);
+
+    xcorr_workspace_search(
+        workspace,
+        signal_samples,
+        signal_models,
+        signal_model_energy,
+        pows,
+        pows_normalized,
+        powmax,
+        maxpowind
+    );
+
+    xcorr_workspace_free(workspace);
+}
+
+// Runs xcorr_workspace_search for pulse_amount pulses stored row by row in
+// signal_samples and reduces the output of each pulse to the maximum over all
+// doppler shifts for each delay and the best peak, start and doppler index.
+// The pulses are matched with the code bank given by code_bank_index.
+// If store_pows is set the full crosscorrelation of each pulse is stored in pows_output.
+// No memory is allocated, all work arrays are taken from the workspace.
+void xcorr_workspace_search_pulses(
+        xcorr_workspace *workspace,
+        precision complex *signal_samples,
+        int pulse_amount,
+        precision complex *signal_models,
+        precision *signal_model_energy,
+        int *code_bank_index,
+        precision complex *max_pow_per_delay,
+        precision complex *max_pow_per_delay_norm,
+        precision complex *best_peak,
+        int *best_start,
+        int *best_doppler_index,
+        precision complex *pows_output,
+        int store_pows,
+        int peak_amount,
+        int peak_doppler_separation,
+        int peak_delay_separation,
+        precision *peak_power,
+        int *peak_delay,
+        int *peak_doppler_index
+    ){
+    int signal_samples_size = workspace->signal_samples_size;
+    int code_size = workspace->code_size;
+    int doppler_freq_size = workspace->doppler_freq_size;
+    int decoded_size = signal_samples_size + code_size;
+    int best_index;
+    precision complex *pows;
+    precision complex *powmax = workspace->powmax;
+
+    for (int x = 0; x < pulse_amount; x++)
+    {
+        pows = store_pows ? &pows_output[x*doppler_freq_size*decoded_size] : workspace->pows;
+
+        xcorr_workspace_search(
+            workspace,
+            &signal_samples[x*signal_samples_size],
+            &signal_models[code_bank_index[x]*doppler_freq_size*code_size],
+            &signal_model_energy[code_bank_index[x]*doppler_freq_size],
+            pows,
+            workspace->pows_normalized,
+            powmax,
+            workspace->maxpowind
+        );
+
+        max_over_rows(pows, doppler_freq_size, decoded_size, &max_pow_per_delay[x*decoded_size]);
+        max_over_rows(workspace->pows_normalized, doppler_freq_size, decoded_size, &max_pow_per_delay_norm[x*decoded_size]);
+
+        best_index = 0;
+        for (int i = 1; i < doppler_freq_size; i++)
+        {
+            if (complex_greater(powmax[i], powmax[best_index]))
+            {
+                best_index = i;
+            }
+        }
+        best_peak[x] = powmax[best_index];
+        best_start[x] = workspace->maxpowind[best_index];
+        best_doppler_index[x] = best_index;
+
+        if (peak_amount > 0)
+        {
+            // The normalized power is real, read the real parts of the interleaved complex values
+            find_peaks(
+                (precision *)workspace->pows_normalized,
+                2,
+                doppler_freq_size,
+                decoded_size,
+                peak_amount,
+                peak_doppler_separation,
+                peak_delay_separation,
+                &peak_power[x*peak_amount],
+                &peak_doppler_index[x*peak_amount],
+                &peak_delay[x*peak_amount]
+            );
+        }
+    }
+}
+
+// Same as xcorr_workspace_search_pulses but with a workspace that only lives for this call
+void xcorr_code_bank_search_pulses(
+        precision complex *signal_samples,
+        int signal_samples_size,
+        int pulse_amount,
+        precision complex *signal_models,
+        precision *signal_model_energy,
+        int *code_bank_index,
+        int doppler_freq_size,
+        int code_size,
+        precision complex *max_pow_per_delay,
+        precision complex *max_pow_per_delay_norm,
+        precision complex *best_peak,
+        int *best_start,
+        int *best_doppler_index,
+        precision complex *pows_output,
+        int store_pows
+    ){
+    xcorr_workspace *workspace = xcorr_workspace_create(signal_samples_size, code_size, doppler_freq_size);
+    assert(workspace != NULL);
+
+    xcorr_workspace_search_pulses(
+        workspace,
+        signal_samples,
+        pulse_amount,
+        signal_models,
+        signal_model_energy,
+        code_bank_index,
+        max_pow_per_delay,
+        max_pow_per_delay_norm,
+        best_peak,
+        best_start,
+        best_doppler_index,
+        pows_output,
+        store_pows,
+        0,
+        0,
+        0,
+        NULL,
+        NULL,
+        NULL
+    );
+
+    xcorr_workspace_free(workspace);
+}
+
+// Allocates the split real and imaginary work arrays used by the planar kernel
+xcorr_planar_workspace *xcorr_planar_workspace_create(int signal_samples_size, int code_size, int doppler_freq_size){
+    int decoded_size = signal_samples_size + code_size;
+    xcorr_planar_workspace *workspace = malloc(sizeof(xcorr_planar_workspace));
+    if (workspace == NULL)
+    {
+        return NULL;
+    }
+
+    workspace->signal_samples_size = signal_samples_size;
+    workspace->code_size = code_size;
+    workspace->doppler_freq_size = doppler_freq_size;
+    workspace->norm_coefs = malloc(sizeof(precision)*decoded_size);
+    workspace->decoded_real = malloc(sizeof(precision)*doppler_freq_size*decoded_size);
+    workspace->decoded_imag = malloc(sizeof(precision)*doppler_freq_size*decoded_size);
+    workspace->pows_normalized = malloc(sizeof(precision)*doppler_freq_size*decoded_size);
+
+    if (workspace->norm_coefs == NULL || workspace->decoded_real == NULL
+        || workspace->decoded_imag == NULL || workspace->pows_normalized == NULL)
+    {
+        xcorr_planar_workspace_free(workspace);
+        return NULL;
+    }
+    return workspace;
+}
+
+void xcorr_planar_workspace_free(xcorr_planar_workspace *workspace){
+    if (workspace == NULL)
+    {
+        return;
+    }
+    free(workspace->norm_coefs);
+    free(workspace->decoded_real);
+    free(workspace->decoded_imag);
+    free(workspace->pows_normalized);
+    free(workspace);
+}
+
+// Same as crosscorrelate over all delays but on split real and imaginary arrays.
+// The loops run over the code samples and then over the signal, so the inner loop
+// is a branch free multiply-add on contiguous arrays that the compiler can vectorize.
+// The result has size_x + size_y elements and has to be zeroed before the call.
+void crosscorrelate_planar(
+        const precision *restrict x_real,
+        const precision *restrict x_imag,
+        int size_x,
+        const precision *restrict y_real,
+        const precision *restrict y_imag,
+        int size_y,
+        precision *restrict result_real,
+        precision *restrict result_imag
+    ){
+    for (int j = 0; j < size_y; j++)
+    {
+        const precision y_re = y_real[j];
+        const precision y_im = y_imag[j];
+        precision *restrict out_real = &result_real[size_y - j];
+        precision *restrict out_imag = &result_imag[size_y - j];
+
+        for (int i = 0; i < size_x; i++)
+        {
+            out_real[i] += x_real[i]*y_re + x_imag[i]*y_im;
+            out_imag[i] += x_imag[i]*y_re - x_real[i]*y_im;
+        }
+    }
+}
+
+// Same as normalization_coefficients but on split real and imaginary arrays
+void normalization_coefficients_planar(
+        const precision *restrict x_real,
+        const precision *restrict x_imag,
+        int signal_samples_size,
+        int code_size,
+        precision *restrict norm_coefs
+    ){
+    int window_size = code_size < signal_samples_size ? code_size : signal_samples_size;
+    precision window_energy = 0;
+
+    for (int i = 0; i < window_size; i++)
+    {
+        window_energy += x_real[i]*x_real[i] + x_imag[i]*x_imag[i];
+    }
+    for (int i = 0; i < code_size; i++)
+    {
+        norm_coefs[i] = window_energy;
+    }
+    for (int i = code_size; i < signal_samples_size; i++)
+    {
+        norm_coefs[i] = window_energy;
+        window_energy += x_real[i]*x_real[i] + x_imag[i]*x_imag[i];
+        window_energy -= x_real[i-code_size]*x_real[i-code_size] + x_imag[i-code_size]*x_imag[i-code_size];
+    }
+    for (int i = signal_samples_size; i < signal_samples_size + code_size; i++)
+    {
+        norm_coefs[i] = window_energy;
+    }
+    for (int i = 0; i < signal_samples_size + code_size; i++)
+    {
+        if (norm_coefs[i] < FLT_EPSILON)
+        {
+            norm_coefs[i] = 1;
+        }
+    }
+}
+
+// Planar version of xcorr_workspace_search_pulses. The signals and signal models
+// are given as split real and imaginary arrays and the normalized power is computed
+// as the squared magnitude divided by the window and model energy, without any
+// complex function calls. The outputs are the same interleaved complex arrays as
+// for xcorr_workspace_search_pulses.
+void xcorr_planar_search_pulses(
+        xcorr_planar_workspace *workspace,
+        precision *signal_samples_real,
+        precision *signal_samples_imag,
+        int pulse_amount,
+        precision *signal_models_real,
+        precision *signal_models_imag,
+        precision *signal_model_energy,
+        int *code_bank_index,
+        precision complex *max_pow_per_delay,
+        precision complex *max_pow_per_delay_norm,
+        precision complex *best_peak,
+        int *best_start,
+        int *best_doppler_index,
+        precision complex *pows_output,
+        int store_pows,
+        int peak_amount,
+        int peak_doppler_separation,
+        int peak_delay_separation,
+        precision *peak_power,
+        int *peak_delay,
+        int *peak_doppler_index
+    ){
+    int signal_samples_size = workspace->signal_samples_size;
+    int code_size = workspace->code_size;
+    int doppler_freq_size = workspace->doppler_freq_size;
+    int decoded_size = signal_samples_size + code_size;
+    precision *restrict norm_coefs = workspace->norm_coefs;
+    precision *restrict decoded_real = workspace->decoded_real;
+    precision *restrict decoded_imag = workspace->decoded_imag;
+    precision *restrict pows_normalized = workspace->pows_normalized;
+
+    for (int x = 0; x < pulse_amount; x++)
+    {
+        precision *x_real = &signal_samples_real[x*signal_samples_size];
+        precision *x_imag = &signal_samples_imag[x*signal_samples_size];
+        int bank_offset = code_bank_index[x]*doppler_freq_size;
+        precision complex *pulse_max_pow = &max_pow_per_delay[x*decoded_size];
+        precision complex *pulse_max_pow_norm = &max_pow_per_delay_norm[x*decoded_size];
+        precision best_pow = 0;
+        int best_index = 0;
+        int best_delay = 0;
+
+        normalization_coefficients_planar(x_real, x_imag, signal_samples_size, code_size, norm_coefs);
+        memset(decoded_real, 0, sizeof(precision)*doppler_freq_size*decoded_size);
+        memset(decoded_imag, 0, sizeof(precision)*doppler_freq_size*decoded_size);
+
+        for (int i = 0; i < doppler_freq_size; i++)
+        {
+            precision *restrict row_real = &decoded_real[i*decoded_size];
+            precision *restrict row_imag = &decoded_imag[i*decoded_size];
+            precision *restrict row_pows = &pows_normalized[i*decoded_size];
+            const precision energy = signal_model_energy[bank_offset + i];
+
+            crosscorrelate_planar(
+                x_real,
+                x_imag,
+                signal_samples_size,
+                &signal_models_real[(bank_offset + i)*code_size],
+                &signal_models_imag[(bank_offset + i)*code_size],
+                code_size,
+                row_real,
+                row_imag
+            );
+
+            for (int j = 0; j < decoded_size; j++)
+            {
+                row_pows[j] = (row_real[j]*row_real[j] + row_imag[j]*row_imag[j])/(norm_coefs[j]*energy);
+            }
+
+            // The first maximum over delays and then over doppler shifts is the best peak
+            precision row_max = 0;
+            int row_max_index = 0;
+            for (int j = 0; j < decoded_size; j++)
+            {
+                if (row_pows[j] > row_max)
+                {
+                    row_max = row_pows[j];
+                    row_max_index = j;
+                }
+            }
+            if (row_max > best_pow)
+            {
+                best_pow = row_max;
+                best_index = i;
+                best_delay = row_max_index;
+            }
+        }
+
         for (int j = 0; j < decoded_size; j++)
         {
-            pows_normalized[i*decoded_size+j] = output_power[j];
-            pows[i*decoded_size+j] = decoded[j];
-        }          
+            precision max_real = decoded_real[j];
+            precision max_imag = decoded_imag[j];
+            precision max_norm = pows_normalized[j];
+            for (int i = 1; i < doppler_freq_size; i++)
+            {
+                precision re = decoded_real[i*decoded_size + j];
+                precision im = decoded_imag[i*decoded_size + j];
+                if (re > max_real || (re == max_real && im > max_imag))
+                {
+                    max_real = re;
+                    max_imag = im;
+                }
+                if (pows_normalized[i*decoded_size + j] > max_norm)
+                {
+                    max_norm = pows_normalized[i*decoded_size + j];
+                }
+            }
+            pulse_max_pow[j] = max_real + max_imag*I;
+            pulse_max_pow_norm[j] = max_norm;
+        }
+
+        best_peak[x] = best_pow;
+        best_start[x] = best_delay - code_size;
+        best_doppler_index[x] = best_index;
+
+        if (store_pows)
+        {
+            precision complex *pows = &pows_output[x*doppler_freq_size*decoded_size];
+            for (int k = 0; k < doppler_freq_size*decoded_size; k++)
+            {
+                pows[k] = decoded_real[k] + decoded_imag[k]*I;
+            }
+        }
+
+        if (peak_amount > 0)
+        {
+            find_peaks(
+                pows_normalized,
+                1,
+                doppler_freq_size,
+                decoded_size,
+                peak_amount,
+                peak_doppler_separation,
+                peak_delay_separation,
+                &peak_power[x*peak_amount],
+                &peak_doppler_index[x*peak_amount],
+                &peak_delay[x*peak_amount]
+            );
+        }
     }
+}
 
+// Checks if element (row, col) of a rows by cols matrix, with elements stride
+// values apart, is at least as large as all of its neighbours
+bool is_local_maximum(const precision *values, int stride, int rows, int cols, int row, int col){
+    precision value = values[(row*cols + col)*stride];
+    for (int i = row - 1; i <= row + 1; i++)
+    {
+        if (i < 0 || i >= rows)
+        {
+            continue;
+        }
+        for (int j = col - 1; j <= col + 1; j++)
+        {
+            if (j < 0 || j >= cols || (i == row && j == col))
+            {
+                continue;
+            }
+            if (values[(i*cols + j)*stride] > value)
+            {
+                return false;
+            }
+        }
+    }
+    return true;
 }
 
+// Finds the peak_amount largest positive local maxima of a rows by cols matrix,
+// with elements stride values apart, in descending order. A local maximum is only
+// selected if it is at least min_row_separation rows or min_col_separation columns
+// away from all previously selected ones. Missing peaks have power 0 and index -1.
+void find_peaks(
+        const precision *values,
+        int stride,
+        int rows,
+        int cols,
+        int peak_amount,
+        int min_row_separation,
+        int min_col_separation,
+        precision *peak_power,
+        int *peak_row,
+        int *peak_col
+    ){
+    for (int k = 0; k < peak_amount; k++)
+    {
+        peak_power[k] = 0;
+        peak_row[k] = -1;
+        peak_col[k] = -1;
+    }
 
+    for (int k = 0; k < peak_amount; k++)
+    {
+        precision best = 0;
+        int best_row = -1;
+        int best_col = -1;
+
+        for (int i = 0; i < rows; i++)
+        {
+            for (int j = 0; j < cols; j++)
+            {
+                precision value = values[(i*cols + j)*stride];
+                if (!(value > best))
+                {
+                    continue;
+                }
+
+                bool separated = true;
+                for (int l = 0; l < k; l++)
+                {
+                    if (abs(i - peak_row[l]) < min_row_separation && abs(j - peak_col[l]) < min_col_separation)
+                    {
+                        separated = false;
+                        break;
+                    }
+                }
+                if (separated && is_local_maximum(values, stride, rows, cols, i, j))
+                {
+                    best = value;
+                    best_row = i;
+                    best_col = j;
+                }
+            }
+        }
+
+        if (best_row < 0)
+        {
+            break;
+        }
+        peak_power[k] = best;
+        peak_row[k] = best_row;
+        peak_col[k] = best_col;
+    }
+}
+
+// Orders complex numbers lexicographically, first by real and then by imaginary part
+bool complex_greater(precision complex a, precision complex b){
+    return creal(a) > creal(b) || (creal(a) == creal(b) && cimag(a) > cimag(b));
+}
+
+// Stores the column-wise maximum of a rows by cols matrix in outarray
+void max_over_rows(precision complex *inarray, int rows, int cols, precision complex *outarray){
+    for (int j = 0; j < cols; j++)
+    {
+        outarray[j] = inarray[j];
+    }
+    for (int i = 1; i < rows; i++)
+    {
+        for (int j = 0; j < cols; j++)
+        {
+            if (complex_greater(inarray[i*cols + j], outarray[j]))
+            {
+                outarray[j] = inarray[i*cols + j];
+            }
+        }
+    }
+}
 
 void crosscorrelate(precision complex *x, int size_x, precision complex *y, int size_y, int min_delay, int max_delay, precision complex *result){
     assert(max_delay > min_delay);
@@ -171,6 +786,41 @@ void crosscorrelate_single_delay(precision complex *x, int size_x, precision com
     *result = correlation;
 }
 
+// Calculates the signal energy in a code_size long window for each delay
+// using a running sum. Delays where the code is only partially overlapping
+// the signal use the energy of the first or last window. Windows without
+// energy are set to 1 to avoid division by zero.
+void normalization_coefficients(precision complex *signal_samples, int signal_samples_size, int code_size, precision *norm_coefs){
+    int window_size = code_size < signal_samples_size ? code_size : signal_samples_size;
+    precision window_energy = 0;
+
+    for (int i = 0; i < window_size; i++)
+    {
+        window_energy += creal(signal_samples[i]*conj(signal_samples[i]));
+    }
+    for (int i = 0; i < code_size; i++)
+    {
+        norm_coefs[i] = window_energy;
+    }
+    for (int i = code_size; i < signal_samples_size; i++)
+    {
+        norm_coefs[i] = window_energy;
+        window_energy += creal(signal_samples[i]*conj(signal_samples[i]));
+        window_energy -= creal(signal_samples[i-code_size]*conj(signal_samples[i-code_size]));
+    }
+    for (int i = signal_samples_size; i < signal_samples_size + code_size; i++)
+    {
+        norm_coefs[i] = window_energy;
+    }
+    for (int i = 0; i < signal_samples_size + code_size; i++)
+    {
+        if (norm_coefs[i] < FLT_EPSILON)
+        {
+            norm_coefs[i] = 1;
+        }
+    }
+}
+
 // Sets the value of abs_signal_samples_sum from start to stop on outarray
 void set_norm_coefs(precision complex *abs_signal_samples_sum, int start, int stop, precision complex *outarray){
     for (int i = start; i < stop; i++)
@@ -3,13 +3,52 @@
 #define XCORR_H_
 #define precision double
 
+// Work arrays for searching pulses of one shape, allocated once and reused for every pulse
+typedef struct xcorr_workspace {
+    int signal_samples_size;
+    int code_size;
+    int doppler_freq_size;
+    precision *norm_coefs;
+    precision complex *pows;
+    precision complex *pows_normalized;
+    precision complex *powmax;
+    int *maxpowind;
+} xcorr_workspace;
+
+// Split real and imaginary work arrays of the planar kernel
+typedef struct xcorr_planar_workspace {
+    int signal_samples_size;
+    int code_size;
+    int doppler_freq_size;
+    precision *norm_coefs;
+    precision *decoded_real;
+    precision *decoded_imag;
+    precision *pows_normalized;
+} xcorr_planar_workspace;
+
 void arange(precision start, precision stop, precision step, precision *outarray);
 void elementwise_cabs_square(precision complex *inarray, int start, int stop, precision complex *outarray);
 void crosscorrelate_single_delay(precision complex *x, int size_x, precision complex *y, int size_y, int delay, precision complex *result);
 void crosscorrelate(precision complex *x, int size_x, precision complex *y, int size_y, int min_delay, int max_delay, precision complex *result);
 void max_in_array(precision complex *inarray, int size, precision complex *maxval, int *maxvalindex);
+void normalization_coefficients(precision complex *signal_samples, int signal_samples_size, int code_size, precision *norm_coefs);
 void set_norm_coefs(precision complex *abs_signal_samples_sum, int start, int stop, precision complex *outarray);
 precision complex complex_sum(precision complex *inarray, int size);
+bool complex_greater(precision complex a, precision complex b);
+bool is_local_maximum(const precision *values, int stride, int rows, int cols, int row, int col);
+void find_peaks(
+    const precision *values,
+    int stride,
+    int rows,
+    int cols,
+    int peak_amount,
+    int min_row_separation,
+    int min_col_separation,
+    precision *peak_power,
+    int *peak_row,
+    int *peak_col
+);
+void max_over_rows(precision complex *inarray, int rows, int cols, precision complex *outarray);
 
 void perform_xcorr( 
     precision complex *signal_samples,
@@ -28,6 +67,131 @@ void perform_xcorr(
     precision samp
 );
 
+void code_bank(
+    precision *doppler_freq,
+    int doppler_freq_size,
+    precision *code,
+    int code_size,
+    precision samp,
+    precision complex *signal_models,
+    precision *signal_model_energy
+);
+
+void xcorr_code_bank_search(
+    precision complex *signal_samples,
+    int signal_samples_size,
+    precision complex *signal_models,
+    precision *signal_model_energy,
+    int doppler_freq_size,
+    int code_size,
+    precision complex *pows,
+    precision complex *pows_normalized,
+    int *pows_size,
+    precision complex *powmax,
+    int powmax_size,
+    int *maxpowind,
+    int maxpowind_size
+);
+
+xcorr_workspace *xcorr_workspace_create(int signal_samples_size, int code_size, int doppler_freq_size);
+void xcorr_workspace_free(xcorr_workspace *workspace);
+
+void xcorr_workspace_search(
+    xcorr_workspace *workspace,
+    precision complex *signal_samples,
+    precision complex *signal_models,
+    precision *signal_model_energy,
+    precision complex *pows,
+    precision complex *pows_normalized,
+    precision complex *powmax,
+    int *maxpowind
+);
+
+void xcorr_workspace_search_pulses(
+    xcorr_workspace *workspace,
+    precision complex *signal_samples,
+    int pulse_amount,
+    precision complex *signal_models,
+    precision *signal_model_energy,
+    int *code_bank_index,
+    precision complex *max_pow_per_delay,
+    precision complex *max_pow_per_delay_norm,
+    precision complex *best_peak,
+    int *best_start,
+    int *best_doppler_index,
+    precision complex *pows_output,
+    int store_pows,
+    int peak_amount,
+    int peak_doppler_separation,
+    int peak_delay_separation,
+    precision *peak_power,
+    int *peak_delay,
+    int *peak_doppler_index
+);
+
+xcorr_planar_workspace *xcorr_planar_workspace_create(int signal_samples_size, int code_size, int doppler_freq_size);
+void xcorr_planar_workspace_free(xcorr_planar_workspace *workspace);
+
+void crosscorrelate_planar(
+    const precision *restrict x_real,
+    const precision *restrict x_imag,
+    int size_x,
+    const precision *restrict y_real,
+    const precision *restrict y_imag,
+    int size_y,
+    precision *restrict result_real,
+    precision *restrict result_imag
+);
+
+void normalization_coefficients_planar(
+    const precision *restrict x_real,
+    const precision *restrict x_imag,
+    int signal_samples_size,
+    int code_size,
+    precision *restrict norm_coefs
+);
+
+void xcorr_planar_search_pulses(
+    xcorr_planar_workspace *workspace,
+    precision *signal_samples_real,
+    precision *signal_samples_imag,
+    int pulse_amount,
+    precision *signal_models_real,
+    precision *signal_models_imag,
+    precision *signal_model_energy,
+    int *code_bank_index,
+    precision complex *max_pow_per_delay,
+    precision complex *max_pow_per_delay_norm,
+    precision complex *best_peak,
+    int *best_start,
+    int *best_doppler_index,
+    precision complex *pows_output,
+    int store_pows,
+    int peak_amount,
+    int peak_doppler_separation,
+    int peak_delay_separation,
+    precision *peak_power,
+    int *peak_delay,
+    int *peak_doppler_index
+);
+
+void xcorr_code_bank_search_pulses(
+    precision complex *signal_samples,
+    int signal_samples_size,
+    int pulse_amount,
+    precision complex *signal_models,
+    precision *signal_model_energy,
+    int *code_bank_index,
+    int doppler_freq_size,
+    int code_size,
+    precision complex *max_pow_per_delay,
+    precision complex *max_pow_per_delay_norm,
+    precision complex *best_peak,
+    int *best_start,
+    int *best_doppler_index,
+    precision complex *pows_output,
+    int store_pows
+);
 
 void xcorr_echo_search(
     precision doppler_freq_min,
@@ -47,4 +211,4 @@ void xcorr_echo_search(
     precision samp
 );
 
-#endif // XCORR_H_
\ No newline at end of file
+#endif // XCORR_H_
\ No newline at end of file
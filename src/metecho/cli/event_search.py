@@ -3,10 +3,13 @@ import os
 import logging
 import pickle
 
+import numpy as np
+
 from .. import data
 from .. import tools
 from .. import events
 from .. import signal_model
+from ..generalized_matched_filter import MatchedFilterCache, xcorr
 from .commands import add_command
 
 logger = logging.getLogger(__name__)
@@ -39,6 +42,7 @@ def raw_data_file_list(output_dir, cli_logger, args):
         if path.is_dir():
             data_store = data.DataStore(
                 path,
+                backends=[backend],
                 include_convertable=args.convert,
             )
             paths += [file for file, backend in data_store.get_files()]
@@ -60,8 +64,10 @@ def raw_data_file_list(output_dir, cli_logger, args):
                 )[0]
                 continue
 
+            # Only files of the search backend, e.g. MUI files are also raw data but
+            # of the "mui_mmap" backend
             backend_fmt = data.check_if_raw_data(path)
-            if backend_fmt is not None:
+            if backend_fmt == backend:
                 paths.append(path)
             else:
                 cli_logger.warning(
@@ -69,9 +75,23 @@ def raw_data_file_list(output_dir, cli_logger, args):
                     nor a file of a supported raw data format and therefor skipped'
                 )
 
+    if args.sequential:
+        paths.sort(key=file_start_date)
+
     return paths
 
 
+def file_start_date(path):
+    """Key that sorts the raw data files in time for the sequential search."""
+    return data.mu.get_MU_h5_date(path)
+
+
+def matched_filter_cache(args):
+    if args.no_cache:
+        return None
+    return MatchedFilterCache(args.cache_dir, max_size=int(args.cache_size*2**20))
+
+
 @tools.MPI_target_arg(0)
 def find_events(file, args, cli_logger):
     cli_logger.info(f"Handling {file}")
@@ -83,10 +103,10 @@ def find_events(file, args, cli_logger):
 
     raw = data.RawDataInterface(file, backend=backend)
 
-    signal = signal_model.phase_coding.barker_code_13(
-        raw.data.shape[raw.axis["pulse"]],
-        2,
-    )
+    # The same code is used for every pulse
+    signal = signal_model.phase_coding.barker_code_13(1, 2)
+
+    cache = matched_filter_cache(args)
 
     event_list, nonhead, best_data, noise = events.search(
         raw,
@@ -96,6 +116,7 @@ def find_events(file, args, cli_logger):
         plot=args.plot,
         save_as_image=args.plot_save,
         save_location=args.plot_output,
+        cache=cache,
     )
     if args.best_data:
         return [event_list, nonhead, best_data, noise]
@@ -103,6 +124,116 @@ def find_events(file, args, cli_logger):
         return [event_list, nonhead, None, noise]
 
 
+def filter_file(file, config, signal, cache):
+    """Runs the matched filter on a file and keeps only the per-pulse values used by
+    the streaming event search, so that they can be shared between processes.
+    """
+    raw = data.RawDataInterface(file, backend="mu_h5")
+    echo_search = xcorr.xcorr_echo_search if cache is None else cache.xcorr_echo_search
+    matched_filter_output = echo_search(
+        raw,
+        config.getint("General", "dop_min_freq"),
+        config.getint("General", "dop_max_freq"),
+        config.getint("General", "dop_step_size"),
+        signal,
+        progress_bar=False,
+    )
+    segment = {key: matched_filter_output[key] for key in ["best_peak", "best_doppler", "best_start"]}
+    segment["tot_pow"] = events.event_stream.total_power(raw)
+    segment["noise"] = events.event_stream.noise_sums(raw, matched_filter_output["best_peak"], config)
+    segment["path"] = raw.path
+    segment["meta"] = {key: raw.meta[key] for key in ["date", "T_ipp"] if key in raw.meta}
+    return segment
+
+
+def overlap_segments(segments, pulses, from_end=False):
+    """The first, or last, `pulses` pulses of a list of per-file segments."""
+    selected = []
+    for segment in (reversed(segments) if from_end else segments):
+        if pulses <= 0:
+            break
+        size = len(segment["best_peak"])
+        pulse_slice = slice(max(size - pulses, 0), None) if from_end else slice(0, pulses)
+        overlap = dict(segment)
+        for key in events.event_stream.PULSE_KEYS:
+            overlap[key] = segment[key][pulse_slice]
+        overlap["noise"] = None
+        selected.append(overlap)
+        pulses -= size
+    return selected[::-1] if from_end else selected
+
+
+def find_events_sequential(paths, args, cli_logger):
+    """
+    Searches a time ordered list of files as one continuous sequence of pulses so that
+    events spanning several files are found as one event. With MPI each process
+    searches a contiguous chunk of files. The processes exchange the matched filter
+    output of the `--overlap` pulses at each end of their chunk, so that events crossing
+    a chunk boundary are completed by the process where they start, and the noise
+    statistics are warmed up, without filtering the overlap twice.
+    """
+    config = events.generate_event_search_config()
+    signal = signal_model.phase_coding.barker_code_13(1, 2)
+    cache = matched_filter_cache(args)
+
+    active = min(comm.size, len(paths))
+    chunks = np.array_split(np.arange(len(paths)), max(active, 1))
+    own_files = [paths[ind] for ind in chunks[comm.rank]] if comm.rank < active else []
+
+    segments = []
+    for file in own_files:
+        cli_logger.info(f"Handling {file}")
+        segments.append(filter_file(file, config, signal, cache))
+
+    previous_tail, next_head = [], []
+    if comm.size > 1 and comm.rank < active:
+        requests = []
+        if comm.rank > 0:
+            head = overlap_segments(segments, args.overlap)
+            requests.append(comm.isend(head, dest=comm.rank - 1, tag=0))
+        if comm.rank < active - 1:
+            tail = overlap_segments(segments, args.overlap, from_end=True)
+            requests.append(comm.isend(tail, dest=comm.rank + 1, tag=1))
+        if comm.rank > 0:
+            previous_tail = comm.recv(source=comm.rank - 1, tag=1)
+        if comm.rank < active - 1:
+            next_head = comm.recv(source=comm.rank + 1, tag=0)
+        for request in requests:
+            request.wait()
+
+    detector = events.StreamingEventSearch(config)
+    event_list = []
+    for segment in previous_tail + segments + next_head:
+        event_list += detector.update(
+            segment,
+            tot_pow=segment["tot_pow"],
+            path=segment["path"],
+            meta=segment["meta"],
+            noise=segment["noise"],
+        )
+    event_list += detector.flush()
+
+    # Events are kept by the process that searched the file they start in
+    own_paths = set(segment["path"] for segment in segments)
+    event_list = [ev for ev in event_list if ev.files[0] in own_paths]
+    cli_logger.info(f"Found {len(event_list)} events in {len(own_files)} files")
+
+    best_data = None
+    if args.best_data and len(segments) > 0:
+        best_data = [
+            np.concatenate([segment[key] for segment in segments])
+            for key in ["best_peak", "best_doppler", "best_start"]
+        ]
+    result = [event_list, [], best_data, detector.noise()]
+
+    if comm.size > 1:
+        results = comm.gather(result, root=0)
+        if comm.rank != 0:
+            return None
+        return [result for rank, result in enumerate(results) if rank < active]
+    return [result]
+
+
 def main(args, cli_logger):
     default_folder = Path(os.getcwd()) / "output"
 
@@ -135,7 +266,10 @@ def main(args, cli_logger):
     cli_logger.info("Getting file list...")
     paths = raw_data_file_list(output_dir, cli_logger, args)
 
-    results = find_events(paths, args, cli_logger, MPI=comm.size > 1, MPI_root=0)
+    if args.sequential:
+        results = find_events_sequential(paths, args, cli_logger)
+    else:
+        results = find_events(paths, args, cli_logger, MPI=comm.size > 1, MPI_root=0)
 
     if comm.rank == 0:
         if not save_results.parent.exists():
@@ -193,12 +327,35 @@ def parser_build(parser):
         help="Make sure raw data files are analyzed sequentially and events \
                         spanning multiple files are correctly identified.",
     )
+    parser.add_argument(
+        "--overlap",
+        type=int,
+        default=events.event_stream.NOISE_HISTORY,
+        help="Number of pulses of matched filter output shared between neighbouring \
+                        MPI processes in sequential mode",
+    )
     parser.add_argument(
         "-b",
         "--best_data",
         action="store_true",
         help="Stores best data in pickle if set.",
     )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(Path.home() / ".cache" / "metecho" / "matched_filter"),
+        help="Directory where matched filter outputs are cached between runs",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=4096,
+        help="Maximum size of the matched filter cache in MB",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always run the matched filter instead of using cached outputs",
+    )
     parser.add_argument(
         "radar", choices=["MU"], help="The radar that performed the observations"
     )
@@ -152,11 +152,9 @@ class DataStore:
                     backend_list[fid] = backend
 
         if self.include_convertable:
+            # Files that can be read by a backend may still be convertable,
+            # e.g. MUI files are both raw data and convertable to mu_h5
             for fid, file in enumerate(file_list):
-                # Only check files that do not have a backend
-                if backend_list[fid] is not None:
-                    continue
-
                 for fmt, to_backend in converters.CONVERTERS.items():
                     if "validator" not in to_backend:
                         continue
@@ -19,24 +19,59 @@ def validate_digital_rf(path):
     return path.exists()
 
 
-@raw_data.backend_loader("eiscat_digital_rf")
-def load_digital_rf(path, channel="rx", pulses=512, ipp=1.5e-3, samples_per_pulse=0):
+def _open_digital_rf(path, channel):
     do = drf.DigitalRFReader(str(path))
     channels = do.get_channels()
     if channel not in channels:
         raise ValueError(f"Channel '{channel}' not in channels... choose from:\n{channels}")
-    start_s, end_s = do.get_bounds(channel)
-    props = do.get_properties(channel)
-    samps_p_s = props["samples_per_second"]
-    ipp_samps = ipp*samps_p_s
+    return do
+
+
+def _read_pulses(do, channel, offset, ipp_samps, samples_per_pulse, pulses):
     data = np.empty((1, samples_per_pulse, pulses), dtype=np.complex64)
-    offset = start_s
     for ind in range(pulses):
         _d = do.read_vector_1d(offset, samples_per_pulse, channel)
         data[0, :, ind] = _d.astype('c8', casting='unsafe', copy=False)
         offset += ipp_samps
+    return data, offset
+
+
+@raw_data.backend_loader("eiscat_digital_rf")
+def load_digital_rf(path, channel="rx", pulses=512, ipp=1.5e-3, samples_per_pulse=0):
+    do = _open_digital_rf(path, channel)
+    start_s, end_s = do.get_bounds(channel)
+    props = do.get_properties(channel)
+    samps_p_s = props["samples_per_second"]
+    ipp_samps = ipp*samps_p_s
+    data, _ = _read_pulses(do, channel, start_s, ipp_samps, samples_per_pulse, pulses)
 
     meta = {}
     meta["filename"] = str(path)
+    meta["T_samp"] = 1.0/samps_p_s
 
     return data, {"channel": 0, "sample": 1, "pulse": 2}, meta
+
+
+def read_digital_rf_blocks(path, block_size=512, channel="rx", pulses=None, ipp=1.5e-3, samples_per_pulse=0):
+    """Reads a Digital RF recording as consecutive blocks of at most `block_size` pulses,
+    yielding one `RawDataInterface` per block so that only a single block is kept in memory.
+    If `pulses` is not given the recording is read until its end.
+    """
+    do = _open_digital_rf(path, channel)
+    start_s, end_s = do.get_bounds(channel)
+    props = do.get_properties(channel)
+    samps_p_s = props["samples_per_second"]
+    ipp_samps = ipp*samps_p_s
+    if pulses is None:
+        pulses = int((end_s - start_s - samples_per_pulse) // ipp_samps) + 1
+
+    offset = start_s
+    for block_start in range(0, pulses, block_size):
+        block_pulses = min(block_size, pulses - block_start)
+        data, offset = _read_pulses(do, channel, offset, ipp_samps, samples_per_pulse, block_pulses)
+
+        block = raw_data.RawDataInterface(path, backend="eiscat_digital_rf", load_on_init=False)
+        block.data = data
+        block.axis.update({"channel": 0, "sample": 1, "pulse": 2})
+        block.meta.update({"filename": str(path), "T_samp": 1.0/samps_p_s})
+        yield block
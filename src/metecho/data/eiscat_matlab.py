@@ -15,7 +15,7 @@ def validate_matlab(path):
 
 
 @raw_data.backend_loader("eiscat_vhf_matlab")
-def load_matlab(path, declutter=150, par_file=None, tlan_file=None):
+def load_matlab(path, declutter=150, par_file=None, tlan_file=None, dtype=np.complex128):
     # TODO: read this from tlan and par files
     meta = {}
 
@@ -74,5 +74,6 @@ def load_matlab(path, declutter=150, par_file=None, tlan_file=None):
     meta["code"] = code
     meta["filename"] = str(path)
 
-    data = data[:, declutter:, :].astype(np.complex128)
+    # The raw samples are single precision, only upcast if requested
+    data = data[:, declutter:, :].astype(dtype, copy=False)
     return data, {"channel": 0, "sample": 1, "pulse": 2}, meta
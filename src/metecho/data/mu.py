@@ -18,6 +18,8 @@ import h5py
 import logging
 import pathlib
 import os
+import multiprocessing
+from collections.abc import Mapping
 
 from .. import tools
 from . import raw_data
@@ -25,312 +27,168 @@ from . import converters
 
 logger = logging.getLogger(__name__)
 
+# Number of heights and channels in a MU record block
+MU_HEIGHTS = 85
+MU_CHANNELS = 25
+
+# Each record of a MU data block is the beam, channel and height followed by
+# 512 real and 512 imaginary samples and 380 unused bytes, 4480 bytes in total
+MU_RECORD_DTYPE = np.dtype([
+    ("beam", ">i1"),
+    ("channel", ">i1"),
+    ("height", ">i2"),
+    ("real", ">f4", (512,)),
+    ("imag", ">f4", (512,)),
+    ("padding", "V380"),
+])
+MU_BEAM_CHANNEL_HEIGHT_DTYPE = np.dtype([("beam", ">i1"), ("channel", ">i1"), ("height", ">i2")])
+
+# Default layout of the voltage data in mu_h5 files, the samples are stored in single
+# precision as in the MUI files and chunked along the pulse axis so that a range of
+# pulses can be read without reading the whole dataset
+MU_H5_DTYPE = np.complex64
+MU_H5_CHUNK_PULSES = 32
+
+
+# Copyright Csilla Szasz, Kenneth Kullbrandt, Daniel Kastinen
+# The 4480 byte header of a MUI record block, the comments give the (1-based)
+# byte positions of each field. Dates are DD-MMM-YYYY hh:mm:ss.ss strings and
+# the record end time only holds the hh:mm:ss.ss part.
+MU_HEADER_DTYPE = np.dtype([
+    ("mu_head_1_to_24", ">i4", (6,)),  # (1-24)
+    ("program_name", "S8"),  # (25-32) Data taking program name
+    ("file_load_time", "S24"),  # (33-56) Parameter file load time
+    ("program_number", ">i4", (1,)),  # (57-60) Data taking program number
+    ("record_start_time", "S24"),  # (61-84)
+    ("record_end_time", "S12"),  # (85-96)
+    ("mu_head_25_to_43", ">i4", (19,)),  # (97-172)
+    ("lag_number_per_ACF", ">u4", (21,)),  # (173-256)
+    ("beam_direction_number", ">u4", (16,)),  # (257-320) In the first 16 beams
+    ("mu_head_81_to_84", ">i4", (4,)),  # (321-336)
+    ("hp_file_name", "S8"),  # (337-344) HP parameter file name
+    ("mu_head_87_to_88", ">i4", (2,)),  # (345-352)
+    ("number_of_sum_ACF", ">u4", (16,)),  # (353-416) Number of sum (ACF method)
+    ("sample_points", ">i4", (1,)),  # (417-420)
+    ("reserved", "V180"),  # (421-600) Reserved for the future
+    ("observation_param_name", "S16"),  # (601-616)
+    ("mu_head_155_to_160", ">i4", (6,)),  # (617-640)
+    ("transmitted_pulse_pattern", ">i4", (64,)),  # (641-896)
+    ("mu_head_224_to_225", ">i4", (2,)),  # (897-904)
+    ("pulse_decoding_patterns", ">i4", (64,)),  # (905-1160) For all channels
+    ("beam_stearing_interval", ">i4", (1,)),  # (1161-1164)
+    ("beam_directions", ">i2", (256,)),  # (1165-1676)
+    ("mu_head_420_to_424", ">i4", (5,)),  # (1677-1696)
+    ("tx_frequency", ">u4", (5,)),  # (1697-1716) TX frequency offset
+    ("mu_head_430_to_431", ">i4", (2,)),  # (1717-1724)
+    ("rx_attentuator", ">u4", (4,)),  # (1725-1740)
+    ("tx_state", ">i4", (1,)),  # (1741-1744)
+    ("rx_state", ">u4", (4,)),  # (1745-1760)
+    ("rx_module_selection", ">i2", (26,)),  # (1761-1812)
+    ("mu_head_454_to_455", ">i4", (2,)),  # (1813-1820)
+    ("sample_start_time", ">u4", (256,)),  # (1821-2844) In units of sub-pulse/4
+    ("reception_sequence", ">i4", (1,)),  # (2845-2848)
+    ("channel_number_digital", ">i4", (29,)),  # (2849-2964) Channel number in digital combine
+    ("coherent_integrations", ">u4", (29,)),  # (2965-3080) For each combined channel
+    ("fft_points", ">u4", (29,)),  # (3081-3196) For each combined channel
+    ("data_points", ">u4", (29,)),  # (3197-3312) For each combined channel
+    ("lo_hi_bound_fft_0", ">i2", (58,)),  # (3313-3428) FFT number boundaries of each combined channel
+    ("lo_hi_bound_fft_1", ">i2", (58,)),  # (3429-3544)
+    ("lo_hi_bound_fft_2", ">i2", (58,)),  # (3545-3660)
+    ("rx_frequency_offset", ">u4", (29,)),  # (3661-3776) For each combined channel
+    ("fir_rx_coefficient", ">i2", (16,)),  # (3777-3808)
+    ("fir_rx_gain", ">i2", (58,)),  # (3809-3924) For each combined channel
+    ("mu_head_982_to_985", ">i4", (4,)),  # (3925-3940)
+    ("cic_rx_filter_amount", ">u4", (29,)),  # (3941-4056) For each combined channel
+    ("cic_rx_cropping_rate", ">u4", (29,)),  # (4057-4172) For each combined channel
+    ("above_sea_level", np.float32, (1,)),  # (4173-4176) Read in native byte order
+    ("header_flag", ">i4", (1,)),  # (4177-4180)
+    ("user_comment", "S80"),  # (4181-4260)
+    ("mu_head_1066_to_1068", ">i4", (3,)),  # (4261-4272)
+    ("user_header", "S208"),  # (4273-4480)
+])
+MU_HEADER_KEYS = tuple(name for name in MU_HEADER_DTYPE.names if name != "reserved")
+
+
+class MUIHeader(Mapping):
+    """
+    Header of a MUI record block decoded from its raw 4480 bytes through
+    `MU_HEADER_DTYPE`. Fields are only decoded when first accessed, strings
+    to `str`, dates to `numpy.datetime64[ns]` and numbers to big-endian arrays.
+    """
+
+    def __init__(self, buffer):
+        self._header = np.frombuffer(buffer, dtype=MU_HEADER_DTYPE, count=1)[0]
+        self._decoded = {}
+
+    def __repr__(self):
+        return f"<MUIHeader: {self['program_name']} {self['record_start_time']}>"
+
+    def __getitem__(self, key):
+        if key not in self._decoded:
+            if key not in MU_HEADER_KEYS:
+                raise KeyError(key)
+            self._decoded[key] = self._decode(key)
+        return self._decoded[key]
+
+    def __iter__(self):
+        return iter(MU_HEADER_KEYS)
+
+    def __len__(self):
+        return len(MU_HEADER_KEYS)
+
+    def _decode(self, key):
+        if key in ("file_load_time", "record_start_time"):
+            return np.datetime64(_convert_date(_decode_bytes(self._header[key])).strip(), "ns")
+        elif key == "record_end_time":
+            # The end time only holds hh:mm:ss.ss, the date is taken from the start
+            # time and a day is added if the date rolled over during the record
+            start_date = np.datetime_as_string(self["record_start_time"])[0:10]
+            end_time = _decode_bytes(self._header[key])
+            return _fix_date_edge_case(
+                self["record_start_time"],
+                np.datetime64((start_date + " " + end_time).strip(), "ns"),
+            )
+        elif MU_HEADER_DTYPE[key].kind == "S":
+            return _decode_bytes(self._header[key])
+        return self._header[key].copy()
+
 
 def _get_header_data(file):
     """
     Retrieves the meta/headerdata from a MUI file for later conversion and for
-    use in parsing information.
-    """
-    header_data = dict()
-
-    # Copyright Csilla Szasz, Kenneth Kullbrandt, Daniel Kastinen
-    """
-    %-- Row 1 of the header
-    %-- Reading the header of one record
-    %-- (Byte position: 1-24) The first 6 numbers are integers,
-    %-- four bytes long, each byte consisting of 8 bits -> each
-    %-- integer is represented by 4x8=32 bits.
-    """
-    header_data["mu_head_1_to_24"] = np.fromfile(file, dtype=">i4", count=6)
-
-    """
-    %-- (25-32) The data taking program name is 8 bytes
-    %-- -> 8x8=64 bits and is written in ASCII.
-    """
-    header_data["program_name"] = _decode_utf(np.fromfile(file, dtype="S8", count=1))
-
-    """
-    %-- (33-56) Parameter file load time: 24 bytes, of characters: dd-mmm-yyyy hh:mm:ss(.ss?)
-    """
-    header_data["file_load_time"] = np.datetime64(
-        _convert_date(np.fromfile(file, dtype="S24", count=1)).strip() + "Z", "ns"
-    )
-
-    """
-    %-- (57-60) The data taking program number, 4 bytes -> 4*8=32 bits.
-    """
-    header_data["program_number"] = np.fromfile(file, dtype=">i4", count=1)
-
-    """
-    %-- (61-84) Record start time: DD-MMM-YYYY hh:mm:ss.ss is 24 bytes long, each 8 bits
-    """
-    header_data["record_start_time"] = np.datetime64(
-        _convert_date(np.fromfile(file, dtype="S24", count=1)).strip() + "Z", "ns"
-    )
-
-    """
-    %-- (85-96) Record end time: hh:mm:ss.ss is 12 bytes long
-    %-- Since "record_end_time" is only given in hh:mm:ss.ss, we want to use the 'dd-mmm-yyy ' part
-    %-- of "record_start_time" to be able to convert recend into matlab serial date number.
-    %-- To do this we need to convert it to a string and extract the first 10 symbsols and then
-    %-- decode the rest from the file. After this we check so an edge case where the day rolled over
-    %-- hasn't occured.
-    """
-    start_date = np.datetime_as_string(header_data["record_start_time"])[0:10]
-    end_time = _decode_utf(np.fromfile(file, dtype="S12", count=1))
-    temp_end_time = np.datetime64((start_date + " " + end_time).strip() + "Z", "ns")
-    header_data["record_end_time"] = _fix_date_edge_case(
-        header_data["record_start_time"], temp_end_time
-    )
-
-    """
-    %-- (97-172) The next 19 numbers are 4 byte integers, i.e. 4*8=32 bits long
-    """
-    header_data["mu_head_25_to_43"] = np.fromfile(file, dtype=">i4", count=19)
-
-    """
-    %-- (173-256) The lag number of each ACF point is 21 unsigned longwords represented by 84 bytes,
-    %-- i.e. each longword is 84/21=4 bytes of 8 bits each, i.e., the same thing as matlab's int32
-    """
-    header_data["lag_number_per_ACF"] = np.fromfile(file, dtype=">u4", count=21)
-
-    """
-    %-- (257-320) The beam direction number in first 16 beams is represented by 16 unsigned longwords
-    %-- of 4 bytes and 4*8=32 bits each
-    """
-    header_data["beam_direction_number"] = np.fromfile(file, dtype=">u4", count=16)
-
-    """
-    %-- (321-336) The next 4 parameters are 4 byte, 4*8=32 bit, integers
-    """
-    header_data["mu_head_81_to_84"] = np.fromfile(file, dtype=">i4", count=4)
-
-    """
-    %-- (337-344) The HP parameter file name is 8 bytes, i.e. 8*8=64 bits
-    %-- cannot add characters to the 'head' matrix
-    """
-    header_data["hp_file_name"] = _decode_utf(np.fromfile(file, dtype="S8", count=1))
-
-    """
-    %-- (345-352) The next two parameters are 4 byte, i.e. 4*8=32 bit, integers
-    """
-    header_data["mu_head_87_to_88"] = np.fromfile(file, dtype=">i4", count=2)
-
-    """
-    %-- (353-416) The number of sum (ACF method): 16 unsigned longwords -> 16 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["number_of_sum_ACF"] = np.fromfile(file, dtype=">u4", count=16)
-
-    """
-    %-- (417-420) Number of sample poinst: 4 bytes = 32 bits
-    """
-    header_data["sample_points"] = np.fromfile(file, dtype=">i4", count=1)
-
-    """
-    %-- (421-600) The next 180 bytes are empty, reserved for the future, so we step
-    %-- (601-616) Observation parameter name: 16 bytes
-    """
-    header_data["observation_param_name"] = _decode_utf(
-        np.fromfile(file, dtype="S16", count=1, offset=180)
-    )
-
-    """
-    %-- (617-640) The next 6 parameters are 4 bytes (4*8=32bits) each
-    """
-    header_data["mu_head_155_to_160"] = np.fromfile(file, dtype=">i4", count=6)
-
-    """
-    %-- (641-896) Transmitted pulse pattern: 32 bits * 64
+    use in parsing information, reading the whole header in a single call.
     """
-    header_data["transmitted_pulse_pattern"] = np.fromfile(file, dtype=">i4", count=64)
+    buffer = file.read(MU_HEADER_DTYPE.itemsize)
+    if len(buffer) != MU_HEADER_DTYPE.itemsize:
+        raise EOFError(f"Header ended after {len(buffer)} of {MU_HEADER_DTYPE.itemsize} bytes")
+    return MUIHeader(buffer)
 
-    """
-    %-- (897-904) The next 2 parameters are 4 bytes (4*8=32 bits) each
-    """
-    header_data["mu_head_224_to_225"] = np.fromfile(file, dtype=">i4", count=2)
-
-    """
-    %-- (905-1160) Pulse decoding pattern for all channel: 32 bits * 64
-    """
-    header_data["pulse_decoding_patterns"] = np.fromfile(file, dtype=">i4", count=64)
 
+def _scan_blocks(file):
     """
-    %-- (1161-1164) Beam stearing interval: 4 bytes (4*8=32 bits)
+    Yields the header, data offset, number of records and if the records are
+    complete for each block of an open MUI file, skipping over the records
+    instead of reading them.
     """
-    header_data["beam_stearing_interval"] = np.fromfile(file, dtype=">i4", count=1)
+    size = os.fstat(file.fileno()).st_size
+    while file.tell() < size:
+        header_offset = file.tell()
+        try:
+            header_data = _get_header_data(file)
+        except EOFError:
+            logger.warning(f'Truncated header in "{file.name}" ignored')
+            file.seek(header_offset)
+            return
+        block_amount = int(header_data["mu_head_1_to_24"][2])
+        data_offset = file.tell()
+        end = data_offset + block_amount * MU_RECORD_DTYPE.itemsize
+        yield header_data, data_offset, block_amount, end <= size
+        file.seek(end)
 
-    """
-    %-- (1165-1676) Beam direction: 2 bytes (2*8=16 bits) * 256
-    %-- Cannot put this into the matrix - 256 numbers into 128 slots
-    """
-    header_data["beam_directions"] = np.fromfile(file, dtype=">i2", count=256)
 
-    """
-    %-- (1677-1696) The next 5 parameters are 4 bytes (2*8=32 bits) each
-    """
-    header_data["mu_head_420_to_424"] = np.fromfile(file, dtype=">i4", count=5)
-
-    """
-    %-- (1697-1716) TX frequency offset of 5 unsigned longwords -> 5 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["tx_frequency"] = np.fromfile(file, dtype=">u4", count=5)
-
-    """
-    %-- (1717-1724) The next 2 parameters are 4 bytes (2*8=32 bits) each
-    """
-    header_data["mu_head_430_to_431"] = np.fromfile(file, dtype=">i4", count=2)
-
-    """
-    %-- (1725-1740) The RX attenuator is 4 unsigned longwords -> 4 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["rx_attentuator"] = np.fromfile(file, dtype=">u4", count=4)
-
-    """
-    %-- (1741-1744) The state of the TX is given by a 4 byte (4*8=32 bit) integer
-    """
-    header_data["tx_state"] = np.fromfile(file, dtype=">i4", count=1)
-
-    """
-    %-- (1745-1760) The state of the RX is given by 4 unsigned longwords -> 4 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["rx_state"] = np.fromfile(file, dtype=">u4", count=4)
-
-    """
-    %-- (1761:1812) The RX module selection is given by 2 bytes * (25+1)
-    %-- -> cannot be saved in the head matrix (no room for it)
-    """
-    header_data["rx_module_selection"] = np.fromfile(file, dtype=">i2", count=26)
-
-    """
-    %-- (1813:1820) The next 2 parameters are 4 bytes (2*8=32 bits) each
-    """
-    header_data["mu_head_454_to_455"] = np.fromfile(file, dtype=">i4", count=2)
-
-    """
-    %-- (1821-2844) The sample start time is represented by 256
-    %-- unsigned longwords (unit of sub-pulse/4) -> 256 * 4 byte (4*8=32 bit) integer
-    """
-    header_data["sample_start_time"] = np.fromfile(file, dtype=">u4", count=256)
-
-    """
-    %-- (2845-2848) The reception sequence: 4 byte (4*8=32 bit) integer
-    """
-    header_data["reception_sequence"] = np.fromfile(file, dtype=">i4", count=1)
-
-    """
-    %-- (2849-2964) The channel number in digital combine: 29 * 4 bytes (4*4=32 bits)
-    """
-    header_data["channel_number_digital"] = np.fromfile(file, dtype=">i4", count=29)
-
-    """
-    %-- (2965-3080) Number of coherent integrations for each combined channel:
-    %-- 29 unsigned longwords -> 29 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["coherent_integrations"] = np.fromfile(file, dtype=">u4", count=29)
-
-    """
-    %-- (3081-3196) Number of FFT points for each combined channel:
-    %-- 29 unsigned longwords -> 29 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["fft_points"] = np.fromfile(file, dtype=">u4", count=29)
-
-    """
-    %-- (3197-3312) Number of data points for each combined channel:
-    %-- 29 unsigned longwords -> 29 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["data_points"] = np.fromfile(file, dtype=">u4", count=29)
-
-    """
-    %-- (3313-3428) Lower and upper boundary of FFT number in each combined channel:
-    %-- 2 * 29 * 2 bytes (2*8=16 bits)
-    """
-    header_data["lo_hi_bound_fft_0"] = np.fromfile(file, dtype=">i2", count=58)
-
-    """
-    %-- (3429-3544) Lower and upper boundary of FFT number in each combined channel:
-    %-- 2 * 29 * 2 bytes (2*8=16 bits)
-    """
-    header_data["lo_hi_bound_fft_1"] = np.fromfile(file, dtype=">i2", count=58)
-
-    """
-    %-- (3545-3660) Lower and upper boundary of FFT number in each combined channel:
-    %-- 2 * 29 * 2 bytes (2*8=16 bits)
-    """
-    header_data["lo_hi_bound_fft_2"] = np.fromfile(file, dtype=">i2", count=58)
-
-    """
-    %-- The above numbers don't fit into the head matrix (58 numbers but 29 slots)
-    %-- They are put into a matrix of their own: IFFT = [IFFT1  IFFT2  IFFT3]
-    %-- (3661-3776) RX frequency offset for ach combined channel:
-    %-- 29 unsigned longwords -> 29 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["rx_frequency_offset"] = np.fromfile(file, dtype=">u4", count=29)
-
-    """
-    %-- (3777-3808) FIR coefficient in RX: 16 * 2 bytes (2*8=16 bits)
-    %-- Doesn't fit into the head matrix: 16 numbers into 8 slots...
-    """
-    header_data["fir_rx_coefficient"] = np.fromfile(file, dtype=">i2", count=16)
-
-    """
-    %-- (3809-3924) Gain adjustment of FIR filter in RX for each combined channel:
-    %-- 29 * 2 bytes (2*8=16 bits each)
-    %-- Cannot fit into the head matrix: 58 number into 29 slots
-    """
-    header_data["fir_rx_gain"] = np.fromfile(file, dtype=">i2", count=58)
-
-    """
-    %-- (3925-3940) The next four parameters are 4 bytes each, i.e. 4*8=32 bits
-    """
-    header_data["mu_head_982_to_985"] = np.fromfile(file, dtype=">i4", count=4)
-
-    """
-    %-- (3941-4056) Number of CIC filter in RX for each cmobined channel:
-    %-- 29 unsigned longwords -> 29 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["cic_rx_filter_amount"] = np.fromfile(file, dtype=">u4", count=29)
-
-    """
-    %-- (4057-4172) CIC cropping rate in RX for each combined channel:
-    %-- 29 unsigned longwords -> 29 * 4 byte (4*8=32 bit) integers
-    """
-    header_data["cic_rx_cropping_rate"] = np.fromfile(file, dtype=">u4", count=29)
-
-    """
-    %-- (4173-4176) Above sea level:
-    """
-    header_data["above_sea_level"] = np.fromfile(file, dtype=np.float32, count=1)
-
-    """
-    %-- (4177-4180) Header flag: 4 bytes, i.e., 4*8=32 bits
-    """
-    header_data["header_flag"] = np.fromfile(file, dtype=">i4", count=1)
-
-    """
-    %-- (4181-4260) Comment by user: 80 bytes (80*8=640 bits)
-    """
-    header_data["user_comment"] = _decode_utf(np.fromfile(file, dtype="S80", count=1))
-
-    """
-    %-- (4261-4272) The next 3 parameters are 4 bytes (4*8=32 bits) each
-    """
-    header_data["mu_head_1066_to_1068"] = np.fromfile(file, dtype=">i4", count=3)
-
-    """
-    %-- (4273-4480) User header: 4480-4273+1 = 208 bytes
-    """
-    header_data["user_header"] = _decode_utf(np.fromfile(file, dtype="S208", count=1))
-    return header_data
-
-
-def _decode_utf(ucs_str):
-    """
-    Converts a UCS-4 numpy ndarray into a UTF-8 python string.
-    It first views it as a chararray to access the decode method,
-    then squeezes it and converts it from a ndarray into a python string.
-    After this, I remove the ' at the beginning and end of the string.
-    """
-    return np.array2string(ucs_str.view(np.chararray).decode("utf-8").squeeze())[1:-1]
+def _decode_bytes(byte_str):
+    """Converts a fixed length byte string field into a python string."""
+    return bytes(byte_str).decode("utf-8")
 
 
 def _convert_date(date_str):
@@ -338,10 +196,8 @@ def _convert_date(date_str):
     Since the datetimes involved are given in the form "DD-MMM-YYYY hh:mm:ss.ss"
     and numpy expects the form "YYYY-MM-DD hh:mm:ss.ss(...)", we must first convert
     the MU date to numpy standard format. This is accomplished with the help of the
-    month dictionary and the _decode_utf function.
+    month dictionary.
     """
-    if type(date_str) == np.ndarray:
-        date_str = _decode_utf(date_str)
     return (
         date_str[7:11]
         + "-"
@@ -368,6 +224,38 @@ _month = {
 }
 
 
+def _read_data_block(file, block_amount, dtype="complex"):
+    """
+    Reads the `block_amount` records of a data block in one call and returns the
+    beam, channel and height of each record together with the `shape=(25, 85, 512)`
+    complex voltage cube of type `dtype`, where record `x` holds channel `(x // 85) % 25`
+    and height `x % 85`.
+    """
+    records = np.fromfile(file, dtype=MU_RECORD_DTYPE, count=block_amount)
+    if records.size != block_amount:
+        raise EOFError(f"Data block ended after {records.size} of {block_amount} records")
+
+    mu_beam_channel_height = np.empty(block_amount, dtype=MU_BEAM_CHANNEL_HEIGHT_DTYPE)
+    for name in MU_BEAM_CHANNEL_HEIGHT_DTYPE.names:
+        mu_beam_channel_height[name] = records[name]
+
+    block_size = MU_CHANNELS * MU_HEIGHTS
+    if block_amount == block_size:
+        mu_data = np.empty((block_size, 512), dtype=dtype)
+        mu_data.real = records["real"]
+        mu_data.imag = records["imag"]
+        mu_data = mu_data.reshape(MU_CHANNELS, MU_HEIGHTS, 512)
+    else:
+        # Later records overwrite earlier ones with the same channel and height,
+        # so only the last full block of records can end up in the cube
+        mu_data = np.zeros((MU_CHANNELS, MU_HEIGHTS, 512), dtype=dtype)
+        inds = np.arange(max(block_amount - block_size, 0), block_amount)
+        channels, heights = (inds // MU_HEIGHTS) % MU_CHANNELS, inds % MU_HEIGHTS
+        mu_data.real[channels, heights] = records["real"][inds]
+        mu_data.imag[channels, heights] = records["imag"][inds]
+    return mu_beam_channel_height, mu_data
+
+
 def _fix_date_edge_case(start_time, end_time):
     """
     Checks so the date hasn't rolled over, and if it has it adds a day to the counter.
@@ -381,37 +269,130 @@ def _fix_date_edge_case(start_time, end_time):
 @converters.converter("MUI", "mu_h5")
 @tools.MPI_target_arg(0)
 def convert_MUI_to_h5(
-    path, output_location, experiment_name="mw26x6", skip_existing=False
+    path,
+    output_location,
+    experiment_name="mw26x6",
+    skip_existing=False,
+    processes=None,
+    dtype=MU_H5_DTYPE,
+    chunk_pulses=MU_H5_CHUNK_PULSES,
+    compression=None,
+    compression_opts=None,
+    shuffle=None,
 ):
     """
     Converts a MU data file into a HDF5 file, wrapped to support lists of files parallelized with MPI.
+    The record blocks of each file can in addition be converted in `processes` worker processes
+    and the layout of the data can be configured, see `convert_MUI_file_to_h5`.
+    """
+    return convert_MUI_file_to_h5(
+        path,
+        output_location,
+        experiment_name=experiment_name,
+        skip_existing=skip_existing,
+        processes=processes,
+        dtype=dtype,
+        chunk_pulses=chunk_pulses,
+        compression=compression,
+        compression_opts=compression_opts,
+        shuffle=shuffle,
+    )
+
+
+def convert_MUI_file_to_h5(
+    path,
+    output_location,
+    experiment_name="mw26x6",
+    skip_existing=False,
+    processes=None,
+    MPI=False,
+    MPI_root=0,
+    dtype=MU_H5_DTYPE,
+    chunk_pulses=MU_H5_CHUNK_PULSES,
+    compression=None,
+    compression_opts=None,
+    shuffle=None,
+):
     """
-    file_outputs_created = []
+    Converts each record block of a single MUI file into its own dated HDF5 file.
+
+    The conversion is done in two phases, first the headers are scanned for the
+    offsets of the blocks without reading the voltage data, then the blocks are
+    converted independently, either in a pool of `processes` worker processes
+    or distributed over the MPI ranks if `MPI` is set, so that the conversion of
+    one large file scales with the number of cores. With MPI the created files
+    are gathered as in `tools.MPI_target_arg`.
+
+    The voltage data is stored as `dtype` in chunks of `chunk_pulses` pulses, or
+    contiguously if `chunk_pulses` is `None`. A HDF5 `compression` filter such as
+    `"gzip"` or `"lzf"` can be given together with its `compression_opts`, the
+    `shuffle` filter is then enabled unless it is disabled explicitly.
+    """
+    path = pathlib.Path(path)
+    header_offsets = _MUI_block_offsets(path, experiment_name)
+
+    dataset_options = {"dtype": np.dtype(dtype)}
+    if chunk_pulses is not None:
+        dataset_options["chunks"] = (MU_CHANNELS, MU_HEIGHTS, min(chunk_pulses, 512))
+    if compression is not None:
+        dataset_options["compression"] = compression
+        dataset_options["compression_opts"] = compression_opts
+        dataset_options["shuffle"] = True if shuffle is None else shuffle
+    elif shuffle:
+        dataset_options["shuffle"] = True
+
+    args = (output_location, skip_existing, dataset_options)
+    if MPI:
+        outputs = tools.MPI_target_arg(1)(_convert_MUI_block)(
+            path, header_offsets, *args, MPI=True, MPI_root=MPI_root
+        )
+    elif processes is not None and processes > 1 and len(header_offsets) > 1:
+        with multiprocessing.Pool(min(processes, len(header_offsets))) as pool:
+            outputs = pool.starmap(
+                _convert_MUI_block,
+                [(path, header_offset) + args for header_offset in header_offsets],
+            )
+    else:
+        outputs = [_convert_MUI_block(path, header_offset, *args) for header_offset in header_offsets]
 
-    try:
-        file = open(path, "rb")
-    except TypeError:
-        logger.debug("File already open or wrong input type.")
+    return [output for output in outputs if output is not None]
 
-    if hasattr(file, "mode"):
-        if file.mode != "rb":
-            logger.critical("File not open in binary mode.")
-            return []
 
+def _MUI_block_offsets(path, experiment_name):
     """
-    Constants declared
+    Scans the headers of a MUI file and returns the offset of each block to convert,
+    stopping at a truncated block or a block of another experiment.
     """
-    SKIP_AMOUNT = 4480
+    header_offsets = []
+    with open(path, "rb") as file:
+        for header_data, data_offset, block_amount, complete in _scan_blocks(file):
+            observation_param_name = header_data["observation_param_name"]
+            if observation_param_name.strip() != experiment_name:
+                logger.critical(
+                    f'Experiment name "{experiment_name}" was not '
+                    + f'equal to observation parameter name "{observation_param_name}". Exiting.'
+                )
+                break
+            if not complete:
+                logger.error(f'Truncated data block in "{path}". Exiting.')
+                break
+            header_offsets.append(data_offset - MU_HEADER_DTYPE.itemsize)
+    logger.debug(f'Found {len(header_offsets)} blocks to convert in "{path}"')
+    return header_offsets
 
-    byte = file.read(1)
-    file.seek(-1, 1)
-    while byte != b"":
-        """
-        Initiating variables that will be used later.
-        """
+
+def _convert_MUI_block(path, header_offset, output_location, skip_existing, dataset_options):
+    """
+    Converts the record block with the header at `header_offset` of a MUI file into
+    a HDF5 file named after its start time, with the voltage data stored using the
+    `h5py.Group.create_dataset` keyword arguments `dataset_options`. Returns the path
+    to the created file, or `None` if it was skipped.
+    """
+    with open(path, "rb") as file:
+        file.seek(header_offset)
         header_data = _get_header_data(file)
         block_amount = header_data["mu_head_1_to_24"][2]
-        observation_param_name = header_data["observation_param_name"]
+
         # I replace ':' with a ., as windows cannot save files with ':' in their name.
         start_time = np.datetime_as_string(header_data["record_start_time"]).replace(
             ":", "."
@@ -433,105 +414,113 @@ def convert_MUI_to_h5(
             start_time + ".h5"
         )
 
-        """
-        Creates the directories if not yet created.
-        """
-        if (
-            not output_location_dated == ""
-            and not pathlib.Path(output_location_dated).is_dir()
-        ):
-            logger.debug(
-                f"Creating file directories for location {output_location_dated}"
-            )
-            os.makedirs(output_location_dated)
-
         if bool(output_location):
             """
-            Checks if output_location has been set and if the directory already exists.
-            If it does, it will check if the output file already exists. If it does and
-            the "skip existing files" flag is set, it will skip those datasets.
+            Checks if output_location has been set and if the output file already exists.
+            If it does and the "skip existing files" flag is set, it will skip the block.
             """
-            # If the file already exists and you want to skip it
-            if pathlib.Path(output_file_name).is_file and skip_existing:
+            if output_file_name.is_file() and skip_existing:
                 logger.debug(
                     f'Skip existing set and file was found. Skipping file "{output_file_name}".'
                 )
-                # Skip ahead to the next block
-                file.seek(block_amount * SKIP_AMOUNT, 1)
-                byte = file.read(1)
-                file.seek(-1, 1)
-                continue
-
-        if observation_param_name.strip() != experiment_name:
-            logger.critical(
-                f'Experiment name "{experiment_name}" was not '
-                + f'equal to observation parameter name "{observation_param_name}". Exiting.'
-            )
-            break
-
-        """
-        Opening the file properly so it closes if it crashes.
-        """
-        with h5py.File(output_file_name, "w") as h5file:
-            """
-            # Allocating variables to hold the data. mu_data is a 512 times block_amount large complex array
-            # that's going to hold... something. mu_beam_channel_height is a 3-dimensional array containing
-            # int8, int8, int16 numbers representing which beam, which channel, and what height.
-            """
-            mu_data = np.zeros((25, 85, 512), dtype="complex")
-            dt = np.dtype([("beam", ">i1"), ("channel", ">i1"), ("height", ">i2")])
-            mu_beam_channel_height = np.zeros(block_amount, dt)
-
-            for x in range(0, block_amount):
-                """
-                First it saves the channel from the file via a custom dtype (written above.)
-                After that, it stores the real and complex numbers separately, then combines them
-                in the mu_data with the help of the 1j operator. Each 'line' ends with 380 blank bytes
-                and are therefore skipped in the end.
-                """
-                mu_beam_channel_height[x] = np.fromfile(file, dtype=dt, count=1)
-                real_numbers = np.fromfile(file, dtype=">f4", count=512)
-                complex_numbers = np.fromfile(file, dtype=">f4", count=512)
-                """
-                high represents the height of the data. It is generally 85 long.
-                channel represents the number of channels. It is generally 25 long.
-                """
-                high = (x // 85) % 25
-                channel = x % 85
-                mu_data[
-                    high,
-                    channel,
-                ] = (
-                    real_numbers + 1j * complex_numbers
-                )
-                file.seek(380, 1)
+                return None
 
             """
-            Adding all header data as attributes to the hdf5 file.
+            Creates the directories if not yet created, other workers may be creating them at the same time.
             """
-            for key, val in header_data.items():
-                logger.debug(f"Setting file attribute {key} to {val}")
-                if type(val) == np.datetime64:
-                    h5file.attrs[key] = str(np.datetime_as_string(val))
-                else:
-                    h5file.attrs[key] = val
-            h5file.attrs["filename"] = path.name
-            h5file.attrs["date"] = str(
-                np.datetime_as_string(header_data["record_start_time"])
+            logger.debug(
+                f"Creating file directories for location {output_location_dated}"
             )
-            h5file.attrs["path"] = str(path.resolve())
-
-            logger.debug("Creating datasets beams and data, and saving them to file")
-            h5file.create_dataset("beams", data=mu_beam_channel_height)
-            h5file.create_dataset("data", data=mu_data)
-            file_outputs_created.append(str(output_file_name))
+            os.makedirs(output_location_dated, exist_ok=True)
 
-        byte = file.read(1)
-        file.seek(-1, 1)
+        """
+        The whole data block is read in one go through a structured dtype covering the
+        beam, channel and height, the real and imaginary samples and the padding of each record.
+        """
+        mu_beam_channel_height, mu_data = _read_data_block(file, block_amount, dtype=dataset_options["dtype"])
 
-    logger.debug("Reached EOF, exiting loop and closing file")
-    file.close()
-    return file_outputs_created
+    """
+    Opening the file properly so it closes if it crashes.
+    """
+    with h5py.File(output_file_name, "w") as h5file:
+        """
+        Adding all header data as attributes to the hdf5 file.
+        """
+        for key, val in header_data.items():
+            logger.debug(f"Setting file attribute {key} to {val}")
+            if type(val) == np.datetime64:
+                h5file.attrs[key] = str(np.datetime_as_string(val))
+            else:
+                h5file.attrs[key] = val
+        h5file.attrs["filename"] = path.name
+        h5file.attrs["date"] = str(
+            np.datetime_as_string(header_data["record_start_time"])
+        )
+        h5file.attrs["path"] = str(path.resolve())
+
+        logger.debug("Creating datasets beams and data, and saving them to file")
+        h5file.create_dataset("beams", data=mu_beam_channel_height)
+        h5file.create_dataset("data", data=mu_data, **dataset_options)
+
+    return str(output_file_name)
+
+
+def index_MUI_files(paths):
+    """
+    Header-only index of MUI files, the voltage data is skipped over so large
+    archives can be scanned quickly. Directories are searched recursively for MUI files.
+
+    Parameters
+    ----------
+    paths : str or pathlib.Path or list
+        MUI files or directories containing MUI files.
+
+    Returns
+    -------
+    list of dict
+        For each file its `path`, the `program_name` and `observation_param_name`
+        of the first block, the `start_time` of the first block and `end_time`
+        of the last block, the number of `blocks` and `records` and if the file
+        is `truncated`.
+    """
+    if isinstance(paths, (str, pathlib.Path)):
+        paths = [paths]
+
+    files = []
+    for path in paths:
+        path = pathlib.Path(path)
+        if path.is_dir():
+            files += sorted(x for x in path.rglob("*") if x.is_file() and check_if_MUI_data(x))
+        else:
+            files.append(path)
+
+    index = []
+    for path in files:
+        entry = {
+            "path": path,
+            "program_name": None,
+            "observation_param_name": None,
+            "start_time": None,
+            "end_time": None,
+            "blocks": 0,
+            "records": 0,
+            "truncated": False,
+        }
+        with open(path, "rb") as file:
+            for header_data, _, block_amount, complete in _scan_blocks(file):
+                if entry["blocks"] == 0:
+                    entry["program_name"] = header_data["program_name"]
+                    entry["observation_param_name"] = header_data["observation_param_name"]
+                    entry["start_time"] = header_data["record_start_time"]
+                entry["end_time"] = header_data["record_end_time"]
+                entry["blocks"] += 1
+                entry["records"] += block_amount
+                if not complete:
+                    entry["truncated"] = True
+            # A header cut short ends the scan before the end of the file
+            entry["truncated"] = entry["truncated"] or file.tell() < os.fstat(file.fileno()).st_size
+        index.append(entry)
+    return index
 
 
 @raw_data.backend_validator("mu_h5")
@@ -546,8 +535,19 @@ def check_if_MUI_data(path):
     return check
 
 
+def get_MU_h5_date(path):
+    """Start date of a MU h5 file, read from its attributes without loading the data."""
+    with h5py.File(str(path), "r") as h5file:
+        return np.datetime64(h5file.attrs["date"], "ns")
+
+
 @raw_data.backend_loader("mu_h5")
-def load_MU_h5_data(path):
+def load_MU_h5_data(path, dtype=None, pulses=None):
+    """
+    Loads the voltage data of a mu_h5 file as `dtype`, by default complex128 whatever
+    precision it is stored in. Only the range of pulses selected by the slice `pulses`
+    is read if given, the date is then the start of the first selected pulse.
+    """
     try:
         logger.debug(f'Backend "mu_h5" opening file {path}')
         h5file = h5py.File(str(path), "r")
@@ -563,10 +563,29 @@ def load_MU_h5_data(path):
         logger.exception(f"File {path} was not a h5 file.")
         raise
 
+    meta = _MU_meta(h5file.attrs["filename"], h5file.attrs["tx_frequency"], h5file.attrs["date"])
+
+    dataset = h5file["data"]
+    if pulses is None:
+        pulses = slice(None)
+    start = pulses.indices(dataset.shape[2])[0]
+    meta["date"] += np.timedelta64(int(round(start * meta["T_ipp"] * 1e9)), "ns")
+
+    # Only the chunks of the selected pulses are read, converting the type with
+    # numpy afterwards is much faster than letting HDF5 convert while reading
+    data = dataset[:, :, pulses]
+    h5file.close()
+    data = data.astype(np.complex128 if dtype is None else dtype, copy=False)
+
+    return data, {"channel": 0, "sample": 1, "pulse": 2}, meta
+
+
+def _MU_meta(filename, frequency, date):
+    """Meta data of a MU radar measurement, shared by the MU backends."""
     meta = {}
-    meta["filename"] = h5file.attrs["filename"]
-    meta["frequency"] = h5file.attrs["tx_frequency"]
-    meta["date"] = np.datetime64(h5file.attrs["date"], "ns")
+    meta["filename"] = filename
+    meta["frequency"] = frequency
+    meta["date"] = np.datetime64(date, "ns")
     meta["T_samp"] = 6e-6
     meta["T_ipp"] = 3.12e-3
     meta["T_measure"] = 5.1e-4
@@ -578,8 +597,148 @@ def load_MU_h5_data(path):
         ),
         np.ones(2),
     )
+    return meta
 
-    data = h5file["data"][()]
-    h5file.close()
 
+class MUIMemmapData:
+    """
+    Lazy `shape=(channel, sample, pulse)` voltage cube of a MUI file.
+
+    The record blocks are memory mapped instead of read and the big-endian samples
+    are only decoded for the part of the cube that is indexed, so e.g. a range of
+    pulses can be taken from a MUI file without converting it. Indexing follows
+    numpy semantics and returns a `numpy.ndarray`, as does `numpy.asarray` on
+    the whole cube. The pulses of consecutive blocks are concatenated, blocks
+    cut short at the end of the file are ignored.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Path to the MUI file.
+    dtype : numpy.dtype
+        Complex data type of the decoded voltages.
+    """
+
+    def __init__(self, path, dtype=np.complex128):
+        self.path = pathlib.Path(path)
+        self.dtype = np.dtype(dtype)
+        self.headers = []
+        self._records = []
+        self._record_index = []
+
+        with open(self.path, "rb") as file:
+            for header_data, data_offset, block_amount, complete in _scan_blocks(file):
+                if not complete:
+                    logger.warning(f'Truncated data block in "{self.path}" ignored')
+                    break
+                self.headers.append(header_data)
+                self._records.append(np.memmap(
+                    self.path, dtype=MU_RECORD_DTYPE, mode="r", offset=data_offset, shape=(block_amount,)
+                ))
+                self._record_index.append(self._block_record_index(block_amount))
+
+        self.shape = (MU_CHANNELS, MU_HEIGHTS, 512 * len(self._records))
+
+    def __repr__(self):
+        return f"<MUIMemmapData: {self.path.name}, shape={self.shape}>"
+
+    @staticmethod
+    def _block_record_index(block_amount):
+        """
+        Record holding each channel and height of a block as in `_read_data_block`,
+        i.e. the last record written to it, or -1 if the block has no such record.
+        """
+        index = np.full((MU_CHANNELS, MU_HEIGHTS), -1, dtype=np.int64)
+        inds = np.arange(max(block_amount - MU_CHANNELS * MU_HEIGHTS, 0), block_amount)
+        index[(inds // MU_HEIGHTS) % MU_CHANNELS, inds % MU_HEIGHTS] = inds
+        return index
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[...]
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def _decode(self, channels, samples, pulses):
+        """Decodes the orthogonal selection of sorted `channels`, `samples` and `pulses`."""
+        data = np.zeros((channels.size, samples.size, pulses.size), dtype=self.dtype)
+        blocks = pulses // 512
+        for block in np.unique(blocks):
+            in_block = blocks == block
+            cols = pulses[in_block] % 512
+            rec = self._record_index[block][np.ix_(channels, samples)]
+            valid = rec >= 0
+            records = self._records[block]
+            values = np.empty((np.count_nonzero(valid), cols.size), dtype=self.dtype)
+            values.real = records["real"][rec[valid]][:, cols]
+            values.imag = records["imag"][rec[valid]][:, cols]
+            block_data = np.zeros((channels.size, samples.size, cols.size), dtype=self.dtype)
+            block_data[valid] = values
+            data[:, :, in_block] = block_data
+        return data
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        ellipsis = [ind for ind, k in enumerate(key) if k is Ellipsis]
+        if any(k is None for k in key) or len(ellipsis) > 1:
+            return np.asarray(self)[key]
+        if len(ellipsis) > 0:
+            ind = ellipsis[0]
+            key = key[:ind] + (slice(None),) * (self.ndim - len(key) + 1) + key[ind + 1:]
+        key = key + (slice(None),) * (self.ndim - len(key))
+        if len(key) > self.ndim:
+            raise IndexError(f"Too many indices for array: array is {self.ndim}-dimensional")
+
+        # Only the unique indices of each axis are decoded, the key is then
+        # remapped onto the decoded sub-cube so that numpy does the indexing
+        needed = []
+        sub_key = []
+        for k, size in zip(key, self.shape):
+            if isinstance(k, slice):
+                inds = np.arange(size)[k]
+                needed.append(np.sort(inds))
+                sub_key.append(slice(None) if k.step is None or k.step > 0 else slice(None, None, -1))
+                continue
+
+            k = np.asarray(k)
+            if k.dtype == bool:
+                if k.ndim != 1:
+                    return np.asarray(self)[key]
+                k = np.flatnonzero(k)
+            inds = np.arange(size)[k]
+            unique_inds = np.unique(inds)
+            needed.append(unique_inds)
+            sub_inds = np.searchsorted(unique_inds, inds)
+            sub_key.append(sub_inds if sub_inds.ndim > 0 else int(sub_inds))
+
+        return self._decode(*needed)[tuple(sub_key)]
+
+
+@raw_data.backend_validator("mui_mmap")
+def check_if_MUI_mmap_data(path):
+    return check_if_MUI_data(path)
+
+
+@raw_data.backend_loader("mui_mmap")
+def load_MUI_mmap_data(path, dtype=None):
+    """Opens a MUI file as a lazily decoded `MUIMemmapData` voltage cube."""
+    logger.debug(f'Backend "mui_mmap" opening file {path}')
+    data = MUIMemmapData(path, dtype=np.complex128 if dtype is None else dtype)
+    if len(data.headers) == 0:
+        raise ValueError(f"MUI file {path} does not contain any complete data block")
+
+    header_data = data.headers[0]
+    meta = _MU_meta(pathlib.Path(path).name, header_data["tx_frequency"], header_data["record_start_time"])
     return data, {"channel": 0, "sample": 1, "pulse": 2}, meta
@@ -77,6 +77,8 @@ class RawDataInterface:
 
     def _clear(self):
         self.data = None
+        # Pulse slices applied to the data in the file, in the order they were applied
+        self.pulse_selection = ()
         self.axis = {key: None for key in self.DATA_AXIS}
         self.meta = {key: None for key in self.META_KEYS}
 
@@ -110,14 +112,41 @@ class RawDataInterface:
                     f"Given backend {self.backend} does not validate input path"
                 )
 
-        if not isinstance(data, np.ndarray):
+        # Backends may also return lazily loaded array-likes, e.g. memory mapped files
+        if not isinstance(data, np.ndarray) and not all(
+            hasattr(data, attr) for attr in ("shape", "dtype", "__getitem__", "__array__")
+        ):
             raise ValueError(
-                f'Backend must return data as a numpy ndarray not "{type(data)}"'
+                f'Backend must return data as a numpy ndarray or array-like not "{type(data)}"'
             )
 
         self.data = data
         self.meta.update(meta)
         self.axis.update(axis)
+        if kwargs.get("pulses", None) is not None:
+            self.pulse_selection = (kwargs["pulses"],)
+
+    def pulse_view(self, start, stop=None):
+        '''Return a new instance holding a view of the pulses from `start` to `stop`
+        without copying the data.
+        '''
+        view = RawDataInterface(None, backend=self.backend, load_on_init=False)
+        view.path = getattr(self, "path", None)
+        index = [slice(None)] * self.data.ndim
+        index[self.axis["pulse"]] = slice(start, stop)
+        view.data = self.data[tuple(index)]
+        view.pulse_selection = self.pulse_selection + (slice(start, stop),)
+        view.axis.update(self.axis)
+        view.meta.update(self.meta)
+        return view
+
+    def pulse_blocks(self, block_size):
+        '''Iterate over the data in blocks of at most `block_size` pulses,
+        each block is a new instance holding a view of the data.
+        '''
+        pulses = self.data.shape[self.axis["pulse"]]
+        for start in range(0, pulses, block_size):
+            yield self.pulse_view(start, start + block_size)
 
     def copy(self):
         '''Return a copy of the current instance.
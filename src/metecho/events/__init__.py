@@ -1,2 +1,3 @@
 from .event_search import search
+from .event_stream import StreamingEventSearch, search_stream
 from .conf import generate_event_search_config
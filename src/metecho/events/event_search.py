@@ -5,6 +5,7 @@ from datetime import datetime
 from . import event_select, search_objects, event
 from metecho.generalized_matched_filter import xcorr
 from metecho.noise import calc_noise
+from metecho.tools import rolling
 import logging
 import matplotlib.pyplot as plt
 
@@ -27,6 +28,39 @@ def mergeDict(dict1, dict2, axis=None):
     return dict3
 
 
+def evaluate_criteria(search_function_objects, matched_filter_output, raw_data, config):
+    """
+    Evaluates all search functions on the matched filter output as one
+    `shape=(criteria, pulse)` boolean matrix and reduces it per pulse.
+
+    Returns
+    -------
+    criteria_met : numpy.ndarray
+        Number of criteria met by each pulse, not counting those required for trails.
+    required_met : numpy.ndarray
+        If each pulse meets all required criteria.
+    required_trails_met : numpy.ndarray or None
+        If each pulse meets all criteria required for trails, `None` if there are no such criteria.
+    """
+    pulses = len(matched_filter_output["best_peak"])
+    criteria = np.empty((len(search_function_objects), pulses), dtype=bool)
+    for index, searcher in enumerate(search_function_objects):
+        curr = np.asarray(searcher.search(matched_filter_output, raw_data, config), dtype=bool)
+        if curr.shape != (pulses,):
+            raise ValueError(
+                f"{type(searcher).__name__} returned criteria of shape {curr.shape}, expected ({pulses},)"
+            )
+        criteria[index] = curr
+
+    required = np.array([searcher.required for searcher in search_function_objects], dtype=bool)
+    required_trails = np.array([searcher.required_trails for searcher in search_function_objects], dtype=bool)
+
+    criteria_met = np.sum(criteria[np.logical_not(required_trails)], axis=0)
+    required_met = np.all(criteria[required], axis=0)
+    required_trails_met = np.all(criteria[required_trails], axis=0) if np.any(required_trails) else None
+    return criteria_met, required_met, required_trails_met
+
+
 def search(raw_data,
            config,
            matched_filter_output,
@@ -36,7 +70,8 @@ def search(raw_data,
            plot=True,
            save_as_image=False,
            save_matched_filter_output=False,
-           save_location=""
+           save_location="",
+           cache=None,
            ):
     """
     Searches for potential events from the filtered data and establishes if they can be analyzed further.
@@ -48,10 +83,14 @@ def search(raw_data,
         The raw radar data to search for head echoes in
     config : configparser.ConfigParser
         The search configuration
-    matched_filter_output : dict
-        Output data from the matched filter analysis
+    matched_filter_output : dict or metecho.generalized_matched_filter.xcorr.MatchedFilterState
+        Output data from the matched filter analysis, only the pulses that are not
+        already in the output are filtered.
     signal : np.ndarray
         `shape=(samples, pulses)` model if the transmitted signals.
+    cache : metecho.generalized_matched_filter.MatchedFilterCache, optional
+        If given, the matched filter output of the raw data file is read from
+        and stored in this cache.
 
     Returns
     -------
@@ -71,31 +110,23 @@ def search(raw_data,
     if raw_data is not None:
         # Checks if we got partial input
         if matched_filter_output is not None:
-            if "best_doppler" not in matched_filter_output:
-                matched_filter_output["best_doppler"] = []
-            if "best_start" not in matched_filter_output:
-                matched_filter_output["best_start"] = []
-            # Calculates how much is already done and xcorrs the rest
-            raw_data_pulse_length = raw_data.data.shape[raw_data.axis["pulse"]]
-            if matched_filter_output["pulse_length"] < raw_data_pulse_length:
-                temp_raw_data = copy.deepcopy(raw_data)
-                temp_raw_data.data = temp_raw_data.data[
-                    :,
-                    :,
-                    matched_filter_output["pulse_length"]:
-                ]
-                append_data = xcorr.xcorr_echo_search(
-                    temp_raw_data,
+            # Only filters the pulses that are not already in the given output
+            if isinstance(matched_filter_output, xcorr.MatchedFilterState):
+                matched_filter_state = matched_filter_output
+            else:
+                matched_filter_state = xcorr.MatchedFilterState(
                     config.getint("General", "dop_min_freq"),
                     config.getint("General", "dop_max_freq"),
                     config.getint("General", "dop_step_size"),
-                    signal
+                    signal,
                 )
-                matched_filter_output = mergeDict(matched_filter_output, append_data, axis=1)
-                matched_filter_output["pulse_length"] = np.sum(matched_filter_output["pulse_length"])
+                matched_filter_state.append(matched_filter_output)
+            matched_filter_state.update(raw_data)
+            matched_filter_output = matched_filter_state.output()
         # If not, xcorr everything
         else:
-            matched_filter_output = xcorr.xcorr_echo_search(
+            echo_search = xcorr.xcorr_echo_search if cache is None else cache.xcorr_echo_search
+            matched_filter_output = echo_search(
                 raw_data,
                 config.getint("General", "dop_min_freq"),
                 config.getint("General", "dop_max_freq"),
@@ -105,18 +136,15 @@ def search(raw_data,
         # Calculates some variables for later use
         matched_filter_output["tot_pow"] = np.squeeze(np.sum(np.square(np.abs(np.sum(raw_data.data, 0))), 0))
 
-        matched_filter_output["doppler_window"] = np.lib.stride_tricks.sliding_window_view(
+        matched_filter_output["doppler_std"] = rolling.centered_rolling_std(
             matched_filter_output["best_doppler"],
             config.getint("General", "MOVE_STD_WINDOW")
         )
-        matched_filter_output["start_window"] = np.lib.stride_tricks.sliding_window_view(
+        matched_filter_output["start_std"] = rolling.centered_rolling_std(
             matched_filter_output["best_start"],
             config.getint("General", "MOVE_STD_WINDOW")
         )
 
-        matched_filter_output["doppler_std"] = np.std(matched_filter_output["doppler_window"], axis=1)
-        matched_filter_output["start_std"] = np.std(matched_filter_output["start_window"], axis=1)
-
         matched_filter_output["doppler_coherrence"] = np.sum(
             matched_filter_output["doppler_std"] < config.getfloat(
                 "General", "dop_std_coherr") / len(matched_filter_output["doppler_std"])
@@ -159,49 +187,33 @@ def search(raw_data,
         matched_filter_output["tot_pow_filt"] = \
             matched_filter_output["tot_pow"][matched_filter_output["filter_indices"]]
 
+        # Statistics shared by the search functions, computed once for all of them
+        matched_filter_output["criteria_statistics"] = search_objects.criteria_statistics(
+            matched_filter_output, config)
+
         best_data.append(matched_filter_output["best_peak"])
         best_data.append(matched_filter_output["best_doppler"])
         best_data.append(matched_filter_output["best_start"])
 
         gauss_noise = matched_filter_output["gauss_noise"]
 
-    find_indices = None
-    find_indices_req = None
-    find_indices_trail = None
     # Checks if we got any search functions, otherwise defaults
     if search_function_objects is None:
         search_function_objects = search_objects.get_defaults()
-    # Iterates over all search functions and applies them to each respective array
-    # depending on their attributes. The Required attribute means that *all* search
-    # functions must be true on those locations to count. "Required_trails" means that only
-    # these are required to check for meteor trails. For all others, there must be
-    # a total of CRITERIA_N matches for it to count as a found event.
-    for searcher in search_function_objects:
-        curr = searcher.search(matched_filter_output, raw_data, config)
-        # Ugly error fix, make prettier version later
-        if curr.shape != (512, ):
-            curr = np.resize(curr, (512,))
-        if searcher.required:
-            if find_indices_req is not None:
-                find_indices_req = np.logical_and(curr, find_indices_req)
-            else:
-                find_indices_req = curr
-        if searcher.required_trails:
-            if find_indices_trail is not None:
-                find_indices_trail = np.logical_and(curr, find_indices_trail)
-            else:
-                find_indices_trail = curr
-        else:
-            if find_indices is not None:
-                find_indices = curr * 1 + find_indices * 1
-            else:
-                find_indices = curr * 1
+    # Applies all search functions to the whole sequence of pulses at once depending on
+    # their attributes. The Required attribute means that *all* search functions must
+    # be true on those locations to count. "Required_trails" means that only these are
+    # required to check for meteor trails. For all others, there must be a total of
+    # CRITERIA_N matches for it to count as a found event.
+    find_indices, find_indices_req, find_indices_trail = evaluate_criteria(
+        search_function_objects,
+        matched_filter_output,
+        raw_data,
+        config,
+    )
 
-    if find_indices_req is not None:
-        found_indices = np.argwhere(np.array(find_indices >= config.getint("General", "CRITERIA_N")))
-    else:
-        found_indices = np.argwhere(np.logical_and(find_indices_req, find_indices
-                                                   >= config.getint("General", "CRITERIA_N")))
+    found_indices = np.argwhere(np.logical_and(find_indices_req, find_indices
+                                               >= config.getint("General", "CRITERIA_N")))
 
     # Clusters the events. giving start and end points in a 2-d array.
     start_IPP, end_IPP = event_select.cluster(
@@ -374,7 +386,7 @@ Non-transient coherent detection ({matched_filter_output["doppler_coherrence"]},
         plot_highlight_match(axs[1, 2], found_indices, matched_filter_output["doppler_std"],
                              "IPP [1]", "Doppler shift moving STD", config)
 
-        criteria_mat = find_indices if find_indices_req is not None else find_indices + 1 * find_indices_req
+        criteria_mat = find_indices + 1 * find_indices_req
         axs[2, 0].plot(PULSE_V, criteria_mat)
         axs[2, 0].set_xlabel("IPP [1]")
         axs[2, 0].set_ylabel("Event Criteria met")
@@ -415,18 +427,11 @@ def plot_highlight_match(ax, matches, data, xlabel, ylabel, config):
     """
     Takes a set a of data and plots it on a graph, then marks all the points with matches.
     """
-    if data.shape != (512,):
-        data = np.resize(data, (512,))
     data_filt = np.zeros(len(data), dtype=bool)
     data_xaxis = np.arange(len(data))
-    data_filt[matches] = True
+    data_filt[np.asarray(matches, dtype=np.int64).flatten()] = True
 
-    color_filter = []
-    for ind in data_filt:
-        if ind:
-            color_filter.append(config["General"]["match_found"])
-        else:
-            color_filter.append(config["General"]["match_not_found"])
+    color_filter = np.where(data_filt, config["General"]["match_found"], config["General"]["match_not_found"])
     ax.plot(data_xaxis, data)
     ax.scatter(data_xaxis, data, marker=".", c=color_filter)
     ax.set_ylabel(ylabel)
@@ -0,0 +1,322 @@
+"""
+Online event search
+===================
+
+`metecho.events.search` needs all pulses of a file before it can estimate the
+noise, set the detection thresholds and cluster the detections. The
+`StreamingEventSearch` instead consumes the matched filter output block by block,
+keeps running noise and power statistics over the most recent pulses and emits
+`Event` objects a bounded number of pulses after an echo ends. Since the stream
+does not care where the pulses come from, events spanning several files are
+detected as one event.
+
+"""
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from metecho.generalized_matched_filter import xcorr
+from metecho.noise import calc_noise
+from metecho.tools import rolling
+from . import event, search_objects
+from .event_search import evaluate_criteria
+
+logger = logging.getLogger(__name__)
+
+# Default number of most recent pulses used for the running noise and power statistics
+NOISE_HISTORY = 512
+
+# Per-pulse values of the matched filter output that the search works on
+PULSE_KEYS = ["best_peak", "tot_pow", "best_doppler", "best_start"]
+
+
+def total_power(raw_data):
+    """Total power of each pulse of the channel summed raw data, as used by `metecho.events.search`."""
+    summed = np.sum(raw_data.data, raw_data.axis["channel"])
+    sample_axis = raw_data.axis["sample"] - (raw_data.axis["sample"] > raw_data.axis["channel"])
+    return np.sum(np.square(np.abs(summed)), sample_axis)
+
+
+def noise_sums(raw_data, best_peak, config):
+    """
+    Number of samples, sum and sum of squares of the real and imaginary parts of the
+    raw data of the pulses without coherent signal, from which the noise is estimated.
+    """
+    noise_pulses = np.argwhere(np.real(best_peak) < config.getfloat("General", "xcorr_noise_limit")).flatten()
+    data = np.take(raw_data.data, noise_pulses, axis=raw_data.axis["pulse"])
+    return np.array([
+        2 * data.size,
+        np.sum(data.real) + np.sum(data.imag),
+        np.sum(np.square(data.real)) + np.sum(np.square(data.imag)),
+    ])
+
+
+class StreamingEventSearch:
+    """
+    Online version of `metecho.events.search` that is updated with the matched filter
+    output of consecutive blocks of pulses, e.g. from `xcorr_echo_search` on each file
+    of a time ordered sequence or on each block of a file.
+
+    The search criteria are the same search objects as for the batch search, but the
+    thresholds are computed from the last `noise_history` pulses instead of the whole
+    file. The moving standard deviations are centered on each pulse, so a pulse is
+    evaluated when `MOVE_STD_WINDOW // 2` later pulses have arrived. Found pulses are
+    clustered as they arrive: a new event is started when the gap to the previous found
+    pulse, or the jump in doppler shift or range from the mean of the last
+    `smoothing_window` found pulses, exceeds the split limits of the configuration. An
+    event is emitted once no pulse is found for `min_ipp_separation_split` pulses, so
+    the latency is bounded by the sum of the two delays.
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+        The search configuration
+    search_function_objects : list of metecho.events.search_objects.SearchObject, optional
+        Search criteria, defaults to `search_objects.get_defaults()`.
+    noise_history : int
+        Number of most recent pulses used for the noise and power statistics.
+    """
+
+    def __init__(self, config, search_function_objects=None, noise_history=NOISE_HISTORY):
+        self.config = config
+        if search_function_objects is None:
+            search_function_objects = search_objects.get_defaults()
+        self.search_function_objects = search_function_objects
+        self.noise_history = noise_history
+        self.window = config.getint("General", "MOVE_STD_WINDOW")
+
+        self.pulses = 0
+        self.evaluated = 0
+        self._doppler_statistics = rolling.RollingStatistics(self.window)
+        self._start_statistics = rolling.RollingStatistics(self.window)
+        self._pending = {key: np.empty((0,)) for key in PULSE_KEYS + ["doppler_std", "start_std"]}
+        self._history = {key: np.empty((0,)) for key in PULSE_KEYS + ["doppler_std", "start_std"]}
+        self._noise = np.zeros((3,))
+        self._files = []
+        self._cluster = None
+
+    def __repr__(self):
+        return f"<StreamingEventSearch: {self.pulses} pulses, {self.evaluated} evaluated>"
+
+    def update(self, matched_filter_output, raw_data=None, tot_pow=None, path=None, meta=None, noise=None):
+        """
+        Adds the matched filter output of the next block of pulses and returns the
+        events that ended. If `raw_data` is given, it is used for the total power of each
+        pulse, the noise estimate of the events and the file and date of the events,
+        otherwise `tot_pow` must be given together with the `path` and `meta` data of
+        the file the pulses belong to, and optionally the `noise_sums` of the pulses.
+        """
+        if tot_pow is None:
+            if raw_data is None:
+                raise ValueError("Either the raw data or the total power of the pulses must be given")
+            tot_pow = total_power(raw_data)
+        block = {
+            "best_peak": np.real(matched_filter_output["best_peak"]),
+            "tot_pow": np.asarray(tot_pow, dtype=np.float64),
+            "best_doppler": np.asarray(matched_filter_output["best_doppler"], dtype=np.float64),
+            "best_start": np.asarray(matched_filter_output["best_start"], dtype=np.float64),
+        }
+        pulses = block["best_peak"].size
+        if pulses == 0:
+            return []
+
+        if raw_data is not None:
+            path, meta = getattr(raw_data, "path", None), raw_data.meta
+            noise = noise_sums(raw_data, block["best_peak"], self.config)
+        self._add_file(path, {} if meta is None else meta)
+        if noise is not None:
+            self._noise += noise
+        for key in PULSE_KEYS:
+            self._pending[key] = np.concatenate([self._pending[key], block[key]])
+
+        # The window ending at each new pulse is centered `window - 1 - window // 2` pulses earlier,
+        # the first window is also used for the pulses before its center
+        first_window = self._doppler_statistics.samples < self.window
+        for key, statistics in [("doppler", self._doppler_statistics), ("start", self._start_statistics)]:
+            std = np.sqrt(statistics.update(block[f"best_{key}"])[1])
+            if first_window and std.size > 0:
+                std = np.concatenate([np.full((self.window // 2,), std[0]), std])
+            self._pending[f"{key}_std"] = np.concatenate([self._pending[f"{key}_std"], std])
+        self.pulses += pulses
+
+        return self._evaluate(self._pending["doppler_std"].size)
+
+    def flush(self):
+        """
+        Evaluates the remaining pulses, using the last complete window for the moving
+        standard deviations, and returns all events that have not been emitted yet.
+        """
+        remaining = self._pending["best_peak"].size - self._pending["doppler_std"].size
+        if remaining > 0:
+            for key in ["doppler", "start"]:
+                std = np.concatenate([self._history[f"{key}_std"], self._pending[f"{key}_std"]])
+                fill = std[-1] if std.size > 0 else np.std(self._pending[f"best_{key}"])
+                self._pending[f"{key}_std"] = np.concatenate([
+                    self._pending[f"{key}_std"],
+                    np.full((remaining,), fill),
+                ])
+        events = self._evaluate(self._pending["best_peak"].size)
+        events += self._close_cluster()
+        return events
+
+    def noise(self):
+        """Gaussian noise estimate of the raw data of the pulses without coherent signal."""
+        samples, total, total_sq = self._noise
+        if samples < 2:
+            return None
+        mean = total / samples
+        std_dev = np.sqrt(max(total_sq / samples - mean**2, 0))
+        return calc_noise.gaussian_noise_statistics(mean, std_dev, int(samples))
+
+    def _add_file(self, path, meta):
+        if len(self._files) > 0 and self._files[-1]["path"] == path:
+            return
+        self._files.append({
+            "first_pulse": self.pulses,
+            "path": path,
+            "date": meta.get("date", None),
+            "T_ipp": meta.get("T_ipp", None),
+        })
+
+    def _statistics(self):
+        """Criteria statistics of the pulses in the noise history, `None` if none of them is noise."""
+        history = self._history
+        noise_pulses = history["best_peak"] < self.config.getfloat("General", "xcorr_noise_limit")
+        if not np.any(noise_pulses):
+            return None
+        tot_pow_mean = np.mean(history["tot_pow"][noise_pulses])
+        tot_pow_std = np.std(history["tot_pow"][noise_pulses])
+        filter_indices = (history["tot_pow"]
+                          < tot_pow_mean + self.config.getfloat("General", "pow_std_est") * tot_pow_std)
+        if not np.any(filter_indices):
+            return None
+
+        pulses = history["best_peak"].size
+        statistics_output = {
+            "best_peak_filt": history["best_peak"][filter_indices],
+            "tot_pow_filt": history["tot_pow"][filter_indices],
+            "best_doppler": history["best_doppler"],
+            "best_start": history["best_start"],
+            "doppler_coherrence": np.sum(
+                history["doppler_std"] < self.config.getfloat("General", "dop_std_coherr") / pulses),
+            "start_coherrence": np.sum(
+                history["start_std"] < self.config.getfloat("General", "start_std_coherr") / pulses),
+        }
+        return search_objects.criteria_statistics(statistics_output, self.config)
+
+    def _evaluate(self, pulses):
+        """Evaluates the search criteria on the first `pulses` pending pulses and clusters them."""
+        if pulses == 0:
+            return []
+        block = {key: value[:pulses] for key, value in self._pending.items()}
+        self._pending = {key: value[pulses:] for key, value in self._pending.items()}
+        self._history = {
+            key: np.concatenate([self._history[key], block[key]])[-self.noise_history:]
+            for key in self._history
+        }
+        pulse_inds = self.evaluated + np.arange(pulses)
+        self.evaluated += pulses
+
+        statistics = self._statistics()
+        if statistics is None:
+            logger.warning(
+                f"No noise found in the last {self.noise_history} pulses, skipping {pulses} pulses")
+            found = np.zeros((pulses,), dtype=bool)
+        else:
+            block["criteria_statistics"] = statistics
+            criteria_met, required_met, _ = evaluate_criteria(
+                self.search_function_objects, block, None, self.config)
+            found = np.logical_and(required_met, criteria_met >= self.config.getint("General", "CRITERIA_N"))
+
+        return self._cluster_pulses(
+            pulse_inds[found],
+            block["best_doppler"][found],
+            block["best_start"][found],
+        )
+
+    def _cluster_pulses(self, pulse_inds, best_doppler, best_start):
+        config = self.config
+        events = []
+        for pulse, doppler, start in zip(pulse_inds, best_doppler, best_start):
+            if self._cluster is not None:
+                smoothing = config.getint("General", "smoothing_window")
+                split = (
+                    pulse - self._cluster["pulses"][-1]
+                    >= config.getint("General", "min_ipp_separation_split")
+                    or np.abs(doppler - np.mean(self._cluster["doppler"][-smoothing:]))
+                    >= config.getfloat("General", "min_dop_separation_split")
+                    or np.abs(start - np.mean(self._cluster["start"][-smoothing:]))
+                    >= config.getfloat("General", "min_range_separation_split")
+                )
+                if split:
+                    events += self._close_cluster()
+            if self._cluster is None:
+                self._cluster = {"pulses": [], "doppler": [], "start": []}
+            self._cluster["pulses"].append(pulse)
+            self._cluster["doppler"].append(doppler)
+            self._cluster["start"].append(start)
+
+        if (self._cluster is not None and self.evaluated - 1 - self._cluster["pulses"][-1]
+                >= config.getint("General", "min_ipp_separation_split")):
+            events += self._close_cluster()
+        return events
+
+    def _close_cluster(self):
+        cluster, self._cluster = self._cluster, None
+        if cluster is None or len(cluster["pulses"]) <= self.config.getint("General", "least_ipp_available"):
+            return []
+
+        IPP_extend = self.config.getint("General", "IPP_extend")
+        start_pulse = cluster["pulses"][0] - IPP_extend
+        end_pulse = cluster["pulses"][-1] + IPP_extend
+
+        first_pulses = [file["first_pulse"] for file in self._files]
+        first_file = max(np.searchsorted(first_pulses, max(start_pulse, 0), side="right") - 1, 0)
+        last_file = max(np.searchsorted(first_pulses, end_pulse, side="right") - 1, first_file)
+        files = self._files[first_file:(last_file + 1)]
+        offset = files[0]["first_pulse"]
+
+        ev_date = files[0]["date"]
+        if ev_date is not None and files[0]["T_ipp"] is not None:
+            ev_date += np.timedelta64(int(1e9 * (start_pulse - offset) * files[0]["T_ipp"]), 'ns')
+
+        # Files that can no longer be part of an event are forgotten
+        del self._files[:first_file]
+
+        return [event.Event(
+            start_pulse - offset,
+            end_pulse - offset,
+            [file["path"] for file in files],
+            ev_date,
+            files_start_date=[file["date"] for file in files],
+            found_indices=[pulse - offset for pulse in cluster["pulses"]],
+            event_search_executed=datetime.now(),
+            event_search_config=self.config,
+            event_type="meteor:head",
+            noise=self.noise(),
+        )]
+
+
+def search_stream(raw_data_blocks, config, signal, search_function_objects=None, noise_history=NOISE_HISTORY,
+                  **kwargs):
+    """
+    Runs the matched filter on each raw data block of an iterable, e.g. the files of a
+    time ordered sequence or `raw_data.pulse_blocks`, and yields the events found by a
+    `StreamingEventSearch` as soon as they end. Other keyword arguments are passed to
+    `xcorr_echo_search`.
+    """
+    detector = StreamingEventSearch(config, search_function_objects=search_function_objects,
+                                    noise_history=noise_history)
+    kwargs.setdefault("progress_bar", False)
+    for raw_data in raw_data_blocks:
+        matched_filter_output = xcorr.xcorr_echo_search(
+            raw_data,
+            config.getint("General", "dop_min_freq"),
+            config.getint("General", "dop_max_freq"),
+            config.getint("General", "dop_step_size"),
+            signal,
+            **kwargs
+        )
+        yield from detector.update(matched_filter_output, raw_data)
+    yield from detector.flush()
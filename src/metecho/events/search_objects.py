@@ -6,6 +6,39 @@ def get_defaults():
     return [XcorrSigma(), TotpowSigma(), DopplerSigma(), IndPm(), MinDopAllowed(), MinStartAllowed()]
 
 
+def criteria_statistics(matched_filter_output, config):
+    """
+    Computes the statistics that are shared between the default search objects once
+    for the whole matched filter output, instead of in every search object.
+    """
+    return {
+        "best_peak_filt_mean": np.mean(matched_filter_output["best_peak_filt"]),
+        "best_peak_filt_std": np.std(matched_filter_output["best_peak_filt"]),
+        "tot_pow_filt_mean": np.mean(matched_filter_output["tot_pow_filt"]),
+        "tot_pow_filt_std": np.std(matched_filter_output["tot_pow_filt"]),
+        "best_doppler_mean": np.mean(matched_filter_output["best_doppler"]),
+        "best_doppler_std": np.std(matched_filter_output["best_doppler"]),
+        "best_start_mean": np.mean(matched_filter_output["best_start"]),
+        "best_start_std": np.std(matched_filter_output["best_start"]),
+        "coherent": bool(
+            matched_filter_output["doppler_coherrence"]
+            < config.getfloat("General", "dop_std_coherr_percent")
+            or matched_filter_output["start_coherrence"]
+            < config.getfloat("General", "start_std_coherr_percent")
+        ),
+    }
+
+
+def get_statistics(matched_filter_output, config):
+    """
+    Returns the "criteria_statistics" of the matched filter output, they are
+    computed if the output was not prepared by `metecho.events.search`.
+    """
+    if "criteria_statistics" not in matched_filter_output:
+        matched_filter_output["criteria_statistics"] = criteria_statistics(matched_filter_output, config)
+    return matched_filter_output["criteria_statistics"]
+
+
 class SearchObject(ABC):
     def __init__(self, **kwargs):
         self.criteria = []
@@ -32,11 +65,11 @@ class XcorrSigma(SearchObject):
     required_trails = False
 
     def search(self, matched_filter_output, raw_data, config):
-        self.required = False
+        statistics = get_statistics(matched_filter_output, config)
         self.criteria = np.array(matched_filter_output["best_peak"]
-                                 > (np.mean(matched_filter_output["best_peak_filt"])
+                                 > (statistics["best_peak_filt_mean"]
                                     + config.getfloat("General", "FIND_CRITERIA_xcorr_sigma")
-                                    * np.std(matched_filter_output["best_peak_filt"])))
+                                    * statistics["best_peak_filt_std"]))
         return self.criteria
 
 
@@ -45,10 +78,11 @@ class TotpowSigma(SearchObject):
     required_trails = False
 
     def search(self, matched_filter_output, raw_data, config):
+        statistics = get_statistics(matched_filter_output, config)
         self.criteria = np.array(matched_filter_output["tot_pow"]
-                                 > (np.mean(matched_filter_output["tot_pow_filt"])
+                                 > (statistics["tot_pow_filt_mean"]
                                     + config.getfloat("General", "FIND_CRITERIA_totpow_sigma")
-                                    * np.std(matched_filter_output["tot_pow_filt"])))
+                                    * statistics["tot_pow_filt_std"]))
         return self.criteria
 
 
@@ -57,19 +91,17 @@ class DopplerSigma(SearchObject):
     required_trails = False
 
     def search(self, matched_filter_output, raw_data, config):
-        self.doppler_coherrence = (matched_filter_output["doppler_coherrence"]
-                                   < config.getfloat("General", "dop_std_coherr_percent")
-                                   or matched_filter_output["start_coherrence"]
-                                   < config.getfloat("General", "start_std_coherr_percent"))
+        statistics = get_statistics(matched_filter_output, config)
+        self.doppler_coherrence = statistics["coherent"]
         doppler_std = (matched_filter_output["doppler_std"]
                        < config.getfloat("General", "FIND_CRITERIA_dop_STD_sigma")
-                       * np.std(matched_filter_output["best_doppler"]))
-        upper_limit = (np.mean(matched_filter_output["best_doppler"])
+                       * statistics["best_doppler_std"])
+        upper_limit = (statistics["best_doppler_mean"]
                        + (config.getfloat("General", "FIND_CRITERIA_dop_sigma")
-                          * np.std(matched_filter_output["best_doppler"])))
-        lower_limit = (np.mean(matched_filter_output["best_doppler"])
+                          * statistics["best_doppler_std"]))
+        lower_limit = (statistics["best_doppler_mean"]
                        - (config.getfloat("General", "FIND_CRITERIA_dop_sigma")
-                          * np.std(matched_filter_output["best_doppler"])))
+                          * statistics["best_doppler_std"]))
         best_doppler_above_limit = matched_filter_output["best_doppler"] > upper_limit
         best_doppler_below_limit = matched_filter_output["best_doppler"] < lower_limit
         self.criteria = (np.array(doppler_std)
@@ -83,16 +115,14 @@ class IndPm(SearchObject):
     required_trails = False
 
     def search(self, matched_filter_output, raw_data, config):
-        self.doppler_coherrence = (matched_filter_output["doppler_coherrence"]
-                                   < config.getfloat("General", "dop_std_coherr_percent")
-                                   or matched_filter_output["start_coherrence"]
-                                   < config.getfloat("General", "start_std_coherr_percent"))
+        statistics = get_statistics(matched_filter_output, config)
+        self.doppler_coherrence = statistics["coherent"]
         start_std = (matched_filter_output["start_std"]
                      < config.getfloat("General", "FIND_CRITERIA_start_STD_sigma")
-                     * np.std(matched_filter_output["best_start"]))
-        upper_limit = (np.mean(matched_filter_output["best_start"])
+                     * statistics["best_start_std"])
+        upper_limit = (statistics["best_start_mean"]
                        + config.getfloat("General", "FIND_CRITERIA_ind_pm"))
-        lower_limit = (np.mean(matched_filter_output["best_start"])
+        lower_limit = (statistics["best_start_mean"]
                        - config.getfloat("General", "FIND_CRITERIA_ind_pm"))
         best_start_above_limit = matched_filter_output["best_start"] > upper_limit
         best_start_below_limit = matched_filter_output["best_start"] < lower_limit
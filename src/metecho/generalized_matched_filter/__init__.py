@@ -1 +1,7 @@
-from . import xcorr
\ No newline at end of file
+from . import xcorr
+from . import code_bank
+from .code_bank import CodeBank, get_code_bank
+from . import gmf_output
+from .gmf_output import GMFOutput, MemmapGMFOutput, HDF5GMFOutput, RegionOfInterestGMFOutput
+from . import cache
+from .cache import MatchedFilterCache
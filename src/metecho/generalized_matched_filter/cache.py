@@ -0,0 +1,189 @@
+"""
+Matched filter output cache
+===========================
+
+Running the generalized matched filter is by far the most expensive part of an
+event search, while the detection criteria are cheap to re-evaluate. The
+`MatchedFilterCache` stores the matched filter output of each raw data file as a
+`.npz` file in a cache directory, keyed by the file path, size and modification
+time together with all the parameters that change the output. Re-running a
+search on the same files with other thresholds then skips the matched filter.
+The cache is bounded in size and evicts the least recently used outputs.
+
+"""
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+
+import numpy as np
+
+from . import xcorr
+
+logger = logging.getLogger(__name__)
+
+# Default size limit of the cache in bytes
+CACHE_SIZE_LIMIT = 2**32
+
+# Keyword arguments of `xcorr_echo_search` that do not change the output
+_OUTPUT_INVARIANT_KWARGS = {"progress_bar", "threads", "method"}
+
+
+class MatchedFilterCache:
+    """On-disk cache of `xcorr_echo_search` outputs.
+
+    Parameters
+    ----------
+    directory : str or pathlib.Path
+        Directory where the cached outputs are stored, created if it does not exist.
+    max_size : int
+        Maximum total size in bytes of the cached outputs, the least recently
+        used outputs are removed when it is exceeded.
+    """
+
+    def __init__(self, directory, max_size=CACHE_SIZE_LIMIT):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+
+    def __repr__(self):
+        return f"<MatchedFilterCache: {self.directory}>"
+
+    @staticmethod
+    def key(path, doppler_freq_min, doppler_freq_max, doppler_freq_step, signal_model, samp, **kwargs):
+        """Hash that identifies the matched filter output of a file for the given parameters."""
+        path = pathlib.Path(path).resolve()
+        stat = path.stat()
+        signal_model = np.ascontiguousarray(np.atleast_2d(signal_model), dtype=np.float64)
+
+        hasher = hashlib.sha256()
+        hasher.update(str(path).encode())
+        hasher.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        hasher.update(str(signal_model.shape).encode())
+        hasher.update(signal_model.tobytes())
+        doppler_freq = (float(doppler_freq_min), float(doppler_freq_max), float(doppler_freq_step))
+        hasher.update(repr(doppler_freq).encode())
+        hasher.update(repr(float(samp)).encode())
+        for name in sorted(kwargs):
+            value = kwargs[name]
+            if isinstance(value, np.ndarray):
+                value = value.tobytes()
+            elif name == "dtype":
+                value = np.dtype(value).str
+            hasher.update(f"{name}={value!r}".encode())
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.npz"
+
+    def load(self, key):
+        """Returns the cached matched filter output or `None` if it is not in the cache."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as cached:
+                matched_filter_output = {name: cached[name] for name in cached.files}
+            os.utime(path)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        matched_filter_output["pulse_length"] = int(matched_filter_output["pulse_length"])
+        logger.debug(f"Loaded matched filter output {key} from cache")
+        return matched_filter_output
+
+    def save(self, key, matched_filter_output):
+        """Stores the array valued items of a matched filter output in the cache."""
+        arrays = {
+            name: value
+            for name, value in matched_filter_output.items()
+            if isinstance(value, np.ndarray) and not isinstance(value, np.memmap)
+        }
+        arrays["pulse_length"] = np.array(matched_filter_output["pulse_length"])
+
+        # Write to a temporary file first so that other processes never read a partial file
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.savez(fh, **arrays)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.debug(f"Saved matched filter output {key} to cache")
+        self.evict()
+
+    def _entries(self):
+        """Cached outputs as `(last use time, size, path)` sorted from least to most recently used."""
+        entries = []
+        for entry in self.directory.glob("*.npz"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+        entries.sort()
+        return entries
+
+    def size(self):
+        """Total size in bytes of the cached outputs."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Removes the least recently used outputs until the cache is within its size limit."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            try:
+                entry.unlink()
+                logger.debug(f"Evicted {entry.name} from matched filter cache")
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """Removes all cached outputs."""
+        for _, _, entry in self._entries():
+            try:
+                entry.unlink()
+            except FileNotFoundError:
+                pass
+
+    def xcorr_echo_search(
+        self,
+        raw_data,
+        doppler_freq_min,
+        doppler_freq_max,
+        doppler_freq_step,
+        signal_model,
+        **kwargs
+    ):
+        """Same as `xcorr.xcorr_echo_search` but returns the cached output if the file
+        was already filtered with the same parameters. The pulses of the file that
+        are held by the raw data, e.g. in a `pulse_view`, are part of the key. Outputs
+        of in-memory raw data and searches returning the full matched filter output are not cached.
+        """
+        path = getattr(raw_data, "path", None)
+        if path is None or not pathlib.Path(path).is_file() or kwargs.get("full_gmf_output", False):
+            return xcorr.xcorr_echo_search(
+                raw_data, doppler_freq_min, doppler_freq_max, doppler_freq_step, signal_model, **kwargs)
+
+        key = self.key(
+            path,
+            doppler_freq_min,
+            doppler_freq_max,
+            doppler_freq_step,
+            signal_model,
+            raw_data.meta["T_samp"],
+            backend=raw_data.backend,
+            data_shape=tuple(raw_data.data.shape),
+            pulse_selection=getattr(raw_data, "pulse_selection", ()),
+            **{name: value for name, value in kwargs.items() if name not in _OUTPUT_INVARIANT_KWARGS}
+        )
+        matched_filter_output = self.load(key)
+        if matched_filter_output is None:
+            matched_filter_output = xcorr.xcorr_echo_search(
+                raw_data, doppler_freq_min, doppler_freq_max, doppler_freq_step, signal_model, **kwargs)
+            self.save(key, matched_filter_output)
+        return matched_filter_output
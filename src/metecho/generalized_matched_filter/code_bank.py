@@ -0,0 +1,154 @@
+"""
+Doppler shifted code banks
+==========================
+
+The generalized matched filter correlates every pulse with the transmitted code
+modulated by every doppler shift in the search grid. Since the code and the
+doppler grid usually are the same for a whole campaign, the modulated signal
+models are computed once and stored in a `CodeBank` that is reused for all
+pulses and files, both by the C-library and the FFT based methods.
+
+"""
+import ctypes
+import logging
+from collections import OrderedDict
+
+import numpy as np
+import numpy.ctypeslib as npct
+import scipy.fft
+
+from metecho import libmet
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of code banks kept in the module cache
+CODE_BANK_CACHE_SIZE = 64
+
+_CODE_BANKS = OrderedDict()
+
+# Define the C interface
+
+np_double = npct.ndpointer(np.float64, ndim=1, flags='aligned, contiguous')
+np_double_out = npct.ndpointer(np.float64, ndim=1, flags='aligned, contiguous, writeable')
+np_complex_2d = npct.ndpointer(np.complex128, ndim=2, flags='aligned, c_contiguous, writeable')
+
+libmet.code_bank.argtypes = [
+    np_double,
+    ctypes.c_int,
+    np_double,
+    ctypes.c_int,
+    ctypes.c_double,
+    np_complex_2d,
+    np_double_out,
+]
+
+
+def doppler_shifted_models(code, doppler_freq, samp):
+    """
+    Modulates the code with each of the given doppler shifts, returns a `shape=(doppler, code)` array.
+    If a `shape=(pulses, code)` array of codes is given a `shape=(pulses, doppler, code)` array is returned,
+    the doppler shifts can then also be given per pulse as a `shape=(pulses, doppler)` array.
+    """
+    doppler_freq = np.asarray(doppler_freq)
+    phase = 2 * np.pi * doppler_freq[..., None] * np.arange(1, code.shape[-1] + 1) * samp
+    return np.exp(1j * phase) * code[..., None, :]
+
+
+class CodeBank:
+    """The transmitted code modulated with every doppler shift of a search grid.
+
+    Parameters
+    ----------
+    code : numpy.ndarray
+        `shape=(code,)` real valued transmitted code.
+    doppler_freq : numpy.ndarray
+        `shape=(doppler,)` doppler shifts in Hz.
+    samp : float
+        Sample time in seconds.
+
+    Attributes
+    ----------
+    models : numpy.ndarray
+        `shape=(doppler, code)` doppler shifted signal models.
+    energy : numpy.ndarray
+        `shape=(doppler,)` energy of each signal model.
+    """
+
+    def __init__(self, code, doppler_freq, samp):
+        self.code = np.ascontiguousarray(code, dtype=np.float64)
+        self.doppler_freq = np.ascontiguousarray(doppler_freq, dtype=np.float64)
+        self.samp = float(samp)
+
+        self.models = np.empty((self.doppler_size, self.code_size), dtype=np.complex128)
+        self.energy = np.empty((self.doppler_size,), dtype=np.float64)
+        libmet.code_bank(
+            self.doppler_freq,
+            self.doppler_size,
+            self.code,
+            self.code_size,
+            self.samp,
+            self.models,
+            self.energy,
+        )
+        self._spectra = {}
+        self._planar_models = None
+
+    def __repr__(self):
+        return f"<CodeBank: {self.doppler_size} doppler shifts of a {self.code_size} sample code>"
+
+    @property
+    def doppler_size(self):
+        return self.doppler_freq.size
+
+    @property
+    def code_size(self):
+        return self.code.size
+
+    @staticmethod
+    def key(code, doppler_freq, samp):
+        """Hashable key that identifies a code bank."""
+        code = np.ascontiguousarray(code, dtype=np.float64)
+        doppler_freq = np.ascontiguousarray(doppler_freq, dtype=np.float64)
+        return (code.tobytes(), doppler_freq.tobytes(), float(samp))
+
+    @property
+    def planar_models(self):
+        """Real and imaginary parts of the signal models as separate contiguous arrays."""
+        if self._planar_models is None:
+            self._planar_models = (
+                np.ascontiguousarray(self.models.real),
+                np.ascontiguousarray(self.models.imag),
+            )
+        return self._planar_models
+
+    def spectrum(self, fft_size, dtype=np.complex128):
+        """Conjugated spectrum of the signal models zero padded to `fft_size`,
+        computed once per size and precision.
+        """
+        key = (fft_size, np.dtype(dtype))
+        if key not in self._spectra:
+            spectrum = np.conj(scipy.fft.fft(self.models, n=fft_size, axis=-1))
+            self._spectra[key] = spectrum.astype(dtype, copy=False)
+        return self._spectra[key]
+
+
+def get_code_bank(code, doppler_freq, samp):
+    """Returns the `CodeBank` for the given code, doppler grid and sample time,
+    it is only created if it is not found in the module cache.
+    """
+    key = CodeBank.key(code, doppler_freq, samp)
+    if key in _CODE_BANKS:
+        _CODE_BANKS.move_to_end(key)
+        return _CODE_BANKS[key]
+
+    bank = CodeBank(code, doppler_freq, samp)
+    logger.debug(f"Created {bank}")
+    _CODE_BANKS[key] = bank
+    while len(_CODE_BANKS) > CODE_BANK_CACHE_SIZE:
+        _CODE_BANKS.popitem(last=False)
+    return bank
+
+
+def clear_cache():
+    """Removes all code banks from the module cache."""
+    _CODE_BANKS.clear()
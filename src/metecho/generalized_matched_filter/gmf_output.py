@@ -0,0 +1,208 @@
+"""
+Generalized matched filter output sinks
+=======================================
+
+The full generalized matched filter output is the `shape=(doppler, delay)`
+crosscorrelation of every pulse, which quickly grows to gigabytes when stored
+as a `shape=(doppler, delay, pulse)` complex cube. Instead of collecting the
+pulses in memory, `xcorr_echo_search` can write each pulse to a sink as soon as
+it is decoded. The sinks can keep the complex cube, a reduced precision
+magnitude cube, only a region of interest around the peak of each pulse or
+write the cube to a HDF5 file or numpy memmap on disk.
+
+"""
+import logging
+import pathlib
+
+import numpy as np
+import h5py
+
+logger = logging.getLogger(__name__)
+
+
+class GMFOutput:
+    """Keeps the full matched filter output in memory as a `shape=(doppler, delay, pulse)` cube.
+
+    Parameters
+    ----------
+    magnitude : bool
+        Only store the magnitude of the crosscorrelation.
+    dtype : numpy.dtype, optional
+        Data type of the stored values, e.g. `np.float16` together with
+        `magnitude=True` for a reduced precision magnitude cube. Defaults to the
+        precision of the matched filter.
+    """
+
+    def __init__(self, magnitude=False, dtype=None):
+        self.magnitude = magnitude
+        self.dtype = dtype
+        self.data = None
+
+    def _dtype(self, dtype):
+        if self.dtype is not None:
+            return np.dtype(self.dtype)
+        dtype = np.dtype(dtype)
+        if self.magnitude:
+            return np.finfo(dtype).dtype
+        return dtype
+
+    def _value(self, pows):
+        if self.magnitude:
+            return np.abs(pows)
+        return pows
+
+    def allocate(self, doppler_size, delay_size, pulses, dtype):
+        """Prepares the storage for the output of `pulses` pulses computed with `dtype` precision."""
+        self.data = np.zeros((doppler_size, delay_size, pulses), dtype=self._dtype(dtype))
+
+    def write(self, pulse, pows, doppler_index, delay_index):
+        """Stores the `shape=(doppler, delay)` crosscorrelation of a pulse, the indices
+        of its best doppler shift and delay are given for sinks that only keep the peak region.
+        """
+        self.data[:, :, pulse] = self._value(pows)
+
+    def result(self):
+        """The stored output that is returned as "gmf_output" by `xcorr_echo_search`."""
+        return self.data
+
+
+class MemmapGMFOutput(GMFOutput):
+    """Writes the full matched filter output to a `.npy` file on disk through a numpy memmap,
+    the returned output is the memmap that can be re-opened later with `numpy.load(path, mmap_mode="r")`.
+    By default only the single precision magnitude is stored.
+    """
+
+    def __init__(self, path, magnitude=True, dtype=np.float32):
+        super().__init__(magnitude=magnitude, dtype=dtype)
+        self.path = pathlib.Path(path)
+
+    def allocate(self, doppler_size, delay_size, pulses, dtype):
+        logger.debug(f"Opening matched filter output memmap {self.path}")
+        self.data = np.lib.format.open_memmap(
+            self.path,
+            mode="w+",
+            dtype=self._dtype(dtype),
+            shape=(doppler_size, delay_size, pulses),
+        )
+
+    def result(self):
+        self.data.flush()
+        return self.data
+
+
+class HDF5GMFOutput(GMFOutput):
+    """Writes the full matched filter output to a HDF5 dataset chunked per pulse,
+    the returned output is the dataset opened read-only. By default only the
+    single precision magnitude is stored.
+    """
+
+    def __init__(self, path, dataset="gmf_output", magnitude=True, dtype=np.float32, compression=None):
+        super().__init__(magnitude=magnitude, dtype=dtype)
+        self.path = pathlib.Path(path)
+        self.dataset = dataset
+        self.compression = compression
+        self.h5file = None
+
+    def allocate(self, doppler_size, delay_size, pulses, dtype):
+        logger.debug(f"Opening matched filter output HDF5 file {self.path}")
+        self.h5file = h5py.File(self.path, "w")
+        self.data = self.h5file.create_dataset(
+            self.dataset,
+            shape=(doppler_size, delay_size, pulses),
+            dtype=self._dtype(dtype),
+            chunks=(doppler_size, delay_size, 1),
+            compression=self.compression,
+        )
+
+    def result(self):
+        self.h5file.close()
+        self.h5file = h5py.File(self.path, "r")
+        return self.h5file[self.dataset]
+
+
+class RegionOfInterest:
+    """Matched filter output around the peak of each pulse.
+
+    Attributes
+    ----------
+    data : numpy.ndarray
+        `shape=(doppler, delay, pulse)` region around each peak, parts of the
+        region outside of the full output are zero.
+    doppler_start : numpy.ndarray
+        `shape=(pulse,)` doppler index of the first row of the region of each pulse.
+    delay_start : numpy.ndarray
+        `shape=(pulse,)` delay index of the first column of the region of each pulse.
+    shape : tuple
+        Shape of the full `shape=(doppler, delay, pulse)` matched filter output.
+    """
+
+    def __init__(self, data, doppler_start, delay_start, shape):
+        self.data = data
+        self.doppler_start = doppler_start
+        self.delay_start = delay_start
+        self.shape = shape
+
+    def __repr__(self):
+        return f"<RegionOfInterest: {self.data.shape[:2]} of {self.shape}>"
+
+
+class RegionOfInterestGMFOutput(GMFOutput):
+    """Keeps only `doppler_width` doppler shifts and `delay_width` delays on each side
+    of the peak of every pulse, the returned output is a `RegionOfInterest`.
+    """
+
+    def __init__(self, doppler_width, delay_width, magnitude=False, dtype=None):
+        super().__init__(magnitude=magnitude, dtype=dtype)
+        self.doppler_width = doppler_width
+        self.delay_width = delay_width
+
+    def allocate(self, doppler_size, delay_size, pulses, dtype):
+        self.shape = (doppler_size, delay_size, pulses)
+        self.data = np.zeros(
+            (2 * self.doppler_width + 1, 2 * self.delay_width + 1, pulses),
+            dtype=self._dtype(dtype),
+        )
+        self.doppler_start = np.zeros((pulses,), dtype=np.int64)
+        self.delay_start = np.zeros((pulses,), dtype=np.int64)
+
+    def write(self, pulse, pows, doppler_index, delay_index):
+        doppler_start = doppler_index - self.doppler_width
+        delay_start = delay_index - self.delay_width
+        self.doppler_start[pulse] = doppler_start
+        self.delay_start[pulse] = delay_start
+
+        doppler_inds = np.arange(doppler_start, doppler_start + self.data.shape[0])
+        delay_inds = np.arange(delay_start, delay_start + self.data.shape[1])
+        doppler_valid = np.logical_and(doppler_inds >= 0, doppler_inds < pows.shape[0])
+        delay_valid = np.logical_and(delay_inds >= 0, delay_inds < pows.shape[1])
+        self.data[np.ix_(doppler_valid, delay_valid, [pulse])] = self._value(
+            pows[np.ix_(doppler_inds[doppler_valid], delay_inds[delay_valid])]
+        )[:, :, None]
+
+    def result(self):
+        return RegionOfInterest(self.data, self.doppler_start, self.delay_start, self.shape)
+
+
+def get_gmf_output(full_gmf_output):
+    """Returns the sink for the `full_gmf_output` argument of `xcorr_echo_search`,
+    `True` selects the in memory complex cube.
+    """
+    if not full_gmf_output:
+        return None
+    if full_gmf_output is True:
+        return GMFOutput()
+    if not isinstance(full_gmf_output, GMFOutput):
+        raise TypeError(f'full_gmf_output must be a bool or a GMFOutput, not "{type(full_gmf_output)}"')
+    return full_gmf_output
+
+
+def pulse_output(gmf_output, pulse):
+    """Returns the doppler indices, delay indices and `shape=(doppler, delay)` matched filter
+    output of a single pulse from any of the "gmf_output" types returned by `xcorr_echo_search`.
+    """
+    if isinstance(gmf_output, RegionOfInterest):
+        doppler_inds = gmf_output.doppler_start[pulse] + np.arange(gmf_output.data.shape[0])
+        delay_inds = gmf_output.delay_start[pulse] + np.arange(gmf_output.data.shape[1])
+        return doppler_inds, delay_inds, gmf_output.data[:, :, pulse]
+    data = np.asarray(gmf_output[:, :, pulse])
+    return np.arange(data.shape[0]), np.arange(data.shape[1]), data
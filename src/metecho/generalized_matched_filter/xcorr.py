@@ -2,10 +2,13 @@ import ctypes
 import logging
 import numpy as np
 import numpy.ctypeslib as npct
+import scipy.fft
 from tqdm import tqdm
 import threading
 
 from metecho import libmet
+from .code_bank import get_code_bank, doppler_shifted_models
+from .gmf_output import get_gmf_output
 
 logger = logging.getLogger(__name__)
 
@@ -21,13 +24,23 @@ except ImportError:
 
     comm = COMM_WORLD()
 
+# Upper limit in bytes of the work arrays used by the batched FFT matched filter
+BATCH_MEMORY_LIMIT = 2**28
+
+# Number of pulses passed to the C-library per call by the direct matched filter
+XCORR_PULSE_BLOCK = 16
+
 # Define the C interface
 
 np_double = npct.ndpointer(np.float64, ndim=1, flags='aligned, contiguous, writeable')
 np_complex = npct.ndpointer(np.complex128, ndim=1, flags='aligned, c_contiguous, writeable')
+np_double_2d = npct.ndpointer(np.float64, ndim=2, flags='aligned, c_contiguous, writeable')
+np_double_3d = npct.ndpointer(np.float64, ndim=3, flags='aligned, c_contiguous')
 np_complex_2d = npct.ndpointer(np.complex128, ndim=2, flags='aligned, c_contiguous, writeable')
+np_complex_3d = npct.ndpointer(np.complex128, ndim=3, flags='aligned, c_contiguous, writeable')
 np_complex_single = npct.ndpointer(np.complex128, ndim=0)
 np_int_pointer = npct.ndpointer(np.int32, ndim=1, flags='aligned, contiguous, writeable')
+np_int_2d = npct.ndpointer(np.int32, ndim=2, flags='aligned, c_contiguous, writeable')
 
 
 libmet.xcorr_echo_search.argtypes = [
@@ -48,6 +61,110 @@ libmet.xcorr_echo_search.argtypes = [
     ctypes.c_double,
 ]
 
+libmet.xcorr_code_bank_search.argtypes = [
+    np_complex,
+    ctypes.c_int,
+    np_complex_2d,
+    np_double,
+    ctypes.c_int,
+    ctypes.c_int,
+    np_complex_2d,
+    np_complex_2d,
+    np_int_pointer,
+    np_complex,
+    ctypes.c_int,
+    np_int_pointer,
+    ctypes.c_int,
+]
+
+libmet.xcorr_code_bank_search_pulses.argtypes = [
+    np_complex_2d,
+    ctypes.c_int,
+    ctypes.c_int,
+    np_complex_3d,
+    np_double_2d,
+    np_int_pointer,
+    ctypes.c_int,
+    ctypes.c_int,
+    np_complex_2d,
+    np_complex_2d,
+    np_complex,
+    np_int_pointer,
+    np_int_pointer,
+    np_complex_3d,
+    ctypes.c_int,
+]
+
+libmet.xcorr_workspace_create.restype = ctypes.c_void_p
+libmet.xcorr_workspace_create.argtypes = [
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+]
+
+libmet.xcorr_workspace_free.restype = None
+libmet.xcorr_workspace_free.argtypes = [
+    ctypes.c_void_p,
+]
+
+libmet.xcorr_workspace_search_pulses.argtypes = [
+    ctypes.c_void_p,
+    np_complex_2d,
+    ctypes.c_int,
+    np_complex_3d,
+    np_double_2d,
+    np_int_pointer,
+    np_complex_2d,
+    np_complex_2d,
+    np_complex,
+    np_int_pointer,
+    np_int_pointer,
+    np_complex_3d,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    np_double_2d,
+    np_int_2d,
+    np_int_2d,
+]
+
+libmet.xcorr_planar_workspace_create.restype = ctypes.c_void_p
+libmet.xcorr_planar_workspace_create.argtypes = [
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+]
+
+libmet.xcorr_planar_workspace_free.restype = None
+libmet.xcorr_planar_workspace_free.argtypes = [
+    ctypes.c_void_p,
+]
+
+libmet.xcorr_planar_search_pulses.argtypes = [
+    ctypes.c_void_p,
+    np_double_2d,
+    np_double_2d,
+    ctypes.c_int,
+    np_double_3d,
+    np_double_3d,
+    np_double_2d,
+    np_int_pointer,
+    np_complex_2d,
+    np_complex_2d,
+    np_complex,
+    np_int_pointer,
+    np_int_pointer,
+    np_complex_3d,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    np_double_2d,
+    np_int_2d,
+    np_int_2d,
+]
+
 libmet.crosscorrelate.argtypes = [
     np_complex,
     ctypes.c_int,
@@ -89,6 +206,242 @@ libmet.arange.argtypes = [
 ]
 
 
+class XcorrWorkspace:
+    """
+    Work arrays of the C-library matched filter for pulses of `signal_samples_size` samples,
+    a `code_size` sample code and `doppler_freq_size` doppler shifts, together with the
+    output arrays of a block of `XCORR_PULSE_BLOCK` pulses. It is allocated once and reused
+    for all pulses of that shape, a workspace may only be used by one thread at a time.
+    """
+
+    _create = libmet.xcorr_workspace_create
+    _free = libmet.xcorr_workspace_free
+
+    def __init__(self, signal_samples_size, code_size, doppler_freq_size):
+        self.shape = (signal_samples_size, code_size, doppler_freq_size)
+        self._pointer = self._create(signal_samples_size, code_size, doppler_freq_size)
+        if self._pointer is None:
+            raise MemoryError(f"Could not allocate xcorr workspace of shape {self.shape}")
+
+        decoded_size = signal_samples_size + code_size
+        self.sample_signals = np.empty((XCORR_PULSE_BLOCK, signal_samples_size), dtype=np.complex128)
+        self.max_pow_per_delay = np.empty((XCORR_PULSE_BLOCK, decoded_size), dtype=np.complex128)
+        self.max_pow_per_delay_norm = np.empty((XCORR_PULSE_BLOCK, decoded_size), dtype=np.complex128)
+        self.best_peak = np.empty((XCORR_PULSE_BLOCK,), dtype=np.complex128)
+        self.best_start = np.empty((XCORR_PULSE_BLOCK,), dtype=np.int32)
+        self.best_doppler_index = np.empty((XCORR_PULSE_BLOCK,), dtype=np.int32)
+        self.code_bank_index = np.empty((XCORR_PULSE_BLOCK,), dtype=np.int32)
+        self._pows = np.empty((1, 1, 1), dtype=np.complex128)
+        self.peak_power = np.empty((1, 1), dtype=np.float64)
+        self.peak_delay = np.empty((1, 1), dtype=np.int32)
+        self.peak_doppler_index = np.empty((1, 1), dtype=np.int32)
+
+    def __del__(self):
+        if getattr(self, "_pointer", None) is not None:
+            self._free(self._pointer)
+            self._pointer = None
+
+    def pows(self, store_pows):
+        """Output array for the full crosscorrelation of a block, only allocated if it is stored."""
+        if store_pows and self._pows.shape[0] != XCORR_PULSE_BLOCK:
+            signal_samples_size, code_size, doppler_freq_size = self.shape
+            self._pows = np.empty(
+                (XCORR_PULSE_BLOCK, doppler_freq_size, signal_samples_size + code_size),
+                dtype=np.complex128,
+            )
+        return self._pows
+
+    def peak_arguments(self, peaks):
+        """Arguments of the C-library peak search for a `MatchedFilterPeaks`,
+        the output arrays are only allocated if peaks are searched for.
+        """
+        if peaks is None:
+            return (0, 0, 0, self.peak_power, self.peak_delay, self.peak_doppler_index)
+        if self.peak_power.shape != (XCORR_PULSE_BLOCK, peaks.amount):
+            self.peak_power = np.empty((XCORR_PULSE_BLOCK, peaks.amount), dtype=np.float64)
+            self.peak_delay = np.empty((XCORR_PULSE_BLOCK, peaks.amount), dtype=np.int32)
+            self.peak_doppler_index = np.empty((XCORR_PULSE_BLOCK, peaks.amount), dtype=np.int32)
+        return (
+            peaks.amount,
+            peaks.min_separation[0],
+            peaks.min_separation[1],
+            self.peak_power,
+            self.peak_delay,
+            self.peak_doppler_index,
+        )
+
+    def search_pulses(self, sample_signals, code_banks, store_pows, peaks=None):
+        """Runs the C-library matched filter on a `shape=(pulses, samples)` block of pulses
+        where pulse `n` is matched with `code_banks[code_bank_index[n]]`. If a
+        `MatchedFilterPeaks` is given, the strongest peaks of each pulse are also
+        searched for and stored in `peak_power`, `peak_delay` and `peak_doppler_index`.
+        """
+        block_size = sample_signals.shape[0]
+        self.sample_signals[:block_size] = sample_signals
+        if len(code_banks) == 1:
+            signal_models = code_banks[0].models[None, :, :]
+            signal_model_energy = code_banks[0].energy[None, :]
+        else:
+            signal_models = np.stack([bank.models for bank in code_banks], axis=0)
+            signal_model_energy = np.stack([bank.energy for bank in code_banks], axis=0)
+
+        pows = self.pows(store_pows)
+        libmet.xcorr_workspace_search_pulses(
+            self._pointer,
+            self.sample_signals[:block_size],
+            block_size,
+            signal_models,
+            signal_model_energy,
+            self.code_bank_index[:block_size],
+            self.max_pow_per_delay[:block_size],
+            self.max_pow_per_delay_norm[:block_size],
+            self.best_peak[:block_size],
+            self.best_start[:block_size],
+            self.best_doppler_index[:block_size],
+            pows,
+            int(store_pows),
+            *self.peak_arguments(peaks),
+        )
+        return pows[:block_size]
+
+
+class PlanarXcorrWorkspace(XcorrWorkspace):
+    """
+    Same as `XcorrWorkspace` but for the planar C-library kernel that works on split
+    real and imaginary arrays and computes the normalized power as squared magnitudes.
+    """
+
+    _create = libmet.xcorr_planar_workspace_create
+    _free = libmet.xcorr_planar_workspace_free
+
+    def __init__(self, signal_samples_size, code_size, doppler_freq_size):
+        super().__init__(signal_samples_size, code_size, doppler_freq_size)
+        self.sample_signals_real = np.empty((XCORR_PULSE_BLOCK, signal_samples_size), dtype=np.float64)
+        self.sample_signals_imag = np.empty((XCORR_PULSE_BLOCK, signal_samples_size), dtype=np.float64)
+
+    def search_pulses(self, sample_signals, code_banks, store_pows, peaks=None):
+        block_size = sample_signals.shape[0]
+        self.sample_signals_real[:block_size] = sample_signals.real
+        self.sample_signals_imag[:block_size] = sample_signals.imag
+        if len(code_banks) == 1:
+            models_real, models_imag = code_banks[0].planar_models
+            models_real, models_imag = models_real[None, :, :], models_imag[None, :, :]
+            signal_model_energy = code_banks[0].energy[None, :]
+        else:
+            models_real = np.stack([bank.planar_models[0] for bank in code_banks], axis=0)
+            models_imag = np.stack([bank.planar_models[1] for bank in code_banks], axis=0)
+            signal_model_energy = np.stack([bank.energy for bank in code_banks], axis=0)
+
+        pows = self.pows(store_pows)
+        libmet.xcorr_planar_search_pulses(
+            self._pointer,
+            self.sample_signals_real[:block_size],
+            self.sample_signals_imag[:block_size],
+            block_size,
+            models_real,
+            models_imag,
+            signal_model_energy,
+            self.code_bank_index[:block_size],
+            self.max_pow_per_delay[:block_size],
+            self.max_pow_per_delay_norm[:block_size],
+            self.best_peak[:block_size],
+            self.best_start[:block_size],
+            self.best_doppler_index[:block_size],
+            pows,
+            int(store_pows),
+            *self.peak_arguments(peaks),
+        )
+        return pows[:block_size]
+
+
+class MatchedFilterPeaks:
+    """
+    The `amount` strongest local maxima of the normalized power of every pulse,
+    where a peak is only kept if it is at least `min_separation=(doppler, delay)`
+    doppler shifts or delays away from all stronger peaks.
+
+    Attributes
+    ----------
+    power : numpy.ndarray
+        `shape=(amount, pulse)` normalized power of each peak in descending order,
+        zero if a pulse has fewer peaks.
+    doppler_index : numpy.ndarray
+        `shape=(amount, pulse)` doppler index of each peak, -1 for missing peaks.
+    delay_index : numpy.ndarray
+        `shape=(amount, pulse)` index of each peak in the decoded signal, -1 for missing peaks.
+    """
+
+    def __init__(self, amount, min_separation, pulses, dtype=np.float64):
+        self.amount = int(amount)
+        self.min_separation = tuple(int(x) for x in min_separation)
+        self.power = np.zeros((self.amount, pulses), dtype=dtype)
+        self.doppler_index = np.full((self.amount, pulses), -1, dtype=np.int64)
+        self.delay_index = np.full((self.amount, pulses), -1, dtype=np.int64)
+
+    def outputs(self, doppler_freq_min, doppler_freq_step, signal_model_size):
+        """Peak power, start sample and doppler shift of each peak, `nan` for missing peaks."""
+        found = self.doppler_index >= 0
+        peak_start = np.where(found, self.delay_index - signal_model_size, np.nan)
+        peak_doppler = np.where(found, doppler_freq_min + self.doppler_index * doppler_freq_step, np.nan)
+        return self.power, peak_start, peak_doppler
+
+
+def find_peaks(values, amount, min_separation):
+    """
+    Numpy version of the C-library peak search on a `shape=(pulses, doppler, delay)` array,
+    returns the `shape=(amount, pulses)` power, doppler index and delay index of the
+    `amount` largest positive local maxima of each pulse, see `MatchedFilterPeaks`.
+    """
+    pulses, rows, cols = values.shape
+    padded = np.pad(values, ((0, 0), (1, 1), (1, 1)), constant_values=-np.inf)
+    local_maximum = values > 0
+    for di in (-1, 0, 1):
+        for dj in (-1, 0, 1):
+            if di == 0 and dj == 0:
+                continue
+            local_maximum &= values >= padded[:, (1 + di):(1 + di + rows), (1 + dj):(1 + dj + cols)]
+    candidates = np.where(local_maximum, values, 0).reshape(pulses, rows * cols)
+
+    power = np.zeros((amount, pulses), dtype=values.dtype)
+    doppler_index = np.full((amount, pulses), -1, dtype=np.int64)
+    delay_index = np.full((amount, pulses), -1, dtype=np.int64)
+    row_range = np.arange(rows)
+    col_range = np.arange(cols)
+    pulse_range = np.arange(pulses)
+    for k in range(amount):
+        index = np.argmax(candidates, axis=1)
+        value = candidates[pulse_range, index]
+        found = value > 0
+        if not np.any(found):
+            break
+        row, col = np.divmod(index, cols)
+        power[k] = np.where(found, value, 0)
+        doppler_index[k] = np.where(found, row, -1)
+        delay_index[k] = np.where(found, col, -1)
+
+        suppressed = np.logical_and(
+            np.abs(row_range[None, :, None] - row[:, None, None]) < min_separation[0],
+            np.abs(col_range[None, None, :] - col[:, None, None]) < min_separation[1],
+        )
+        candidates[suppressed.reshape(pulses, rows * cols)] = 0
+    return power, doppler_index, delay_index
+
+
+_workspaces = threading.local()
+
+
+def get_xcorr_workspace(signal_samples_size, code_size, doppler_freq_size, workspace_class=XcorrWorkspace):
+    """Returns the workspace of the calling thread for the given shape,
+    it is only re-allocated when the shape changes.
+    """
+    shape = (signal_samples_size, code_size, doppler_freq_size)
+    workspace = getattr(_workspaces, workspace_class.__name__, None)
+    if workspace is None or workspace.shape != shape:
+        workspace = workspace_class(*shape)
+        setattr(_workspaces, workspace_class.__name__, workspace)
+    return workspace
+
+
 def xcorr_worker(
     pulse_inds,
     progress_bar,
@@ -99,8 +452,7 @@ def xcorr_worker(
     doppler_freq_min,
     doppler_freq_max,
     doppler_freq_step,
-    signal_model,
-    samp,
+    code_banks,
     max_pow_per_delay,
     max_pow_per_delay_norm,
     best_peak,
@@ -108,49 +460,159 @@ def xcorr_worker(
     best_doppler,
     full_gmf_output,
     pows_output,
+    peaks,
+    planar=False,
 ):
-    for x in pulse_inds:
+    """
+    Crosscorrelates the given pulses in the C-library, `XCORR_PULSE_BLOCK` pulses per call.
+    The reductions over doppler shifts are done in C and the GIL is released during
+    the call, so several workers can run in parallel threads. If `planar` is set the
+    vectorized kernel working on split real and imaginary arrays is used.
+    """
+    workspace = get_xcorr_workspace(
+        sample_signal_all.shape[0],
+        signal_model_size,
+        doppler_freq_size,
+        workspace_class=PlanarXcorrWorkspace if planar else XcorrWorkspace,
+    )
+
+    pulse_inds = np.asarray(pulse_inds, dtype=np.int64)
+    for block_start in range(0, len(pulse_inds), XCORR_PULSE_BLOCK):
+        inds = pulse_inds[block_start:(block_start + XCORR_PULSE_BLOCK)]
+        block_size = len(inds)
+
+        block_banks = [code_banks[x] for x in inds]
+        unique_banks = list({id(bank): bank for bank in block_banks}.values())
+        workspace.code_bank_index[:block_size] = [unique_banks.index(bank) for bank in block_banks]
+        pows = workspace.search_pulses(sample_signal_all[:, inds].T, unique_banks, full_gmf_output, peaks)
+
+        max_pow_per_delay[:, inds] = workspace.max_pow_per_delay[:block_size].T
+        max_pow_per_delay_norm[:, inds] = workspace.max_pow_per_delay_norm[:block_size].T
+        best_peak[inds] = workspace.best_peak[:block_size]
+        best_start[inds] = workspace.best_start[:block_size]
+        best_doppler_index = workspace.best_doppler_index[:block_size]
+        best_doppler[inds] = doppler_freq_min + (best_doppler_index * doppler_freq_step)
+        if peaks is not None:
+            peaks.power[:, inds] = workspace.peak_power[:block_size].T
+            peaks.doppler_index[:, inds] = workspace.peak_doppler_index[:block_size].T
+            peaks.delay_index[:, inds] = workspace.peak_delay[:block_size].T
+        if full_gmf_output:
+            for ind, x in enumerate(inds):
+                pows_output.write(
+                    x,
+                    pows[ind],
+                    workspace.best_doppler_index[ind],
+                    workspace.best_start[ind] + signal_model_size,
+                )
+
         if progress_bar:
-            pbar.update(1)
-        sample_signal = sample_signal_all[:, x].copy()
-        sample_signal_size = len(sample_signal)
-        pows = np.zeros([doppler_freq_size, (sample_signal_size + signal_model_size)], dtype=np.complex128)
-        pows_normalized = np.zeros(
-            [doppler_freq_size, (sample_signal_size + signal_model_size)],
-            dtype=np.complex128
-        )
-        pows_size = np.array([doppler_freq_size, sample_signal_size + signal_model_size], dtype=np.int32)
-        max_pow_per_doppler = np.zeros([doppler_freq_size], dtype=np.complex128)
-        max_pow_per_doppler_size = doppler_freq_size
-        maxpowind = np.zeros([doppler_freq_size], dtype=np.int32)
-        maxpowind_size = doppler_freq_size
-        libmet.xcorr_echo_search(
-            doppler_freq_min,
-            doppler_freq_max,
-            doppler_freq_step,
-            sample_signal,
-            sample_signal_size,
-            signal_model[x],
-            signal_model_size,
+            pbar.update(block_size)
+
+
+def xcorr_batch_worker(
+    pulse_inds,
+    progress_bar,
+    pbar,
+    sample_signal_all,
+    doppler_freq_size,
+    signal_model_size,
+    doppler_freq_min,
+    doppler_freq_max,
+    doppler_freq_step,
+    code_banks,
+    max_pow_per_delay,
+    max_pow_per_delay_norm,
+    best_peak,
+    best_start,
+    best_doppler,
+    full_gmf_output,
+    pows_output,
+    peaks,
+    pulse_block=None,
+):
+    """
+    Same as `xcorr_worker` but crosscorrelates blocks of pulses and all doppler shifts at once
+    in the frequency domain using batched FFT's instead of delay by delay in the C-library.
+
+    If `pulse_block` is not given, the block size is chosen so that the
+    `shape=(pulses, doppler, delay)` work arrays stay below `BATCH_MEMORY_LIMIT` bytes.
+    """
+    sample_signal_size = sample_signal_all.shape[0]
+    decoded_size = sample_signal_size + signal_model_size
+    fft_size = scipy.fft.next_fast_len(decoded_size - 1)
+    dtype = max_pow_per_delay.dtype
+    if pulse_block is None:
+        pulse_bytes = doppler_freq_size * (fft_size + 2 * decoded_size) * dtype.itemsize
+        pulse_block = max(1, BATCH_MEMORY_LIMIT // pulse_bytes)
+
+    pulse_inds = np.asarray(pulse_inds, dtype=np.int64)
+    for block_start in range(0, len(pulse_inds), pulse_block):
+        inds = pulse_inds[block_start:(block_start + pulse_block)]
+        block_size = len(inds)
+
+        sample_signals = sample_signal_all[:, inds].T
+        pows = np.empty((block_size, doppler_freq_size, decoded_size), dtype=dtype)
+        energy = np.empty((block_size, doppler_freq_size, 1), dtype=pows.real.dtype)
+        block_banks = [code_banks[x] for x in inds]
+        for bank in {id(bank): bank for bank in block_banks}.values():
+            select = np.array([block_bank is bank for block_bank in block_banks])
+            pows[select] = _spectrum_crosscorrelate(
+                sample_signals[select, None, :],
+                bank.spectrum(fft_size, dtype=dtype),
+                signal_model_size,
+            )
+            energy[select] = bank.energy[:, None]
+        pows_normalized = normalize_crosscorrelation(
             pows,
-            pows_normalized,
-            pows_size,
-            max_pow_per_doppler,
-            max_pow_per_doppler_size,
-            maxpowind,
-            maxpowind_size,
-            samp,
+            normalization_coefficients(sample_signals, signal_model_size)[:, None, :],
+            energy,
         )
-        max_pow_per_delay[:, x] = np.max(pows, axis=0)
-        max_pow_per_delay_norm[:, x] = np.max(pows_normalized, axis=0)
-        best_value_index = np.argmax(max_pow_per_doppler)
-        best_peak[x] = max_pow_per_doppler[best_value_index]
-        best_start[x] = maxpowind[best_value_index]
-        best_doppler[x] = doppler_freq_min + (best_value_index * doppler_freq_step)
+        maxpowind = np.argmax(pows_normalized.real, axis=2)
+        max_pow_per_doppler = np.take_along_axis(pows_normalized, maxpowind[:, :, None], axis=2)[:, :, 0]
+
+        max_pow_per_delay[:, inds] = np.max(pows, axis=1).T
+        max_pow_per_delay_norm[:, inds] = np.max(pows_normalized, axis=1).T
+        best_value_index = np.argmax(max_pow_per_doppler, axis=1)
+        block_range = np.arange(block_size)
+        best_peak[inds] = max_pow_per_doppler[block_range, best_value_index]
+        best_start[inds] = maxpowind[block_range, best_value_index] - signal_model_size
+        best_doppler[inds] = doppler_freq_min + (best_value_index * doppler_freq_step)
+        if peaks is not None:
+            (
+                peaks.power[:, inds],
+                peaks.doppler_index[:, inds],
+                peaks.delay_index[:, inds],
+            ) = find_peaks(pows_normalized.real, peaks.amount, peaks.min_separation)
         if full_gmf_output:
-            pows_output[x] = pows
+            for ind, x in enumerate(inds):
+                pows_output.write(x, pows[ind], best_value_index[ind], maxpowind[ind, best_value_index[ind]])
+
+        if progress_bar:
+            pbar.update(block_size)
 
 
+def xcorr_planar_worker(*args):
+    """
+    Same as `xcorr_worker` but uses the C-library kernel on split real and imaginary arrays.
+    """
+    xcorr_worker(*args, planar=True)
+
+
+def xcorr_fft_worker(*args):
+    """
+    Same as `xcorr_worker` but performs the crosscorrelation for all doppler shifts at once
+    in the frequency domain instead of delay by delay in the C-library.
+    """
+    xcorr_batch_worker(*args, pulse_block=1)
+
+
+XCORR_METHODS = {
+    "direct": xcorr_worker,
+    "planar": xcorr_planar_worker,
+    "fft": xcorr_fft_worker,
+    "batch": xcorr_batch_worker,
+}
+
 
 def xcorr_echo_search(
     raw_data,
@@ -161,40 +623,122 @@ def xcorr_echo_search(
     full_gmf_output=False,
     progress_bar=True,
     threads=None,
+    method="direct",
+    dtype=np.complex128,
+    channel_phasors=False,
+    code_index=None,
+    code_period=None,
+    peaks=None,
+    peak_min_separation=None,
 ):
     """
     # Will take a raw_data object and crosscorrelate the data.
+
+    The `method` selects the crosscorrelation backend, either "direct" which
+    correlates delay by delay in the C-library, "planar" which does the same with a
+    vectorized C-library kernel on split real and imaginary arrays, "fft" which
+    correlates all delays at once using FFT's or "batch" which also correlates
+    blocks of pulses at once using batched FFT's. All produce the same output.
+
+    The crosscorrelation is done in double precision by default, the FFT based
+    methods can also run in single precision by giving `dtype=np.complex64`. The
+    summed signal, all intermediate arrays and the outputs then use single precision.
+
+    If `full_gmf_output` is set the `shape=(doppler, delay, pulse)` crosscorrelation of
+    all pulses is returned as "gmf_output". Instead of `True`, a sink from
+    `metecho.generalized_matched_filter.gmf_output` can be given to only keep the
+    magnitude in reduced precision, a region of interest around each peak or to
+    write the output to disk as the pulses are decoded.
+
+    If `threads` is given the pulses are split into that many contiguous chunks
+    that are processed in parallel threads. The C-library methods release the GIL
+    for the entire crosscorrelation and reduction of a block of pulses, the FFT
+    based methods release it during the FFT's.
+
+    The `signal_model` is a `shape=(codes, code)` table of transmitted codes. Pulse `n`
+    is matched with code `code_index[n]` if given, else with code `n % code_period`
+    where the period defaults to the number of codes in the table. A single code or
+    a cycle of codes, e.g. the 128 EISCAT VHF codes, thus does not have to be repeated
+    for every pulse and the doppler bank of each distinct code is only computed once.
+
+    If `channel_phasors` is set the complex crosscorrelation of each channel at the
+    best delay and doppler shift of each pulse is returned as "channel_phasors",
+    see `channel_phasors`.
+
+    If `peaks` is given the `peaks` strongest local maxima of the normalized power of
+    each pulse are searched for in the same pass, so that several echoes in a pulse
+    can be detected without keeping the full output. A peak is only kept if it is at
+    least `peak_min_separation=(doppler shifts, delays)` away from all stronger peaks,
+    by default the size of the doppler grid and the code length. They are returned as
+    `shape=(peaks, pulse)` arrays "peak_power", "peak_start" and "peak_doppler" sorted
+    by power, missing peaks have zero power and `nan` start and doppler shift.
     """
+    if method not in XCORR_METHODS:
+        raise ValueError(f'Unknown xcorr method "{method}", choose from {list(XCORR_METHODS.keys())}')
+    worker = XCORR_METHODS[method]
+
+    dtype = np.dtype(dtype)
+    if dtype not in (np.complex64, np.complex128):
+        raise ValueError(f'Matched filter dtype must be complex64 or complex128, not "{dtype}"')
+    if method in ("direct", "planar") and dtype != np.complex128:
+        raise ValueError(f'The "{method}" method only supports complex128, use an FFT based method instead')
+
     matched_filter_output = {}
-    sample_signal_all = np.sum(raw_data.data, 0)
+    sample_signal_all = np.sum(raw_data.data, 0, dtype=dtype)
 
-    pows_output = [None]*sample_signal_all.shape[1]
     doppler_freq_size = int(((doppler_freq_max - doppler_freq_min) / doppler_freq_step) + 1)
     if len(signal_model.shape) == 1:
         signal_model.shape = (1, signal_model.size)
     signal_model_size = signal_model.shape[1]
-    best_peak = np.zeros(sample_signal_all.shape[1], dtype=np.complex128)
+    pows_output = get_gmf_output(full_gmf_output)
+    if pows_output is not None:
+        pows_output.allocate(
+            doppler_freq_size,
+            sample_signal_all.shape[0] + signal_model_size,
+            sample_signal_all.shape[1],
+            dtype,
+        )
+    full_gmf_output = pows_output is not None
+    peak_output = None
+    if peaks:
+        if peak_min_separation is None:
+            peak_min_separation = (doppler_freq_size, signal_model_size)
+        peak_output = MatchedFilterPeaks(
+            peaks,
+            peak_min_separation,
+            sample_signal_all.shape[1],
+            dtype=np.finfo(dtype).dtype,
+        )
+    best_peak = np.zeros(sample_signal_all.shape[1], dtype=dtype)
     best_start = np.zeros(sample_signal_all.shape[1])
     best_doppler = np.zeros(sample_signal_all.shape[1])
     max_pow_per_delay = np.zeros(
         [sample_signal_all.shape[0] + signal_model_size,
          sample_signal_all.shape[1]],
-        dtype=np.complex128
+        dtype=dtype
     )
     max_pow_per_delay_norm = np.zeros(
         [sample_signal_all.shape[0] + signal_model_size,
          sample_signal_all.shape[1]],
-        dtype=np.complex128
+        dtype=dtype
     )
 
     samp = np.float64(raw_data.meta["T_samp"])
+    doppler_freq = doppler_freq_min + np.arange(doppler_freq_size) * doppler_freq_step
+    code_index = pulse_code_index(sample_signal_all.shape[1], signal_model.shape[0], code_index, code_period)
+    table_banks = {
+        x: get_code_bank(signal_model[x], doppler_freq, samp)
+        for x in np.unique(code_index)
+    }
+    code_banks = [table_banks[x] for x in code_index]
     logger.debug(f"Starting echo search cycle of size {sample_signal_all.shape[1]} on raw_data {raw_data}.")
 
+    pbar = None
     if threads is None:
         if progress_bar:
             pbar = tqdm(total=sample_signal_all.shape[1], desc="Decoding pulse")
         pulse_inds = range(sample_signal_all.shape[1])
-        xcorr_worker(
+        worker(
             pulse_inds,
             progress_bar,
             pbar,
@@ -204,8 +748,7 @@ def xcorr_echo_search(
             doppler_freq_min,
             doppler_freq_max,
             doppler_freq_step,
-            signal_model,
-            samp,
+            code_banks,
             max_pow_per_delay,
             max_pow_per_delay_norm,
             best_peak,
@@ -213,19 +756,20 @@ def xcorr_echo_search(
             best_doppler,
             full_gmf_output,
             pows_output,
+            peak_output,
         )
         if progress_bar:
             pbar.close()
     else:
         pt_threads = []
         pbars = []
-        for pind in range(threads):
-            pulse_inds = range(pind, sample_signal_all.shape[1], threads)
+        thread_pulse_inds = np.array_split(np.arange(sample_signal_all.shape[1]), threads)
+        for pind, pulse_inds in enumerate(thread_pulse_inds):
             if progress_bar:
                 pbar = tqdm(total=len(pulse_inds), desc="Decoding pulse", position=pind)
                 pbars.append(pbar)
             pt = threading.Thread(
-                target=xcorr_worker, 
+                target=worker,
                 args=(
                     pulse_inds,
                     progress_bar,
@@ -236,8 +780,7 @@ def xcorr_echo_search(
                     doppler_freq_min,
                     doppler_freq_max,
                     doppler_freq_step,
-                    signal_model,
-                    samp,
+                    code_banks,
                     max_pow_per_delay,
                     max_pow_per_delay_norm,
                     best_peak,
@@ -245,6 +788,7 @@ def xcorr_echo_search(
                     best_doppler,
                     full_gmf_output,
                     pows_output,
+                    peak_output,
                 ),
             )
             pt_threads.append(pt)
@@ -263,11 +807,347 @@ def xcorr_echo_search(
     matched_filter_output["best_start"] = best_start
     matched_filter_output["best_doppler"] = best_doppler
     matched_filter_output["pulse_length"] = sample_signal_all.shape[1]
+    if peak_output is not None:
+        (
+            matched_filter_output["peak_power"],
+            matched_filter_output["peak_start"],
+            matched_filter_output["peak_doppler"],
+        ) = peak_output.outputs(doppler_freq_min, doppler_freq_step, signal_model_size)
+    if channel_phasors:
+        matched_filter_output["channel_phasors"] = compute_channel_phasors(
+            raw_data,
+            signal_model,
+            matched_filter_output["best_start"],
+            matched_filter_output["best_doppler"],
+            code_index=code_index,
+        )
     if full_gmf_output:
-        matched_filter_output["gmf_output"] = np.stack(pows_output, axis=2)
+        matched_filter_output["gmf_output"] = pows_output.result()
     return matched_filter_output
 
 
+def coarse_to_fine_echo_search(
+    raw_data,
+    doppler_freq_min,
+    doppler_freq_max,
+    doppler_freq_step,
+    signal_model,
+    coarse_factor=10,
+    min_peak=None,
+    interpolate=True,
+    **kwargs
+):
+    """
+    Hierarchical version of `xcorr_echo_search` that first searches a doppler grid
+    `coarse_factor` times coarser than the requested one and then refines the best
+    doppler shift of each pulse on the fine grid within one coarse step of the coarse peak.
+    If `interpolate` is set, the refined doppler shift is further improved by fitting a
+    parabola to the peak power of the closest fine doppler shifts.
+
+    Only pulses with a coarse best peak of at least `min_peak` are refined, if not
+    given all pulses are refined. All other keyword arguments are passed to the coarse
+    `xcorr_echo_search`.
+
+    The returned output is the coarse output where the "best_peak", "best_start" and
+    "best_doppler" of the refined pulses are replaced, the pulses that were refined
+    are marked in "refined".
+    """
+    coarse_step = doppler_freq_step * coarse_factor
+    channel_phasors = kwargs.pop("channel_phasors", False)
+    code_index = pulse_code_index(
+        raw_data.data.shape[raw_data.axis["pulse"]],
+        np.atleast_2d(signal_model).shape[0],
+        kwargs.get("code_index"),
+        kwargs.get("code_period"),
+    )
+    matched_filter_output = xcorr_echo_search(
+        raw_data,
+        doppler_freq_min,
+        doppler_freq_max,
+        coarse_step,
+        signal_model,
+        **kwargs
+    )
+    if len(signal_model.shape) == 1:
+        signal_model.shape = (1, signal_model.size)
+    signal_model_size = signal_model.shape[1]
+
+    if min_peak is None:
+        refined = np.full(matched_filter_output["best_peak"].shape, True)
+    else:
+        refined = np.abs(matched_filter_output["best_peak"]) >= min_peak
+    matched_filter_output["refined"] = refined
+    pulse_inds = np.argwhere(refined).flatten()
+    if pulse_inds.size == 0:
+        if channel_phasors:
+            matched_filter_output["channel_phasors"] = compute_channel_phasors(
+                raw_data,
+                signal_model,
+                matched_filter_output["best_start"],
+                matched_filter_output["best_doppler"],
+                code_index=code_index,
+            )
+        return matched_filter_output
+
+    sample_signals = np.sum(raw_data.data, 0)[:, pulse_inds].T
+    codes = signal_model[code_index[pulse_inds]]
+    samp = np.float64(raw_data.meta["T_samp"])
+
+    doppler_offsets = np.arange(-coarse_factor, coarse_factor + 1) * doppler_freq_step
+    doppler_freq = matched_filter_output["best_doppler"][pulse_inds, None] + doppler_offsets[None, :]
+    doppler_freq = np.clip(doppler_freq, doppler_freq_min, doppler_freq_max)
+
+    pows = fft_crosscorrelate(sample_signals[:, None, :], doppler_shifted_models(codes, doppler_freq, samp))
+    pows_normalized = np.abs(pows)**2 / (
+        normalization_coefficients(sample_signals, signal_model_size)[:, None, :]
+        * np.sum(np.abs(codes)**2, axis=1)[:, None, None]
+    )
+
+    pulse_range = np.arange(pulse_inds.size)
+    flat_index = np.argmax(pows_normalized.reshape(pulse_inds.size, -1), axis=1)
+    doppler_index, delay_index = np.unravel_index(flat_index, pows_normalized.shape[1:])
+    peak = pows_normalized[pulse_range, doppler_index, delay_index]
+    best_doppler = doppler_freq[pulse_range, doppler_index]
+
+    if interpolate:
+        last_index = doppler_offsets.size - 1
+        inner = np.logical_and(doppler_index > 0, doppler_index < last_index)
+        lower = pows_normalized[pulse_range, np.maximum(doppler_index - 1, 0), delay_index]
+        upper = pows_normalized[pulse_range, np.minimum(doppler_index + 1, last_index), delay_index]
+        curvature = lower - 2 * peak + upper
+        inner = np.logical_and(inner, curvature < 0)
+        offset = np.zeros_like(peak)
+        offset[inner] = 0.5 * (lower[inner] - upper[inner]) / curvature[inner]
+        best_doppler = best_doppler + offset * doppler_freq_step
+        best_doppler = np.clip(best_doppler, doppler_freq_min, doppler_freq_max)
+
+    matched_filter_output["best_peak"][pulse_inds] = peak
+    matched_filter_output["best_start"][pulse_inds] = delay_index - signal_model_size
+    matched_filter_output["best_doppler"][pulse_inds] = best_doppler
+    if channel_phasors:
+        matched_filter_output["channel_phasors"] = compute_channel_phasors(
+            raw_data,
+            signal_model,
+            matched_filter_output["best_start"],
+            matched_filter_output["best_doppler"],
+            code_index=code_index,
+        )
+    return matched_filter_output
+
+
+def pulse_code_index(pulses, codes, code_index=None, code_period=None):
+    """
+    Returns the index into a table of `codes` transmitted codes for each of the `pulses`,
+    either the given `code_index` or the pulse number modulo the `code_period`, which
+    defaults to the number of codes.
+    """
+    if code_index is not None:
+        code_index = np.asarray(code_index, dtype=np.int64)
+        if code_index.shape != (pulses,):
+            raise ValueError(f"code_index must have one entry per pulse, {code_index.shape} != ({pulses},)")
+        if np.any(code_index < 0) or np.any(code_index >= codes):
+            raise ValueError(f"code_index must index the table of {codes} codes")
+        return code_index
+    if code_period is None:
+        code_period = codes
+    if code_period > codes:
+        raise ValueError(f"code_period {code_period} is longer than the table of {codes} codes")
+    return np.arange(pulses, dtype=np.int64) % code_period
+
+
+def compute_channel_phasors(
+    raw_data, signal_model, best_start, best_doppler, code_index=None, code_period=None
+):
+    """
+    Crosscorrelates every channel of the raw data with the signal model of each pulse
+    only at its best start sample and doppler shift, as found by `xcorr_echo_search`
+    on the channel sum. The codes of the pulses are selected from the `signal_model`
+    table as in `xcorr_echo_search`. Returns the `shape=(channels, pulses)` complex phasors, the
+    sum over channels equals the crosscorrelation of the channel sum at the peak.
+    The doppler shifts do not need to be on a grid.
+    """
+    if len(signal_model.shape) == 1:
+        signal_model = signal_model.reshape(1, signal_model.size)
+    data = raw_data.data
+    samples, pulses = data.shape[1], data.shape[2]
+    signal_model_size = signal_model.shape[1]
+    pulse_inds = np.arange(pulses)
+    codes = signal_model[pulse_code_index(pulses, signal_model.shape[0], code_index, code_period)]
+
+    models = doppler_shifted_models(
+        codes, np.asarray(best_doppler)[:, None], np.float64(raw_data.meta["T_samp"]))
+    sample_inds = np.asarray(best_start, dtype=np.int64)[:, None] + np.arange(signal_model_size)[None, :]
+    valid = np.logical_and(sample_inds >= 0, sample_inds < samples)
+    samples_at_peak = data[:, np.clip(sample_inds, 0, samples - 1), pulse_inds[:, None]]
+    samples_at_peak[:, np.logical_not(valid)] = 0
+
+    return np.sum(samples_at_peak * np.conj(models[:, 0, :])[None, :, :], axis=2)
+
+
+def xcorr_echo_search_stream(
+    raw_data_blocks,
+    doppler_freq_min,
+    doppler_freq_max,
+    doppler_freq_step,
+    signal_model,
+    search=xcorr_echo_search,
+    code_index=None,
+    code_period=None,
+    **kwargs
+):
+    """
+    Generator version of `xcorr_echo_search` that consumes an iterable of raw_data
+    objects holding consecutive blocks of pulses, e.g. from
+    `RawDataInterface.pulse_blocks` or a block reading backend, and yields the
+    matched filter output of each block as soon as it is computed. Only one block
+    is kept in memory at a time, the yielded outputs can be joined with
+    `concatenate_matched_filter_outputs`.
+
+    The codes of the `signal_model` table are matched to the pulses as in
+    `xcorr_echo_search` with the pulses counted from the first block, a given
+    `code_index` thus has one entry for every pulse of the stream. The `search` function, e.g.
+    `coarse_to_fine_echo_search`, and all keyword arguments are applied to each block.
+    """
+    kwargs.setdefault("progress_bar", False)
+    signal_model = np.atleast_2d(signal_model)
+    pulse_offset = 0
+    for raw_data in raw_data_blocks:
+        pulses = raw_data.data.shape[raw_data.axis["pulse"]]
+        pulse_inds = np.arange(pulse_offset, pulse_offset + pulses)
+        if code_index is None:
+            block_code_index = pulse_inds % (signal_model.shape[0] if code_period is None else code_period)
+        else:
+            block_code_index = np.asarray(code_index)[pulse_inds]
+        logger.debug(f"Streaming echo search on pulses {pulse_offset} to {pulse_offset + pulses}")
+        yield search(
+            raw_data,
+            doppler_freq_min,
+            doppler_freq_max,
+            doppler_freq_step,
+            signal_model,
+            code_index=block_code_index,
+            **kwargs
+        )
+        pulse_offset += pulses
+
+
+def concatenate_matched_filter_outputs(outputs):
+    """
+    Joins the matched filter outputs of consecutive blocks of pulses along the
+    pulse axis into a single output as returned by `xcorr_echo_search`.
+    """
+    outputs = list(outputs)
+    matched_filter_output = {}
+    for key in outputs[0]:
+        if key == "pulse_length":
+            matched_filter_output[key] = sum(output[key] for output in outputs)
+        else:
+            matched_filter_output[key] = np.concatenate([output[key] for output in outputs], axis=-1)
+    return matched_filter_output
+
+
+class MatchedFilterState:
+    """
+    Incremental matched filter output for pulses that are appended to the raw data,
+    e.g. during near real-time processing. Each `update` only filters the pulses that
+    were not filtered before, on a view of the raw data, and appends the per-pulse
+    outputs to buffers that grow geometrically, so the cost is proportional to the
+    number of new pulses.
+
+    The search parameters and code matching are the same as for `xcorr_echo_search`,
+    with the pulses counted from the first update. All other keyword arguments are
+    passed to `xcorr_echo_search`, the full matched filter output is not kept.
+    """
+
+    def __init__(
+        self,
+        doppler_freq_min,
+        doppler_freq_max,
+        doppler_freq_step,
+        signal_model,
+        code_index=None,
+        code_period=None,
+        **kwargs
+    ):
+        if kwargs.get("full_gmf_output", False):
+            raise ValueError("The full matched filter output is not kept by the incremental matched filter")
+        self.doppler_freq_min = doppler_freq_min
+        self.doppler_freq_max = doppler_freq_max
+        self.doppler_freq_step = doppler_freq_step
+        self.signal_model = np.atleast_2d(signal_model)
+        self.code_index = code_index
+        self.code_period = code_period
+        self.kwargs = kwargs
+        self.kwargs.setdefault("progress_bar", False)
+        self.pulse_length = 0
+        self._buffers = {}
+
+    def __len__(self):
+        return self.pulse_length
+
+    def _reserve(self, key, value, pulses):
+        buffer = self._buffers.get(key)
+        size = self.pulse_length + pulses
+        if buffer is not None and buffer.shape[:-1] != value.shape[:-1]:
+            raise ValueError(f'Cannot append "{key}" of shape {value.shape} to shape {buffer.shape}')
+        if buffer is None or buffer.shape[-1] < size:
+            capacity = max(size, 2 * (buffer.shape[-1] if buffer is not None else 0))
+            new_buffer = np.zeros(value.shape[:-1] + (capacity,), dtype=value.dtype)
+            if buffer is not None:
+                new_buffer[..., :self.pulse_length] = buffer[..., :self.pulse_length]
+            self._buffers[key] = new_buffer
+        return self._buffers[key]
+
+    def append(self, matched_filter_output):
+        """Appends an already computed matched filter output of the next pulses. Arrays
+        that are missing for earlier pulses are zero filled for those pulses.
+        """
+        pulses = matched_filter_output["pulse_length"]
+        for key, value in matched_filter_output.items():
+            if not isinstance(value, np.ndarray) or value.ndim == 0 or value.shape[-1] != pulses:
+                continue
+            buffer = self._reserve(key, value, pulses)
+            buffer[..., self.pulse_length:(self.pulse_length + pulses)] = value
+        self.pulse_length += pulses
+
+    def update(self, raw_data):
+        """Filters the pulses of `raw_data` after the ones that are already filtered
+        and returns the number of new pulses.
+        """
+        pulses = raw_data.data.shape[raw_data.axis["pulse"]]
+        if pulses <= self.pulse_length:
+            return 0
+        pulse_inds = np.arange(self.pulse_length, pulses)
+        if self.code_index is None:
+            code_period = self.signal_model.shape[0] if self.code_period is None else self.code_period
+            code_index = pulse_inds % code_period
+        else:
+            code_index = np.asarray(self.code_index)[pulse_inds]
+
+        logger.debug(f"Incremental echo search on pulses {self.pulse_length} to {pulses}")
+        self.append(xcorr_echo_search(
+            raw_data.pulse_view(self.pulse_length, pulses),
+            self.doppler_freq_min,
+            self.doppler_freq_max,
+            self.doppler_freq_step,
+            self.signal_model,
+            code_index=code_index,
+            **self.kwargs
+        ))
+        return pulse_inds.size
+
+    def output(self):
+        """The matched filter output of all filtered pulses as returned by `xcorr_echo_search`,
+        the arrays are views of the internal buffers.
+        """
+        matched_filter_output = {
+            key: buffer[..., :self.pulse_length]
+            for key, buffer in self._buffers.items()
+        }
+        matched_filter_output["pulse_length"] = self.pulse_length
+        return matched_filter_output
+
+
 def crosscorrelate(x, y, min_delay, max_delay):
     """
     Crosscorrelates two arrays between a max and a min delay. Does not normalize them.
@@ -304,3 +1184,84 @@ def crosscorrelate_single_delay(x, y, delay):
 def set_norm_coefs(abs_signal_sample_sum, start, stop, inarray):
     libmet.set_norm_coefs(abs_signal_sample_sum, start, stop, inarray)
     return inarray
+
+
+def fft_crosscorrelate(x, y, fft_size=None):
+    """
+    Crosscorrelates the signal `x` with every row of `y` over all delays using FFT's.
+    The delays are ordered as in `crosscorrelate` with `min_delay=-len(x)` and
+    `max_delay=y.shape[-1]`. Does not normalize.
+
+    The correlation is done along the last axis, all other axes are broadcast
+    against each other.
+    """
+    signal_size = x.shape[-1]
+    code_size = y.shape[-1]
+    if fft_size is None:
+        fft_size = scipy.fft.next_fast_len(signal_size + code_size - 1)
+
+    return _spectrum_crosscorrelate(x, np.conj(scipy.fft.fft(y, n=fft_size, axis=-1)), code_size)
+
+
+def _spectrum_crosscorrelate(x, y_spectrum, code_size):
+    signal_size = x.shape[-1]
+    fft_size = y_spectrum.shape[-1]
+    circular = scipy.fft.ifft(scipy.fft.fft(x, n=fft_size, axis=-1) * y_spectrum, axis=-1)
+
+    # Delay index j correlates the code starting at sample j - code_size,
+    # the first delay has no overlapping samples
+    result = np.zeros(circular.shape[:-1] + (signal_size + code_size,), dtype=circular.dtype)
+    lags = np.arange(1, signal_size + code_size) - code_size
+    result[..., 1:] = circular[..., lags % fft_size]
+    return result
+
+
+def normalization_coefficients(signal, code_size):
+    """
+    Calculates the signal energy in a `code_size` long window for each delay of the crosscorrelation,
+    used to normalize the matched filter output. Delays where the code only partially
+    overlaps the signal use the energy of the first or last window and windows
+    without energy are set to 1. If the code is longer than the signal all
+    delays use the total signal energy, as in the C implementation.
+
+    The windows are moved along the last axis using a cumulative sum, so the
+    cost is linear in the signal size.
+
+    Parameters
+    ----------
+    signal : numpy.ndarray
+        `shape=(..., samples)` complex signal.
+    code_size : int
+        Length of the code in samples.
+
+    Returns
+    -------
+    numpy.ndarray
+        `shape=(..., samples + code_size)` normalization coefficients, in the
+        real precision of the signal.
+    """
+    signal_size = signal.shape[-1]
+    norm_coefs = np.empty(signal.shape[:-1] + (signal_size + code_size,), dtype=np.finfo(signal.dtype).dtype)
+    if code_size > signal_size:
+        norm_coefs[...] = np.sum(np.abs(signal)**2, axis=-1, keepdims=True)
+        norm_coefs[norm_coefs < np.finfo(np.float32).eps] = 1
+        return norm_coefs
+
+    cumulative_energy = np.zeros(signal.shape[:-1] + (signal_size + 1,), dtype=np.float64)
+    np.cumsum(np.abs(signal)**2, axis=-1, out=cumulative_energy[..., 1:])
+    energy = cumulative_energy[..., code_size:] - cumulative_energy[..., :-code_size]
+
+    norm_coefs[..., :code_size] = energy[..., :1]
+    norm_coefs[..., code_size:signal_size] = energy[..., :-1]
+    norm_coefs[..., signal_size:] = energy[..., -1:]
+    norm_coefs[norm_coefs < np.finfo(np.float32).eps] = 1
+    return norm_coefs
+
+
+def normalize_crosscorrelation(pows, norm_coefs, signal_model_energy):
+    """
+    Normalizes the crosscorrelation with the local signal energy and the signal model energy
+    and returns the resulting power as a complex array.
+    """
+    pows_normalized = np.abs(pows)**2 / (norm_coefs * signal_model_energy)
+    return pows_normalized.astype(pows.dtype)
@@ -13,27 +13,33 @@ class NoiseObject(ABC):
         pass
 
 
+def gaussian_noise_statistics(mean, std_dev, samples, confidence_probability=0.000001):
+    """
+    Returns the noise statistics dictionary of `CalculateGaussianNoise` for a mean and standard
+    deviation estimated from `samples` real valued samples, including the confidence interval
+    of the standard deviation.
+    """
+    sig_est_freedom = samples - 1
+    confidence_interval = [np.sqrt(
+        sig_est_freedom * np.square(std_dev) / chi2.ppf(
+            confidence_probability / 2,
+            sig_est_freedom)
+    ), np.sqrt(
+        sig_est_freedom * np.square(std_dev) / chi2.ppf(
+            1 - (confidence_probability / 2),
+            sig_est_freedom)
+    )]
+    return {'mean': mean, 'std_dev': std_dev, 'confidence_interval': confidence_interval}
+
+
 class CalculateGaussianNoise(NoiseObject):
     """
     Calculates the gaussian noise for a filtered_data object
     """
 
     def calc(self, filtered_data, axis):
-        confidence_probability = 0.000001
-        echo_location = []
-        channel_size = filtered_data.shape[axis]
         s_noise_all = np.array(np.concatenate(
             (filtered_data.real, filtered_data.imag), axis=None), dtype=np.float64)
-        sig_est_freedom = len(s_noise_all) - 1
         mean = np.mean(s_noise_all)
         std_dev = np.std(s_noise_all)
-        confidence_interval = [np.sqrt(
-            sig_est_freedom * np.square(std_dev) / chi2.ppf(
-                confidence_probability / 2,
-                sig_est_freedom)
-        ), np.sqrt(
-            sig_est_freedom * np.square(std_dev) / chi2.ppf(
-                1 - (confidence_probability / 2),
-                sig_est_freedom)
-        )]
-        return {'mean': mean, 'std_dev': std_dev, 'confidence_interval': confidence_interval}
+        return gaussian_noise_statistics(mean, std_dev, len(s_noise_all))
@@ -1,4 +1,4 @@
 from .raw_data import rti
 from .general import basic_matplotlib_kw
-from .generalized_matched_filter import gmf
+from .generalized_matched_filter import gmf, gmf_pulse
 from .radiants import hammer, hammer_density, hammer_iau_streams
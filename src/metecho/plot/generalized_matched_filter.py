@@ -7,6 +7,7 @@ import sys
 import copy
 
 from .general import basic_matplotlib_kw
+from ..generalized_matched_filter.gmf_output import pulse_output
 
 logger = logging.getLogger(__name__)
 
@@ -66,3 +67,51 @@ def gmf(axes,
     """
 
     return ax, []
+
+
+@basic_matplotlib_kw(subplot_shape=None)
+def gmf_pulse(ax,
+              filter_output,
+              pulse,
+              doppler_freq=None,
+              axis_font_size=15,
+              title_font_size=11,
+              tick_font_size=11,
+              title='',
+              log=False,
+              colorbar=True,
+              pcolormesh_kw={},
+              ):
+    """
+    Plots the doppler-delay GMF output of a single pulse, works with all the "gmf_output"
+    types, i.e. the full cube in memory or on disk and the region of interest around the peak.
+    If the `doppler_freq` grid is given the doppler axis is in Hz instead of index.
+    """
+    doppler_inds, delay_inds, output = pulse_output(filter_output["gmf_output"], pulse)
+    output = np.abs(output)
+    output = np.log10(output) if log else output
+
+    if doppler_freq is None:
+        doppler_axis = doppler_inds
+        ax.set_ylabel('Doppler index [1]', fontsize=axis_font_size)
+    else:
+        doppler_axis = doppler_freq[np.clip(doppler_inds, 0, len(doppler_freq) - 1)]
+        ax.set_ylabel('Doppler [Hz]', fontsize=axis_font_size)
+    X, Y = np.meshgrid(delay_inds, doppler_axis)
+    ax.set_xlabel('Delay [1]', fontsize=axis_font_size)
+
+    pmesh = ax.pcolormesh(X, Y, output, **pcolormesh_kw)
+
+    if title == '':
+        title = f'GMF output pulse {pulse}'
+
+    ax.set_title(title, fontsize=title_font_size)
+    if colorbar:
+        cbar = plt.colorbar(pmesh, ax=ax)
+        cbar.set_label('Power [1]', size=axis_font_size)
+        cbar.ax.tick_params(labelsize=tick_font_size)
+
+    for ax_label in ['x', 'y']:
+        ax.tick_params(axis=ax_label, labelsize=tick_font_size)
+
+    return ax, [pmesh]
@@ -1,2 +1,3 @@
 from . import profiling
+from . import rolling
 from .mpi_decorators import MPI_target_arg
\ No newline at end of file
@@ -0,0 +1,116 @@
+'''
+Rolling window statistics
+^^^^^^^^^^^^^^^^^^^^^^^^^
+
+Moving mean and variance over a fixed number of samples computed with
+cumulative sums in O(N) time, independent of the window length, both for
+complete arrays and incrementally as new samples arrive.
+
+'''
+import numpy as np
+
+
+def rolling_mean_var(data, window, ddof=0):
+    """
+    Mean and variance of every complete window of `window` consecutive samples,
+    equivalent to the mean and variance over the last axis of
+    `numpy.lib.stride_tricks.sliding_window_view(data, window)`.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        `shape=(N,)` samples.
+    window : int
+        Number of samples in each window.
+    ddof : int
+        Delta degrees of freedom of the variance, as in `numpy.var`.
+
+    Returns
+    -------
+    mean : numpy.ndarray
+        `shape=(N - window + 1,)` mean of each window.
+    var : numpy.ndarray
+        `shape=(N - window + 1,)` variance of each window.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if window < 1:
+        raise ValueError(f"Window must be at least one sample, not {window}")
+    if data.size < window:
+        return np.empty((0,)), np.empty((0,))
+
+    # Removing an offset first keeps the cumulative sums small so that the
+    # difference of the sums does not lose precision, using a sample as the
+    # offset keeps integer valued data, e.g. indices, exact
+    offset = data[0]
+    centered = data - offset
+    cumsum = np.concatenate([[0.0], np.cumsum(centered)])
+    cumsum_sq = np.concatenate([[0.0], np.cumsum(centered**2)])
+
+    window_sum = cumsum[window:] - cumsum[:-window]
+    window_sum_sq = cumsum_sq[window:] - cumsum_sq[:-window]
+    mean = window_sum / window
+    var = (window_sum_sq - window_sum * mean) / (window - ddof)
+    return mean + offset, np.maximum(var, 0)
+
+
+def rolling_std(data, window, ddof=0):
+    """Standard deviation of every complete window, see `rolling_mean_var`."""
+    return np.sqrt(rolling_mean_var(data, window, ddof=ddof)[1])
+
+
+def centered_rolling_std(data, window, ddof=0):
+    """
+    Standard deviation in a window centered on each sample, the windows at
+    the ends are clamped so that the output has the same length as `data`.
+    If `data` is shorter than the window its standard deviation is returned for all samples.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if data.size < window:
+        return np.full(data.shape, np.std(data, ddof=ddof) if data.size > ddof else np.nan)
+    std = rolling_std(data, window, ddof=ddof)
+    return np.pad(std, (window // 2, window - 1 - window // 2), mode="edge")
+
+
+class RollingStatistics:
+    """
+    Incrementally updated rolling mean and variance over the last `window` samples.
+
+    Each call to `update` only costs time proportional to the number of new
+    samples plus the window length, so a stream of N samples is processed in
+    O(N) time, and gives the same values as `rolling_mean_var` on the whole stream.
+
+    Parameters
+    ----------
+    window : int
+        Number of samples in each window.
+    ddof : int
+        Delta degrees of freedom of the variance, as in `numpy.var`.
+    """
+
+    def __init__(self, window, ddof=0):
+        if window < 1:
+            raise ValueError(f"Window must be at least one sample, not {window}")
+        self.window = window
+        self.ddof = ddof
+        self.samples = 0
+        self._tail = np.empty((0,), dtype=np.float64)
+
+    def __repr__(self):
+        return f"<RollingStatistics: window={self.window}, {self.samples} samples>"
+
+    def update(self, values):
+        """
+        Adds new samples and returns the mean and variance of every window that
+        was completed by them, i.e. of the windows ending at each new sample once
+        at least `window` samples have been added.
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        self.samples += values.size
+        data = np.concatenate([self._tail, values])
+        self._tail = data[max(0, data.size - (self.window - 1)):]
+        return rolling_mean_var(data, self.window, ddof=self.ddof)
+
+    def reset(self):
+        """Forgets all samples."""
+        self.samples = 0
+        self._tail = np.empty((0,), dtype=np.float64)
@@ -0,0 +1,299 @@
+import io
+import pathlib
+from collections.abc import Mapping
+
+import h5py
+import numpy as np
+import pytest
+
+from metecho import data
+from metecho.data import mu
+
+
+def mui_header(block_amount, start="01-JAN-2020 00:00:00.00", end="00:00:01.50", experiment="mw26x6"):
+    """Raw header of a synthetic MUI record block."""
+    header = np.zeros((), dtype=mu.MU_HEADER_DTYPE)
+    header["mu_head_1_to_24"] = [1, 2, block_amount, 4, 5, 6]
+    header["program_name"] = b"MW26X6  "
+    header["file_load_time"] = b"01-JAN-2020 00:00:00.00 "
+    header["program_number"] = 7
+    header["record_start_time"] = start.ljust(24).encode()
+    header["record_end_time"] = end.ljust(12).encode()
+    header["observation_param_name"] = experiment.ljust(16).encode()
+    header["tx_frequency"] = [46500000, 0, 0, 0, 0]
+    header["above_sea_level"] = 372.5
+    header["user_comment"] = b"synthetic"
+    return header.tobytes()
+
+
+def mui_records(block_amount, rng):
+    """Records of a synthetic MUI block, record `x` holds channel `(x // 85) % 25` and height `x % 85`."""
+    records = np.zeros((block_amount,), dtype=mu.MU_RECORD_DTYPE)
+    inds = np.arange(block_amount)
+    records["beam"] = inds % 5
+    records["channel"] = (inds // mu.MU_HEIGHTS) % mu.MU_CHANNELS
+    records["height"] = inds % mu.MU_HEIGHTS
+    records["real"] = rng.normal(size=(block_amount, 512))
+    records["imag"] = rng.normal(size=(block_amount, 512))
+    return records
+
+
+def write_mui(path, block_amounts, seed=0):
+    """Writes a synthetic MUI file with one block per minute and returns the records of each block."""
+    rng = np.random.default_rng(seed)
+    blocks = []
+    with open(path, "wb") as file:
+        for ind, block_amount in enumerate(block_amounts):
+            start, end = f"01-JAN-2020 00:{ind:02d}:00.00", f"00:{ind:02d}:01.50"
+            records = mui_records(block_amount, rng)
+            file.write(mui_header(block_amount, start=start, end=end))
+            file.write(records.tobytes())
+            blocks.append(records)
+    return blocks
+
+
+def expected_cube(records):
+    """Voltage cube of a block, later records overwrite earlier ones with the same channel and height."""
+    cube = np.zeros((mu.MU_CHANNELS, mu.MU_HEIGHTS, 512), dtype=np.complex128)
+    for ind, record in enumerate(records):
+        channel, height = (ind // mu.MU_HEIGHTS) % mu.MU_CHANNELS, ind % mu.MU_HEIGHTS
+        cube[channel, height] = record["real"] + 1j * record["imag"]
+    return cube
+
+
+@pytest.fixture
+def mui_file(tmp_path):
+    """A full block followed by a block with more records than channels and heights."""
+    path = tmp_path / "MUI.200101.000000"
+    blocks = write_mui(path, [mu.MU_CHANNELS * mu.MU_HEIGHTS, 2200])
+    return path, blocks
+
+
+def test_read_data_block(mui_file):
+    path, blocks = mui_file
+    with open(path, "rb") as file:
+        for records in blocks:
+            file.seek(mu.MU_HEADER_DTYPE.itemsize, 1)
+            beam_channel_height, cube = mu._read_data_block(file, records.size)
+            assert cube.dtype == np.complex128
+            assert np.array_equal(cube, expected_cube(records))
+            for name in mu.MU_BEAM_CHANNEL_HEIGHT_DTYPE.names:
+                assert np.array_equal(beam_channel_height[name], records[name])
+
+        file.seek(-10 * mu.MU_RECORD_DTYPE.itemsize, 2)
+        with pytest.raises(EOFError):
+            mu._read_data_block(file, blocks[-1].size)
+
+
+def test_convert_MUI_to_h5(mui_file, tmp_path):
+    path, blocks = mui_file
+    files = mu.convert_MUI_to_h5([path], tmp_path / "converted")[0]
+    assert [pathlib.Path(file).name for file in files] == [
+        "2020-01-01T00.00.00.000000000.h5",
+        "2020-01-01T00.01.00.000000000.h5",
+    ]
+    for file, records in zip(files, blocks):
+        with h5py.File(file, "r") as h5file:
+            assert np.array_equal(h5file["data"][()], expected_cube(records))
+            for name in mu.MU_BEAM_CHANNEL_HEIGHT_DTYPE.names:
+                assert np.array_equal(h5file["beams"][name], records[name])
+            assert h5file.attrs["filename"] == path.name
+            assert h5file.attrs["observation_param_name"].strip() == "mw26x6"
+
+        raw = data.RawDataInterface(file, backend="mu_h5")
+        assert np.array_equal(raw.data, expected_cube(records))
+    assert raw.meta["date"] == np.datetime64("2020-01-01T00:01:00", "ns")
+
+
+def test_mui_mmap_backend(mui_file, tmp_path):
+    path, blocks = mui_file
+    assert data.check_if_raw_data(path) == "mui_mmap"
+    raw = data.RawDataInterface(path, backend="mui_mmap")
+    assert raw.meta["date"] == np.datetime64("2020-01-01T00:00:00", "ns")
+    assert raw.axis["pulse"] == 2
+
+    cube = raw.data
+    full = np.concatenate([expected_cube(records) for records in blocks], axis=2)
+    assert cube.shape == full.shape == (mu.MU_CHANNELS, mu.MU_HEIGHTS, 1024)
+    assert np.array_equal(np.asarray(cube), full)
+
+    converted = mu.convert_MUI_to_h5([path], tmp_path / "converted")[0]
+    h5_data = []
+    for file in converted:
+        with h5py.File(file, "r") as h5file:
+            h5_data.append(h5file["data"][()])
+    assert np.array_equal(np.asarray(cube), np.concatenate(h5_data, axis=2))
+
+    rng = np.random.default_rng(3)
+    keys = [
+        0,
+        -1,
+        (slice(None), 3),
+        (Ellipsis, 700),
+        (2, Ellipsis, slice(500, 530)),
+        (slice(2, 9, 3), slice(None, None, -2), slice(500, 530)),
+        (slice(None), slice(None), slice(1000, 490, -7)),
+        (np.array([3, 1, 3]), 5, slice(None)),
+        (-1, -1, -1),
+        (slice(None), np.arange(mu.MU_HEIGHTS) % 7 == 0, 0),
+        (slice(None), rng.integers(0, mu.MU_HEIGHTS, (4, 3)), rng.integers(0, 1024, (4, 1))),
+        (slice(5, 5),),
+        (None, 0),
+    ]
+    for key in keys:
+        assert np.array_equal(cube[key], full[key]), key
+    with pytest.raises(IndexError):
+        cube[0, 0, 1024]
+
+    view = raw.pulse_view(500, 530)
+    assert np.array_equal(view.data, full[:, :, 500:530])
+    assert np.array_equal(np.sum(cube, 0), np.sum(full, 0))
+
+    raw = data.RawDataInterface(path, backend="mui_mmap", dtype=np.complex64)
+    assert raw.data[0].dtype == np.complex64
+    assert np.array_equal(raw.data[0], full[0])
+
+
+def test_mui_mmap_truncated_file(mui_file, tmp_path):
+    path, blocks = mui_file
+    truncated = tmp_path / "MUI.200101.000001"
+    block_bytes = mu.MU_HEADER_DTYPE.itemsize + blocks[0].nbytes
+    truncated.write_bytes(path.read_bytes()[:(block_bytes + mu.MU_HEADER_DTYPE.itemsize + 100)])
+
+    cube = mu.MUIMemmapData(truncated)
+    assert cube.shape == (mu.MU_CHANNELS, mu.MU_HEIGHTS, 512)
+    assert len(cube.headers) == 1
+    assert np.array_equal(cube[...], expected_cube(blocks[0]))
+
+
+def test_mui_header():
+    buffer = mui_header(2125, start="31-DEC-2019 23:59:59.00", end="00:00:00.50")
+    header_data = mu._get_header_data(io.BytesIO(buffer))
+    assert isinstance(header_data, Mapping)
+    assert list(header_data.keys()) == list(mu.MU_HEADER_KEYS)
+    assert "reserved" not in header_data
+
+    assert header_data["mu_head_1_to_24"].dtype == np.dtype(">i4")
+    assert np.array_equal(header_data["mu_head_1_to_24"], [1, 2, 2125, 4, 5, 6])
+    assert np.array_equal(header_data["program_number"], [7])
+    assert np.array_equal(header_data["tx_frequency"], [46500000, 0, 0, 0, 0])
+    assert header_data["above_sea_level"].dtype == np.float32
+    assert header_data["above_sea_level"].shape == (1,)
+    assert header_data["above_sea_level"][0] == np.float32(372.5)
+
+    assert header_data["program_name"] == "MW26X6  "
+    assert header_data["observation_param_name"] == "mw26x6          "
+    assert header_data["user_comment"] == "synthetic"
+    assert header_data["hp_file_name"] == ""
+
+    assert header_data["file_load_time"] == np.datetime64("2020-01-01T00:00:00", "ns")
+    assert header_data["record_start_time"] == np.datetime64("2019-12-31T23:59:59", "ns")
+    # The end time only holds the time of day, the date rolled over during the record
+    assert header_data["record_end_time"] == np.datetime64("2020-01-01T00:00:00.5", "ns")
+
+    with pytest.raises(EOFError):
+        mu._get_header_data(io.BytesIO(buffer[:-1]))
+
+
+def test_index_MUI_files(tmp_path):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    blocks = write_mui(archive / "MUI.200101.000000", [2125, 2125])
+    raw_bytes = (archive / "MUI.200101.000000").read_bytes()
+    block_bytes = mu.MU_HEADER_DTYPE.itemsize + blocks[0].nbytes
+    (archive / "MUI.200101.000001").write_bytes(raw_bytes[:(block_bytes + 100)])
+    (archive / "MUI.200101.000002").write_bytes(raw_bytes[:(block_bytes + mu.MU_HEADER_DTYPE.itemsize + 100)])
+    (archive / "not_a_MUI_file.txt").write_text("skipped")
+
+    index = mu.index_MUI_files(archive)
+    assert [entry["path"].name for entry in index] == [
+        "MUI.200101.000000",
+        "MUI.200101.000001",
+        "MUI.200101.000002",
+    ]
+    complete, truncated_header, truncated_block = index
+
+    def counts(entry):
+        return entry["blocks"], entry["records"], entry["truncated"]
+
+    assert complete["program_name"] == "MW26X6  "
+    assert complete["observation_param_name"].strip() == "mw26x6"
+    assert complete["start_time"] == np.datetime64("2020-01-01T00:00:00", "ns")
+    assert complete["end_time"] == np.datetime64("2020-01-01T00:01:01.5", "ns")
+    assert counts(complete) == (2, 4250, False)
+
+    assert counts(truncated_header) == (1, 2125, True)
+    assert truncated_header["end_time"] == np.datetime64("2020-01-01T00:00:01.5", "ns")
+    assert counts(truncated_block) == (2, 4250, True)
+
+    assert mu.index_MUI_files(archive / "MUI.200101.000000") == index[:1]
+
+
+def test_convert_MUI_file_parallel(tmp_path):
+    path = tmp_path / "MUI.200101.000000"
+    blocks = write_mui(path, [2125, 2125, 2200])
+
+    serial = mu.convert_MUI_file_to_h5(path, tmp_path / "serial")
+    parallel = mu.convert_MUI_file_to_h5(path, tmp_path / "parallel", processes=2)
+    assert len(serial) == len(blocks)
+    assert [pathlib.Path(file).relative_to(tmp_path / "serial") for file in serial] == [
+        pathlib.Path(file).relative_to(tmp_path / "parallel") for file in parallel
+    ]
+    for serial_file, parallel_file, records in zip(serial, parallel, blocks):
+        with h5py.File(serial_file, "r") as serial_h5, h5py.File(parallel_file, "r") as parallel_h5:
+            assert np.array_equal(serial_h5["data"][()], expected_cube(records))
+            assert np.array_equal(serial_h5["data"][()], parallel_h5["data"][()])
+            assert np.array_equal(serial_h5["beams"][()], parallel_h5["beams"][()])
+            assert set(serial_h5.attrs) == set(parallel_h5.attrs)
+            for key in serial_h5.attrs:
+                assert np.array_equal(serial_h5.attrs[key], parallel_h5.attrs[key])
+
+    # Only the blocks without an existing output are converted
+    assert mu.convert_MUI_file_to_h5(path, tmp_path / "serial", skip_existing=True) == []
+    pathlib.Path(serial[1]).unlink()
+    assert mu.convert_MUI_file_to_h5(path, tmp_path / "serial", skip_existing=True) == [serial[1]]
+
+    # Blocks of another experiment are not converted
+    assert mu.convert_MUI_file_to_h5(path, tmp_path / "other", experiment_name="other") == []
+
+
+def test_load_MU_h5_pulse_range(mui_file, tmp_path):
+    path, blocks = mui_file
+    for options in [{}, {"compression": "lzf"}]:
+        files = mu.convert_MUI_to_h5([path], tmp_path / str(len(options)), **options)[0]
+        with h5py.File(files[0], "r") as h5file:
+            assert h5file["data"].dtype == np.complex64
+            assert h5file["data"].chunks == (mu.MU_CHANNELS, mu.MU_HEIGHTS, mu.MU_H5_CHUNK_PULSES)
+            assert h5file["data"].compression == options.get("compression", None)
+
+        full = data.RawDataInterface(files[0], backend="mu_h5")
+        assert full.data.dtype == np.complex128
+        assert np.array_equal(full.data, expected_cube(blocks[0]))
+
+        pulses = slice(100, 164)
+        part = data.RawDataInterface(files[0], backend="mu_h5", pulses=pulses, dtype=np.complex64)
+        assert part.data.dtype == np.complex64
+        assert np.array_equal(part.data, full.data[:, :, pulses])
+        shift = np.timedelta64(int(round(pulses.start * full.meta["T_ipp"] * 1e9)), "ns")
+        assert part.meta["date"] - full.meta["date"] == shift
+
+
+def test_load_old_MU_h5_file(tmp_path):
+    rng = np.random.default_rng(5)
+    shape = (mu.MU_CHANNELS, mu.MU_HEIGHTS, 512)
+    voltages = rng.normal(size=shape) + 1j * rng.normal(size=shape)
+    path = tmp_path / "2020-01-01T00.00.00.000000000.h5"
+    with h5py.File(path, "w") as h5file:
+        h5file.attrs["filename"] = "MUI.200101.000000"
+        h5file.attrs["tx_frequency"] = np.array([46500000, 0, 0, 0, 0], dtype=">u4")
+        h5file.attrs["date"] = "2020-01-01T00:00:00.000000000"
+        h5file.create_dataset("data", data=voltages)
+
+    raw = data.RawDataInterface(path)
+    assert raw.backend == "mu_h5"
+    assert raw.data.dtype == np.complex128
+    assert np.array_equal(raw.data, voltages)
+    assert raw.meta["date"] == np.datetime64("2020-01-01T00:00:00", "ns")
+
+    part = data.RawDataInterface(path, backend="mu_h5", pulses=slice(10, 20))
+    assert np.array_equal(part.data, voltages[:, :, 10:20])
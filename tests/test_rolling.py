@@ -0,0 +1,26 @@
+import numpy as np
+from metecho.tools import rolling
+
+
+def test_centered_rolling_std():
+    data = np.arange(30, dtype=np.float64)
+    std = rolling.centered_rolling_std(data, 10)
+    assert std.shape == data.shape
+    assert np.allclose(std, np.std(np.arange(10)))
+    assert np.allclose(rolling.centered_rolling_std(data[:5], 10), np.std(data[:5]))
+
+
+def test_rolling_statistics():
+    rng = np.random.default_rng(42)
+    data = np.concatenate([np.full(40, -3e4), rng.integers(-300, 50, size=300) * 100.0])
+    windows = np.lib.stride_tricks.sliding_window_view(data, 10)
+    mean, var = rolling.rolling_mean_var(data, 10)
+    assert np.allclose(mean, np.mean(windows, axis=1))
+    assert np.allclose(var, np.var(windows, axis=1))
+    assert np.all(var[:31] == 0)
+
+    stats = rolling.RollingStatistics(10)
+    chunks = [stats.update(chunk) for chunk in np.array_split(data, 23)]
+    assert stats.samples == data.size
+    assert np.allclose(np.concatenate([x[0] for x in chunks]), mean)
+    assert np.allclose(np.concatenate([x[1] for x in chunks]), var)
@@ -1,8 +1,11 @@
 import numpy as np
+import pytest
 from math import isclose
+from metecho.cli import event_search as cli_event_search
 from metecho.data import raw_data
-from metecho.events import event_search, conf, search_objects
-from metecho.generalized_matched_filter import signal_model
+from metecho.events import event_search, event_stream, conf, search_objects
+from metecho.generalized_matched_filter import xcorr
+from metecho.signal_model import phase_coding as signal_model
 from metecho.noise import calc_noise
 from unittest.mock import patch, mock_open, MagicMock, Mock
 
@@ -100,6 +103,153 @@ def test_partial_data_input():
     assert np.all(result[0])
 
 
+def test_evaluate_criteria():
+    configuration = conf.generate_event_search_config()
+
+    class TestSearch(search_objects.SearchObject):
+        required = False
+        required_trails = False
+
+        def search(self, matched_filter_output, raw_data, config):
+            return self.arguments["criteria"]
+
+    class RequiredTestSearch(TestSearch):
+        required = True
+
+    pulses = 700
+    test_output = {"best_peak": np.zeros(pulses)}
+    every_other = np.arange(pulses) % 2 == 0
+    searchers = [
+        TestSearch(criteria=every_other),
+        TestSearch(criteria=np.ones(pulses, dtype=bool)),
+        RequiredTestSearch(criteria=np.arange(pulses) < 100),
+    ]
+    criteria_met, required_met, required_trails_met = event_search.evaluate_criteria(
+        searchers, test_output, None, configuration)
+    assert criteria_met.shape == (pulses,)
+    assert np.array_equal(criteria_met, 1 + every_other + (np.arange(pulses) < 100))
+    assert np.array_equal(required_met, np.arange(pulses) < 100)
+    assert required_trails_met is None
+
+    searchers.append(TestSearch(criteria=np.ones(512, dtype=bool)))
+    with pytest.raises(ValueError):
+        event_search.evaluate_criteria(searchers, test_output, None, configuration)
+
+
+def simulated_meteor_files():
+    """Two files of noise with a meteor head echo at pulses 400-459 that spans both files."""
+    rng = np.random.default_rng(1)
+    pulses, samples, channels, samp = 1000, 85, 2, 6e-6
+    code = signal_model.barker_code_13(1, 2)[0]
+    shape = (channels, samples, pulses)
+    data = (rng.normal(size=shape) + 1j * rng.normal(size=shape)) * 0.3
+    for pulse in range(400, 460):
+        start = 20 + (pulse - 400) // 10
+        doppler = -20e3 + 10 * (pulse - 400)
+        data[:, start:(start + len(code)), pulse] += 2 * code * np.exp(
+            1j * 2 * np.pi * doppler * samp * np.arange(1, len(code) + 1))
+
+    files = []
+    for path, pulse_slice in [("file_1", slice(0, 430)), ("file_2", slice(430, None))]:
+        test_data = raw_data.RawDataInterface(None, load_on_init=False)
+        test_data.data = data[:, :, pulse_slice]
+        test_data.axis.update({'channel': 0, 'sample': 1, 'pulse': 2})
+        test_data.meta.update({"T_samp": samp, "T_ipp": 1e-3, "date": np.datetime64("2020-01-01T00:00:00")})
+        test_data.path = path
+        files.append(test_data)
+    return files
+
+
+def test_streaming_event_search():
+    files = simulated_meteor_files()
+    configuration = conf.generate_event_search_config()
+    signal = signal_model.barker_code_13(1, 2)
+    detector = event_stream.StreamingEventSearch(configuration)
+    events = []
+    emitted_at = None
+    for test_data in files:
+        for block in test_data.pulse_blocks(25):
+            output = xcorr.xcorr_echo_search(block, -30e3, 5e3, 1000, signal, progress_bar=False)
+            new_events = detector.update(output, block)
+            if new_events and emitted_at is None:
+                emitted_at = detector.pulses
+            events += new_events
+    events += detector.flush()
+
+    assert len(events) == 1
+    ev = events[0]
+    assert ev.files == ["file_1", "file_2"]
+    assert ev.start_IPP == 400 - configuration.getint("General", "IPP_extend")
+    assert ev.end_IPP == 459 + configuration.getint("General", "IPP_extend")
+    assert ev.date == np.datetime64("2020-01-01T00:00:00") + np.timedelta64(ev.start_IPP, 'ms')
+    latency = (configuration.getint("General", "min_ipp_separation_split")
+               + configuration.getint("General", "MOVE_STD_WINDOW"))
+    assert emitted_at is not None and emitted_at <= 460 + latency + 25
+    assert isclose(ev.noise["std_dev"], 0.3, rel_tol=0.05)
+
+
+def test_streaming_event_search_precomputed_inputs():
+    configuration = conf.generate_event_search_config()
+    signal = signal_model.barker_code_13(1, 2)
+    from_raw_data = event_stream.StreamingEventSearch(configuration)
+    precomputed = event_stream.StreamingEventSearch(configuration)
+    events = {"raw_data": [], "precomputed": []}
+    for test_data in simulated_meteor_files():
+        for block in test_data.pulse_blocks(100):
+            output = xcorr.xcorr_echo_search(block, -30e3, 5e3, 1000, signal, progress_bar=False)
+            events["raw_data"] += from_raw_data.update(output, block)
+            events["precomputed"] += precomputed.update(
+                output,
+                tot_pow=event_stream.total_power(block),
+                path=block.path,
+                meta=block.meta,
+                noise=event_stream.noise_sums(block, output["best_peak"], configuration),
+            )
+    events["raw_data"] += from_raw_data.flush()
+    events["precomputed"] += precomputed.flush()
+
+    assert len(events["raw_data"]) == 1
+    assert len(events["precomputed"]) == 1
+    for ev, ev_precomputed in zip(events["raw_data"], events["precomputed"]):
+        assert ev.files == ev_precomputed.files
+        assert ev.date == ev_precomputed.date
+        assert (ev.start_IPP, ev.end_IPP) == (ev_precomputed.start_IPP, ev_precomputed.end_IPP)
+        assert ev.noise == ev_precomputed.noise
+    assert from_raw_data.noise() == precomputed.noise()
+
+
+def test_overlap_segments():
+    sizes = [3, 4, 5]
+    offsets = np.cumsum([0] + sizes)
+    segments = []
+    for ind, size in enumerate(sizes):
+        segment = {key: np.arange(offsets[ind], offsets[ind + 1]) for key in event_stream.PULSE_KEYS}
+        segment.update({"path": f"file_{ind}", "meta": {}, "noise": np.ones((3,))})
+        segments.append(segment)
+
+    def pulses(overlap):
+        return np.concatenate([segment["best_peak"] for segment in overlap])
+
+    head = cli_event_search.overlap_segments(segments, 5)
+    assert [segment["path"] for segment in head] == ["file_0", "file_1"]
+    assert np.array_equal(pulses(head), np.arange(5))
+    for key in event_stream.PULSE_KEYS:
+        assert np.array_equal(np.concatenate([segment[key] for segment in head]), np.arange(5))
+    assert all(segment["noise"] is None for segment in head)
+
+    tail = cli_event_search.overlap_segments(segments, 7, from_end=True)
+    assert [segment["path"] for segment in tail] == ["file_1", "file_2"]
+    assert np.array_equal(pulses(tail), np.arange(5, 12))
+
+    # Overlaps longer than all segments together select every pulse
+    for from_end in [False, True]:
+        overlap = cli_event_search.overlap_segments(segments, 100, from_end=from_end)
+        assert [segment["path"] for segment in overlap] == ["file_0", "file_1", "file_2"]
+        assert np.array_equal(pulses(overlap), np.arange(12))
+    assert cli_event_search.overlap_segments(segments, 0) == []
+    assert segments[0]["noise"] is not None
+
+
 """
 Kan bara smoke-testas innan refakturering
 def test_event_search_functionality():
@@ -1,6 +1,32 @@
 import numpy as np
-from metecho.generalized_matched_filter import xcorr
+import pytest
+from metecho.generalized_matched_filter import xcorr, code_bank, gmf_output
+from metecho.generalized_matched_filter import MatchedFilterCache
 from metecho.data import raw_data
+from metecho.signal_model import phase_coding
+
+
+def simulated_raw_data(pulses=8, samples=85, channels=2, seed=3141, doppler=None):
+    """Barker-13 echoes moving in range and doppler on top of complex gaussian noise."""
+    rng = np.random.default_rng(seed)
+    code = phase_coding.barker_code_13(1, 2)[0]
+    samp = 6e-6
+    shape = (channels, samples, pulses)
+    data = (rng.normal(size=shape) + 1j * rng.normal(size=shape)) * 0.1
+    if doppler is None:
+        doppler = -12e3 + 500 * np.arange(pulses)
+    for pulse in range(pulses):
+        start = 20 + pulse
+        echo = code * np.exp(1j * 2 * np.pi * doppler[pulse] * samp * np.arange(1, len(code) + 1))
+        data[:, start:start + len(code), pulse] += echo[None, :]
+
+    test_data = raw_data.RawDataInterface(None, load_on_init=False)
+    test_data.data = data
+    test_data.axis['channel'] = 0
+    test_data.axis['sample'] = 1
+    test_data.axis['pulse'] = 2
+    test_data.meta["T_samp"] = samp
+    return test_data
 
 
 def test_crosscorrelate_single_delay():
@@ -99,8 +125,378 @@ def test_xcorr_echo_search():
     assert np.allclose(np.abs(max_pow_per_doppler["max_pow_per_delay"]), np.abs(result), rtol=1e-4)
 
 
+def assert_matched_filter_output_close(reference, result, keys=None):
+    if keys is None:
+        keys = ["max_pow_per_delay", "max_pow_per_delay_norm", "best_peak"]
+    for key in keys:
+        assert np.allclose(reference[key], result[key], rtol=1e-9, atol=1e-9), key
+    assert np.array_equal(reference["best_start"], result["best_start"])
+    assert np.array_equal(reference["best_doppler"], result["best_doppler"])
+    assert reference["pulse_length"] == result["pulse_length"]
+
+
+def test_xcorr_echo_search_fft_equivalence():
+    test_data = simulated_raw_data()
+    pulses = test_data.data.shape[2]
+    signal = phase_coding.barker_code_13(pulses, 2)
+    kw = dict(progress_bar=False, full_gmf_output=True)
+
+    direct = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="direct", **kw)
+    fft = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="fft", **kw)
+
+    assert_matched_filter_output_close(
+        direct, fft, keys=["max_pow_per_delay", "max_pow_per_delay_norm", "best_peak", "gmf_output"])
+    assert np.array_equal(fft["best_start"], 20 + np.arange(pulses))
+
+
+def test_xcorr_echo_search_planar_equivalence():
+    test_data = simulated_raw_data(pulses=19)
+    signal = phase_coding.barker_code_13(19, 2)
+    # Alternate between two codes so several code banks are used per block
+    signal[1::2] *= -1
+    kw = dict(progress_bar=False, full_gmf_output=True)
+
+    direct = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="direct", **kw)
+    planar = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="planar", **kw)
+    threaded = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="planar", threads=2, **kw)
+
+    keys = ["max_pow_per_delay", "max_pow_per_delay_norm", "best_peak", "gmf_output"]
+    assert_matched_filter_output_close(direct, planar, keys=keys)
+    assert_matched_filter_output_close(direct, threaded, keys=keys)
+
+
+def test_xcorr_echo_search_threads():
+    test_data = simulated_raw_data(pulses=37)
+    signal = phase_coding.barker_code_13(37, 2)
+    kw = dict(progress_bar=False, full_gmf_output=True, method="direct")
+
+    single = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, **kw)
+    threaded = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, threads=3, **kw)
+    assert_matched_filter_output_close(
+        single, threaded, keys=["max_pow_per_delay", "max_pow_per_delay_norm", "best_peak", "gmf_output"])
+
+
+def test_xcorr_echo_search_batch_equivalence(monkeypatch):
+    test_data = simulated_raw_data(pulses=11)
+    signal = phase_coding.barker_code_13(11, 2)
+    kw = dict(progress_bar=False, full_gmf_output=True)
+
+    direct = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="direct", **kw)
+    # Force several pulse blocks that do not evenly divide the pulses
+    monkeypatch.setattr(xcorr, "BATCH_MEMORY_LIMIT", 4 * 51 * (128 + 2 * 111) * 16)
+    batch = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="batch", **kw)
+    threaded = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="batch", threads=2, **kw)
+
+    keys = ["max_pow_per_delay", "max_pow_per_delay_norm", "best_peak", "gmf_output"]
+    assert_matched_filter_output_close(direct, batch, keys=keys)
+    assert_matched_filter_output_close(direct, threaded, keys=keys)
+
+
+def test_xcorr_echo_search_single_precision():
+    test_data = simulated_raw_data(pulses=11)
+    signal = phase_coding.barker_code_13(11, 2)
+    kw = dict(progress_bar=False, full_gmf_output=True)
+
+    double = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="direct", **kw)
+    for method in ["fft", "batch"]:
+        single = xcorr.xcorr_echo_search(
+            test_data, -20e3, 5e3, 500, signal, method=method, dtype=np.complex64, **kw)
+        assert single["best_peak"].dtype == np.complex64
+        assert single["max_pow_per_delay_norm"].dtype == np.complex64
+        assert single["gmf_output"].dtype == np.complex64
+        assert np.array_equal(double["best_start"], single["best_start"])
+        assert np.array_equal(double["best_doppler"], single["best_doppler"])
+        for key in ["best_peak", "max_pow_per_delay", "max_pow_per_delay_norm"]:
+            assert np.allclose(double[key], single[key], rtol=1e-4, atol=1e-5), key
+
+    with pytest.raises(ValueError):
+        xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, method="direct", dtype=np.complex64)
+
+
+def test_xcorr_echo_search_stream():
+    test_data = simulated_raw_data(pulses=11)
+    signal = phase_coding.barker_code_13(11, 2)
+    kw = dict(progress_bar=False, full_gmf_output=True, method="batch")
+
+    reference = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, **kw)
+    outputs = list(xcorr.xcorr_echo_search_stream(test_data.pulse_blocks(4), -20e3, 5e3, 500, signal, **kw))
+    assert [output["pulse_length"] for output in outputs] == [4, 4, 3]
+
+    streamed = xcorr.concatenate_matched_filter_outputs(outputs)
+    assert_matched_filter_output_close(
+        reference, streamed, keys=["max_pow_per_delay", "max_pow_per_delay_norm", "best_peak", "gmf_output"])
+
+
+def test_xcorr_echo_search_gmf_output_sinks(tmp_path):
+    test_data = simulated_raw_data(pulses=9)
+    signal = phase_coding.barker_code_13(9, 2)
+    kw = dict(progress_bar=False)
+
+    for method in ["direct", "batch"]:
+        reference = xcorr.xcorr_echo_search(
+            test_data, -20e3, 5e3, 500, signal, method=method, full_gmf_output=True, **kw)["gmf_output"]
+        magnitude = np.abs(reference)
+
+        sinks = [
+            gmf_output.GMFOutput(magnitude=True, dtype=np.float16),
+            gmf_output.MemmapGMFOutput(tmp_path / f"{method}.npy"),
+            gmf_output.HDF5GMFOutput(tmp_path / f"{method}.h5"),
+        ]
+        for sink in sinks:
+            output = xcorr.xcorr_echo_search(
+                test_data, -20e3, 5e3, 500, signal, method=method, full_gmf_output=sink, **kw)
+            assert np.allclose(output["gmf_output"][()], magnitude, rtol=1e-3, atol=1e-3)
+
+        output = xcorr.xcorr_echo_search(
+            test_data, -20e3, 5e3, 500, signal, method=method,
+            full_gmf_output=gmf_output.RegionOfInterestGMFOutput(2, 3), **kw)
+        roi = output["gmf_output"]
+        assert roi.shape == reference.shape
+        assert roi.data.shape == (5, 7, 9)
+        for pulse in range(9):
+            doppler_inds, delay_inds, values = gmf_output.pulse_output(roi, pulse)
+            assert delay_inds[3] == output["best_start"][pulse] + signal.shape[1]
+            valid = np.logical_and(doppler_inds >= 0, doppler_inds < reference.shape[0])
+            assert np.allclose(values[valid], reference[doppler_inds[valid]][:, delay_inds, pulse])
+
+
+def test_xcorr_echo_search_channel_phasors():
+    test_data = simulated_raw_data(pulses=9, channels=3)
+    test_data.data *= np.exp(1j*np.array([0.0, 0.7, -1.9]))[:, None, None]
+    signal = phase_coding.barker_code_13(9, 2)
+
+    output = xcorr.xcorr_echo_search(
+        test_data, -20e3, 5e3, 500, signal, progress_bar=False, full_gmf_output=True, channel_phasors=True)
+    phasors = output["channel_phasors"]
+    assert phasors.shape == (3, 9)
+
+    pulses = np.arange(9)
+    doppler_index = np.round((output["best_doppler"] + 20e3) / 500).astype(np.int64)
+    delay_index = output["best_start"].astype(np.int64) + signal.shape[1]
+    peak = output["gmf_output"][doppler_index, delay_index, pulses]
+    assert np.allclose(np.sum(phasors, axis=0), peak)
+    assert np.allclose(np.angle(phasors[1] / phasors[0]), 0.7, atol=0.1)
+    assert np.allclose(np.angle(phasors[2] / phasors[0]), -1.9, atol=0.1)
+
+
+def test_xcorr_echo_search_code_table():
+    test_data = simulated_raw_data(pulses=10)
+    code = phase_coding.barker_code_13(1, 2)
+    table = np.concatenate([code, -code], axis=0)
+    code_index = np.array([0, 1, 1, 0, 0, 1, 0, 1, 1, 1])
+    kw = dict(progress_bar=False, method="batch")
+
+    expanded = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, table[code_index], **kw)
+    code_bank.clear_cache()
+    indexed = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, table, code_index=code_index, **kw)
+    assert len(code_bank._CODE_BANKS) == 2
+    assert_matched_filter_output_close(expanded, indexed)
+
+    cycled = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, table[[0, 1, 1]], **kw)
+    periodic = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, table[[0, 1, 1, 0]], code_period=3, **kw)
+    cycled_table = table[[0, 1, 1]][np.arange(10) % 3]
+    assert_matched_filter_output_close(
+        xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, cycled_table, **kw), cycled)
+    assert_matched_filter_output_close(cycled, periodic)
+
+
+def test_xcorr_echo_search_peaks():
+    test_data = simulated_raw_data()
+    code = phase_coding.barker_code_13(1, 2)[0]
+    echo = 0.5 * code * np.exp(1j * 2 * np.pi * 2e3 * 6e-6 * np.arange(1, len(code) + 1))
+    test_data.data[:, 55:(55 + len(code)), :] += echo[None, :, None]
+    signal_model = phase_coding.barker_code_13(test_data.data.shape[2], 2)
+
+    outputs = {
+        method: xcorr.xcorr_echo_search(
+            test_data, -20e3, 5e3, 500, signal_model, progress_bar=False, method=method, peaks=3)
+        for method in ["direct", "planar", "batch"]
+    }
+    reference = outputs["direct"]
+    assert reference["peak_power"].shape == (3, test_data.data.shape[2])
+    assert np.allclose(reference["peak_power"][0], reference["best_peak"].real)
+    assert np.all(reference["peak_start"][0] == reference["best_start"])
+    assert np.all(reference["peak_doppler"][0] == reference["best_doppler"])
+    assert np.all(reference["peak_start"][1] == 55)
+    assert np.allclose(reference["peak_doppler"][1], 2e3)
+    assert np.all(np.diff(reference["peak_power"], axis=0) <= 0)
+    for output in outputs.values():
+        assert np.allclose(output["peak_power"], reference["peak_power"])
+        assert np.array_equal(output["peak_start"], reference["peak_start"], equal_nan=True)
+        assert np.array_equal(output["peak_doppler"], reference["peak_doppler"], equal_nan=True)
+
+
+def test_matched_filter_state():
+    test_data = simulated_raw_data(pulses=13)
+    signal = phase_coding.barker_code_13(1, 2)
+    kw = dict(progress_bar=False, method="batch")
+
+    reference = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, **kw)
+    state = xcorr.MatchedFilterState(-20e3, 5e3, 500, signal, **kw)
+    state.append(xcorr.xcorr_echo_search(test_data.pulse_view(0, 3), -20e3, 5e3, 500, signal, **kw))
+    for pulses in [4, 4, 9, 13]:
+        state.update(test_data.pulse_view(0, pulses))
+    assert state.update(test_data) == 0
+    assert len(state) == 13
+
+    output = state.output()
+    assert output["pulse_length"] == 13
+    assert_matched_filter_output_close(reference, output)
+
+
+def test_matched_filter_cache(tmp_path, monkeypatch):
+    test_data = simulated_raw_data(pulses=6)
+    test_data.path = tmp_path / "raw.h5"
+    test_data.path.write_bytes(b"raw data")
+    signal = phase_coding.barker_code_13(1, 2)
+    cache = MatchedFilterCache(tmp_path / "cache")
+
+    computed = cache.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, progress_bar=False)
+    assert len(list(cache.directory.glob("*.npz"))) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("matched filter was not read from the cache")
+
+    with monkeypatch.context() as m:
+        m.setattr(xcorr, "xcorr_echo_search", fail)
+        cached = cache.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, progress_bar=False, threads=2)
+    assert cached["pulse_length"] == 6
+    assert_matched_filter_output_close(computed, cached)
+
+    cache.xcorr_echo_search(test_data, -20e3, 5e3, 1000, signal, progress_bar=False)
+    assert len(list(cache.directory.glob("*.npz"))) == 2
+
+    cache.max_size = cache.size() - 1
+    cache.evict()
+    assert len(list(cache.directory.glob("*.npz"))) == 1
+
+
+def test_matched_filter_cache_pulse_view(tmp_path):
+    test_data = simulated_raw_data(pulses=6)
+    test_data.path = tmp_path / "raw.h5"
+    test_data.path.write_bytes(b"raw data")
+    signal = phase_coding.barker_code_13(1, 2)
+    cache = MatchedFilterCache(tmp_path / "cache")
+
+    cache.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, progress_bar=False)
+    for start, stop in [(0, 2), (2, 4), (1, 3)]:
+        view = test_data.pulse_view(start, stop)
+        cached = cache.xcorr_echo_search(view, -20e3, 5e3, 500, signal, progress_bar=False)
+        assert cached["pulse_length"] == 2
+        assert cached["best_peak"].shape == (2,)
+        assert_matched_filter_output_close(
+            xcorr.xcorr_echo_search(view, -20e3, 5e3, 500, signal, progress_bar=False), cached)
+    assert len(list(cache.directory.glob("*.npz"))) == 4
+
+
+def test_coarse_to_fine_echo_search():
+    doppler = np.linspace(-14321.0, -3456.0, 6)
+    test_data = simulated_raw_data(pulses=6, doppler=doppler)
+    signal = phase_coding.barker_code_13(6, 2)
+    kw = dict(progress_bar=False, method="batch")
+
+    exhaustive = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 100, signal, **kw)
+    refined = xcorr.coarse_to_fine_echo_search(
+        test_data, -20e3, 5e3, 100, signal, coarse_factor=10, interpolate=False, **kw)
+    interpolated = xcorr.coarse_to_fine_echo_search(
+        test_data, -20e3, 5e3, 100, signal, coarse_factor=10, **kw)
+
+    assert np.all(refined["refined"])
+    assert np.array_equal(exhaustive["best_start"], refined["best_start"])
+    assert np.allclose(exhaustive["best_doppler"], refined["best_doppler"])
+    assert np.allclose(exhaustive["best_peak"], refined["best_peak"])
+    assert np.all(np.abs(interpolated["best_doppler"] - refined["best_doppler"]) <= 50)
+    assert np.all(np.abs(refined["best_doppler"] - doppler) < 1000)
+
+    skipped = xcorr.coarse_to_fine_echo_search(
+        test_data, -20e3, 5e3, 100, signal, coarse_factor=10, min_peak=2.0, **kw)
+    assert not np.any(skipped["refined"])
+
+
+def test_normalization_coefficients():
+    rng = np.random.default_rng(2718)
+    signal = rng.normal(size=(3, 40)) + 1j * rng.normal(size=(3, 40))
+    signal[1, :] = 0
+    code_size = 7
+
+    norm_coefs = xcorr.normalization_coefficients(signal, code_size)
+    assert norm_coefs.shape == (3, 40 + code_size)
+    for sig, norm in zip(signal, norm_coefs):
+        energy = np.abs(sig)**2
+        expected = np.empty(40 + code_size)
+        expected[:code_size] = np.sum(energy[:code_size])
+        for ind in range(code_size, 40):
+            expected[ind] = np.sum(energy[(ind - code_size):ind])
+        expected[40:] = np.sum(energy[-code_size:])
+        expected[expected < np.finfo(np.float32).eps] = 1
+        assert np.allclose(norm, expected)
+    assert np.all(norm_coefs[1] == 1)
+
+    # Codes longer than the signal use the total signal energy for all delays
+    short_signal = signal[:, :10]
+    norm_coefs = xcorr.normalization_coefficients(short_signal, 20)
+    assert norm_coefs.shape == (3, 30)
+    expected = np.sum(np.abs(short_signal)**2, axis=1)
+    expected[1] = 1
+    assert np.allclose(norm_coefs, expected[:, None])
+
+
+def test_code_bank():
+    code = phase_coding.barker_code_13(1, 2)[0]
+    doppler_freq = np.arange(-5e3, 5e3, 1e3)
+    bank = code_bank.get_code_bank(code, doppler_freq, 6e-6)
+
+    assert code_bank.get_code_bank(code.copy(), doppler_freq.copy(), 6e-6) is bank
+    assert code_bank.get_code_bank(-code, doppler_freq, 6e-6) is not bank
+    assert np.allclose(bank.models, code_bank.doppler_shifted_models(code, doppler_freq, 6e-6))
+    assert np.allclose(bank.energy, np.sum(code**2))
+
+
+def test_xcorr_workspace():
+    workspace = xcorr.get_xcorr_workspace(85, 26, 51)
+    assert xcorr.get_xcorr_workspace(85, 26, 51) is workspace
+    assert xcorr.get_xcorr_workspace(90, 26, 51) is not workspace
+
+    test_data = simulated_raw_data(pulses=20)
+    signal = phase_coding.barker_code_13(20, 2)
+    kw = dict(progress_bar=False, full_gmf_output=True, method="direct")
+    first = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, **kw)
+    second = xcorr.xcorr_echo_search(test_data, -20e3, 5e3, 500, signal, **kw)
+    assert_matched_filter_output_close(
+        first, second, keys=["max_pow_per_delay", "max_pow_per_delay_norm", "best_peak", "gmf_output"])
+
+
+def test_xcorr_code_bank_search():
+    test_data = simulated_raw_data(pulses=1)
+    code = phase_coding.barker_code_13(1, 2)[0]
+    sample_signal = np.sum(test_data.data, 0)[:, 0].copy()
+    bank = code_bank.get_code_bank(code, np.arange(-20e3, 5e3 + 1, 500), 6e-6)
+    size = (bank.doppler_size, len(sample_signal) + len(code))
+
+    def output_arrays():
+        return (
+            np.zeros(size, dtype=np.complex128),
+            np.zeros(size, dtype=np.complex128),
+            np.array(size, dtype=np.int32),
+            np.zeros(size[0], dtype=np.complex128),
+            size[0],
+            np.zeros(size[0], dtype=np.int32),
+            size[0],
+        )
+
+    reference = output_arrays()
+    xcorr.libmet.xcorr_echo_search(
+        -20e3, 5e3, 500, sample_signal, len(sample_signal), code, len(code), *reference, 6e-6)
+    result = output_arrays()
+    xcorr.libmet.xcorr_code_bank_search(
+        sample_signal, len(sample_signal), bank.models, bank.energy, bank.doppler_size, len(code), *result)
+
+    for ref, res in zip(reference, result):
+        assert np.allclose(ref, res)
+
+
 """
 def test_complex_sum():
     test_array = np.ones([100], dtype=np.complex128)
     assert xcorr.complex_sum(test_array) == 100
-"""
\ No newline at end of file
+"""
\ No newline at end of file